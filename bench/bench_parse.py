@@ -0,0 +1,106 @@
+#!/usr/bin/env python2
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Compare the perf CSV parser with the old human-readable output parser"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from membw import perfcsv
+
+EVENTS = ("OCR_READ_DRAM", "OCR_READ_PMEM", "OCR_WRITE_PMEM", "MEM_INST_RETIRED.ALL_STORES")
+
+def write_outputs(d, threads):
+    # the same --per-thread counts, once as perf prints them and once with -x
+    human = os.path.join(d, "task.log")
+    csv = os.path.join(d, "task.csv")
+    started = "# started on %s\n\n" % time.strftime("%a %b %d %H:%M:%S %Y")
+    with open(human, "w") as h, open(csv, "w") as c:
+        h.write(started)
+        h.write(" Performance counter stats for 'system wide':\n\n")
+        c.write(started)
+        for e in EVENTS:
+            for t in range(threads):
+                v = random.randint(0, 10**9)
+                key = "worker-%d" % (t + 1000)
+                h.write("%24s %18s      %s                    (50.01%%)\n" % (key, format(v, ","), e))
+                c.write("%s%s%d%s%s%s%s1000000000%s50.01%s%s\n" % (key, perfcsv.CSV_SEP, v,\
+                        perfcsv.CSV_SEP, perfcsv.CSV_SEP, e, perfcsv.CSV_SEP, perfcsv.CSV_SEP,\
+                        perfcsv.CSV_SEP, perfcsv.CSV_SEP))
+        h.write("\n       5.001234567 seconds time elapsed\n\n")
+    return human, csv
+
+def legacy_parse(lp):
+    # collect_task_bw() of bw-report.py before CSV mode, pid == -1 branch
+    dram_read_dict = {}
+    pmem_read_dict = {}
+    pmem_write_dict = {}
+    all_stores_dict = {}
+    fd = open(lp)
+    t = 0.0
+    start_time = ""
+
+    while True:
+        l = fd.readline()
+        if not l:
+            break
+        l = l.split()
+
+        if (len(l) == 3) or (len(l) == 4):
+            if l[2] == "OCR_READ_DRAM":
+                dram_read_dict[l[0]] = int(l[1].replace(',', ''))
+            elif l[2] == "OCR_READ_PMEM":
+                pmem_read_dict[l[0]] = int(l[1].replace(',', ''))
+            elif l[2] == "OCR_WRITE_PMEM":
+                pmem_write_dict[l[0]] = int(l[1].replace(',', ''))
+            elif l[2] == "MEM_INST_RETIRED.ALL_STORES":
+                all_stores_dict[l[0]] = int(l[1].replace(',', ''))
+        if len(l) == 4 and l[1] == "seconds":
+            t = float(l[0])
+        if len(l) == 8 and l[1] == "started":
+            start_time = str(l[6])
+
+    fd.close()
+    return start_time, t
+
+def csv_parse(lp):
+    with open(lp) as fd:
+        return perfcsv.parse(fd, keyed=True)
+
+def best_of(f, arg, repeat):
+    best = None
+    for i in range(repeat):
+        t = time.time()
+        f(arg)
+        t = time.time() - t
+        best = t if best is None else min(best, t)
+    return best
+
+def main():
+    ap = argparse.ArgumentParser(description='Benchmark perf output parsers.')
+    ap.add_argument('-n', '--threads', type=int, nargs='*', default=[1000, 10000, 50000],\
+            help='number of threads in the --per-thread output, default 1000 10000 50000')
+    ap.add_argument('-r', '--repeat', type=int, default=5,\
+            help='runs per parser, best one is reported, default 5')
+    args = ap.parse_args()
+
+    d = tempfile.mkdtemp(prefix="bw-bench-")
+    print("%10s %8s %14s %14s %9s" % ("Threads", "Rows", "Legacy(ms)", "CSV(ms)", "Speedup"))
+    try:
+        for n in args.threads:
+            human, csv = write_outputs(d, n)
+            legacy = best_of(legacy_parse, human, args.repeat)
+            new = best_of(csv_parse, csv, args.repeat)
+            print("%10d %8d %14.1f %14.1f %8.2fx" % (n, n * len(EVENTS), legacy * 1000, new * 1000, legacy / new))
+    finally:
+        for f in os.listdir(d):
+            os.remove(os.path.join(d, f))
+        os.rmdir(d)
+
+if __name__ == "__main__":
+    main()
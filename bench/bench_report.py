@@ -0,0 +1,288 @@
+#!/usr/bin/env python2
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Measure the overhead of bw-collect.py/bw-report.py against the perf stand-in in bench/bin
+
+For every mode and task count it runs bw-report.py on all tasks with
+--format jsonl and reports:
+
+    intervals          intervals printed
+    skipped            intervals bw-report.py skipped for falling behind,
+                       a run with any fails the benchmark, and so does one
+                       missing intervals it didn't skip, those were lost
+    latency_ms         p50 and max of when an interval is printed after
+                       it ends
+    parse_rows_per_s   perf CSV parser throughput on a --per-thread dump
+    report_cpu_ms      bw-report.py CPU time per interval
+    report_rss_mb      bw-report.py peak RSS
+    collect_cpu_ms     bw-collect.py CPU time per interval, all of them
+    collect_rss_mb     bw-collect.py peak RSS, the largest of them
+
+perf's own cost isn't counted. --save writes the results as a baseline,
+--baseline compares with one and exits 1 on a regression.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCH_DIR, "..")
+sys.path.insert(0, ROOT)
+from membw import perfcsv, collect
+from membw.events import group_arg
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+MODES = ("snapshot", "stream")
+
+# metrics and whether higher is better, a regression has to be over
+# the tolerance and over the floor too, small numbers are mostly noise
+METRICS = (
+    ("intervals", True, 0.0),
+    ("latency_p50_ms", False, 20.0),
+    ("latency_max_ms", False, 50.0),
+    ("parse_rows_per_s", True, 0.0),
+    ("report_cpu_ms", False, 10.0),
+    ("report_rss_mb", False, 5.0),
+    ("collect_cpu_ms", False, 10.0),
+    ("collect_rss_mb", False, 5.0),
+)
+
+# the scripts bw-report.py runs, with sysfs and cpuinfo moved to the fake
+# tree and their own rusage appended to rusage.log at exit
+SHIM = """#!%(python)s
+import os, sys, atexit, resource
+sys.path.insert(0, %(root)r)
+
+def dump():
+    r = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss carries over fork and exec, VmHWM is of this process only
+    hwm = r.ru_maxrss
+    with open("/proc/self/status") as f:
+        for l in f:
+            if l.startswith("VmHWM:"):
+                hwm = int(l.split()[1])
+    line = "%(name)s %%f %%f %%d\\n" %% (r.ru_utime, r.ru_stime, hwm)
+    fd = os.open(%(log)r, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    os.write(fd, line.encode())
+    os.close(fd)
+
+atexit.register(dump)
+%(body)s
+"""
+
+COLLECT_BODY = """from membw import collect
+collect.sys_root = %(sys_root)r
+collect.cpuinfo = %(cpuinfo)r
+sys.exit(collect.main())"""
+
+REPORT_BODY = """from membw.report import main
+main()"""
+
+def make_workdir(imc_boxes):
+    # the shims, perf with this python, a cpuinfo of a SKX/CLX and a sysfs with the IMC boxes
+    d = tempfile.mkdtemp(prefix="bw-bench-")
+    b = os.path.join(d, "bin")
+    os.mkdir(b)
+    with open(os.path.join(BENCH_DIR, "bin", "perf")) as f:
+        perf = f.read().split("\n", 1)[1]
+    write_script(os.path.join(b, "perf"), "#!%s\n%s" % (sys.executable, perf))
+    cpuinfo = os.path.join(d, "cpuinfo")
+    with open(cpuinfo, "w") as f:
+        f.write("processor\t: 0\nvendor_id\t: GenuineIntel\ncpu family\t: 6\nmodel\t\t: 85\n")
+    sys_root = os.path.join(d, "sys")
+    for i in range(imc_boxes):
+        os.makedirs(os.path.join(sys_root, "devices", "uncore_imc_%d" % i))
+    log = os.path.join(d, "rusage.log")
+    collect_body = COLLECT_BODY % {"sys_root": sys_root, "cpuinfo": cpuinfo}
+    for name, body in (("collect", collect_body), ("report", REPORT_BODY)):
+        write_script(os.path.join(d, "bw-%s.py" % name), SHIM % {"python": sys.executable, "root": ROOT,\
+                "name": name, "log": log, "body": body})
+    return d
+
+def write_script(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+    os.chmod(path, 0o755)
+
+def percentile(values, p):
+    v = sorted(values)
+    return v[min(int(len(v) * p / 100.0), len(v) - 1)] if v else 0.0
+
+def run_report(d, mode, tasks, args):
+    env = dict(os.environ)
+    env["PATH"] = os.path.join(d, "bin") + os.pathsep + env.get("PATH", "")
+    env["FAKE_PERF_THREADS"] = str(tasks)
+    env["FAKE_PERF_CPUS"] = str(args.cpus)
+    env["FAKE_PERF_SOCKETS"] = str(args.sockets)
+    env["FAKE_PERF_DELAY"] = str(args.delay)
+    log = os.path.join(d, "rusage.log")
+    if os.path.exists(log):
+        os.remove(log)
+
+    cmd = [sys.executable, "bw-report.py", "-i", str(args.interval), "-t", str(args.interval * args.intervals),\
+            "--format", "jsonl"]
+    if mode == "stream":
+        cmd.append("--stream")
+    p = subprocess.Popen(cmd, cwd=d, env=env, stdout=subprocess.PIPE, stderr=open(os.devnull, "w"))
+    latency = []
+    skipped = 0
+    for line in iter(p.stdout.readline, b""):
+        now = time.time()
+        if line.startswith(b"Reporting fell behind"):
+            skipped = int(line.split()[3])
+            continue
+        try:
+            ts = json.loads(line.decode("utf-8"))["ts"]
+        except (ValueError, KeyError):
+            continue
+        latency.append((now - ts - args.interval) * 1000.0)
+    p.wait()
+
+    usage = {"report": [], "collect": []}
+    if os.path.exists(log):
+        with open(log) as f:
+            for l in f:
+                name, utime, stime, maxrss = l.split()
+                usage[name].append((float(utime) + float(stime), int(maxrss)))
+    # per interval run, those it skipped cost time too
+    n = max(args.intervals, 1)
+    rss = lambda u: max([m for c, m in u] + [0]) / 1024.0
+    cpu = lambda u: sum([c for c, m in u]) * 1000.0 / n
+    return {
+        "intervals": len(latency),
+        "skipped": skipped,
+        "latency_p50_ms": round(percentile(latency, 50), 1),
+        "latency_max_ms": round(max(latency + [0.0]), 1),
+        "report_cpu_ms": round(cpu(usage["report"]), 1),
+        "report_rss_mb": round(rss(usage["report"]), 1),
+        "collect_cpu_ms": round(cpu(usage["collect"]), 1),
+        "collect_rss_mb": round(rss(usage["collect"]), 1),
+    }
+
+def parse_throughput(d, tasks, repeat):
+    # a --per-thread dump of the task events as bw-collect.py asks for them
+    path = os.path.join(d, "task.log")
+    cmd = [os.path.join(d, "bin", "perf"), "stat", "-x", perfcsv.CSV_SEP, "-a", "--per-thread"]
+    for g in collect.task_groups("85"):
+        cmd.extend(["-e", group_arg(g)])
+    env = dict(os.environ)
+    env["FAKE_PERF_THREADS"] = str(tasks)
+    subprocess.check_call(cmd + ["-o", path, "--", "sleep", "0"], env=env)
+    best = None
+    for i in range(repeat):
+        t = time.time()
+        with open(path) as f:
+            rows = len(perfcsv.parse(f, keyed=True))
+        t = time.time() - t
+        best = t if best is None else min(best, t)
+    return round(rows / best) if best > 0 else 0
+
+def compare(results, baseline, tolerance):
+    # lines of the metrics worse than the baseline by more than tolerance
+    bad = []
+    for key, r in sorted(results.items()):
+        b = baseline.get(key)
+        if b is None:
+            continue
+        for m, higher, floor in METRICS:
+            if m not in b or m not in r:
+                continue
+            worse = b[m] - r[m] if higher else r[m] - b[m]
+            if worse > tolerance * abs(b[m]) and worse > floor:
+                bad.append("%s %s: %s, baseline %s" % (key, m, r[m], b[m]))
+    return bad
+
+def main():
+    ap = argparse.ArgumentParser(description='Benchmark bw-collect.py/bw-report.py with a perf stand-in.')
+    ap.add_argument('-n', '--tasks', type=int, nargs='+', default=[10, 1000, 10000],\
+            help='tasks in the --per-thread dumps, default 10 1000 10000, 100000 needs an --interval of 10')
+    ap.add_argument('-m', '--modes', nargs='+', choices=MODES, default=list(MODES),\
+            help='bw-report.py modes, default snapshot stream')
+    ap.add_argument('-i', '--interval', type=int, default=2,\
+            help='bw-report.py interval in seconds, default 2')
+    ap.add_argument('-c', '--intervals', type=int, default=5,\
+            help='intervals per run, default 5')
+    ap.add_argument('-cpus', '--cpus', type=int, default=32,\
+            help='CPUs of the fake machine, default 32')
+    ap.add_argument('-sockets', '--sockets', type=int, default=2,\
+            help='sockets of the fake machine, default 2')
+    ap.add_argument('-imc', '--imc-boxes', type=int, default=6,\
+            help='uncore_imc_N boxes of the fake machine, default 6')
+    ap.add_argument('-delay', '--delay', type=float, default=0.0,\
+            help='seconds perf prints every interval late, default 0')
+    ap.add_argument('-r', '--repeat', type=int, default=3,\
+            help='parser runs, the best one is reported, default 3')
+    ap.add_argument('-save', '--save', nargs='?', const=DEFAULT_BASELINE, metavar='FILE',\
+            help='write the results as a baseline, to %s if no FILE' % os.path.relpath(DEFAULT_BASELINE))
+    ap.add_argument('-baseline', '--baseline', nargs='?', const=DEFAULT_BASELINE, metavar='FILE',\
+            help='compare with a baseline, %s if no FILE, exit 1 on a regression'\
+            % os.path.relpath(DEFAULT_BASELINE))
+    ap.add_argument('-tolerance', '--tolerance', type=float, default=0.25,\
+            help='with --baseline, how much worse a metric may get, default 0.25 for 25%%')
+    args = ap.parse_args()
+
+    # results are only comparable with a baseline of the same setup
+    setup = {"interval": args.interval, "intervals": args.intervals, "cpus": args.cpus, "sockets": args.sockets,\
+            "imc_boxes": args.imc_boxes, "delay": args.delay}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("setup") != setup:
+            sys.exit("%s was saved with %s, not %s" % (args.baseline, baseline.get("setup"), setup))
+
+    d = make_workdir(args.imc_boxes)
+    results = {}
+    print("%-9s %7s %5s %9s %9s %12s %10s %10s %11s %11s" % ("Mode", "Tasks", "Ivals", "p50(ms)", "max(ms)",\
+            "Parse(r/s)", "RepCPU(ms)", "RepRSS(MB)", "ColCPU(ms)", "ColRSS(MB)"))
+    try:
+        for n in args.tasks:
+            parse = parse_throughput(d, n, args.repeat)
+            for mode in args.modes:
+                r = run_report(d, mode, n, args)
+                r["parse_rows_per_s"] = parse
+                results["%s/%d" % (mode, n)] = r
+                print("%-9s %7d %5d %9.1f %9.1f %12d %10.1f %10.1f %11.1f %11.1f" % (mode, n, r["intervals"],\
+                        r["latency_p50_ms"], r["latency_max_ms"], parse, r["report_cpu_ms"], r["report_rss_mb"],\
+                        r["collect_cpu_ms"], r["collect_rss_mb"]))
+                sys.stdout.flush()
+    finally:
+        shutil.rmtree(d, ignore_errors=True)
+
+    # intervals neither printed nor skipped were lost, a bug whatever the
+    # setup, the latency and CPU of a run that fell behind aren't those of
+    # the tool keeping up, they're no baseline and no comparison with one
+    lost = [k for k, r in sorted(results.items()) if r["intervals"] + r["skipped"] < args.intervals]
+    for k in lost:
+        print("LOST %s: %d printed and %d skipped of %d intervals"\
+                % (k, results[k]["intervals"], results[k]["skipped"], args.intervals))
+    behind = [k for k, r in sorted(results.items()) if r["skipped"] and k not in lost]
+    for k in behind:
+        print("BEHIND %s: %d of %d intervals skipped" % (k, results[k]["skipped"], args.intervals))
+    if behind:
+        print("Use a longer --interval or fewer --tasks.")
+    if lost or behind:
+        return 1
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"setup": setup, "results": results}, f, indent=1, sort_keys=True)
+            f.write("\n")
+        print("Results saved to %s." % args.save)
+    if baseline is not None:
+        bad = compare(results, baseline["results"], args.tolerance)
+        for l in bad:
+            print("REGRESSION %s" % l)
+        if bad:
+            return 1
+        print("No regression over %.0f%% against %s." % (args.tolerance * 100, args.baseline))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
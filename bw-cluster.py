@@ -0,0 +1,8 @@
+#!/usr/bin/env python2
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+import sys
+from membw.cluster import main
+
+if __name__ == "__main__":
+    sys.exit(main())
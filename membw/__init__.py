@@ -0,0 +1,3 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Helpers shared by bw-collect.py and bw-report.py"""
@@ -0,0 +1,30 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""When to pay for per-task counts, decided by the IMC totals"""
+
+class Tiers(object):
+    """Per-task counts only for intervals that may be worth attributing
+
+    Every interval has the IMC totals. An interval gets the per-task
+    counts too when the previous one had DRAM read or write bandwidth at
+    threshold MiB/s or more, and every duty-th interval anyway unless
+    duty is 0. The first interval is totals only, nothing is known yet.
+    """
+    def __init__(self, threshold, duty=0):
+        self.threshold = threshold
+        self.duty = duty
+        self.busy = False
+        self.n = 0
+        self.full = 0
+
+    def update(self, read, write):
+        """Totals of the last interval, MiB/s"""
+        self.busy = read >= self.threshold or write >= self.threshold
+
+    def next(self):
+        """Whether the next interval gets per-task counts"""
+        self.n += 1
+        full = self.busy or (self.duty > 0 and self.n % self.duty == 0)
+        if full:
+            self.full += 1
+        return full
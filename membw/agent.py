@@ -0,0 +1,145 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Agent end of bw-cluster.py, intervals streamed over TCP or a Unix socket
+
+A connection starts with HELLO_MAGIC, then a u16 version and a u32
+length, then that many bytes of JSON: host, session, by and pmem. Every
+interval after it is a binary sink record, u32 length and body.
+"""
+
+import os
+import json
+import time
+import socket
+import struct
+import threading
+import collections
+
+from membw.sink import encode_binary
+from membw.exporter import parse_listen
+
+HELLO_MAGIC = b"MEMBWAGT"
+HELLO_VERSION = 1
+HELLO = struct.Struct("<HI")
+
+DEFAULT_QUEUE = 64
+
+# seconds between reconnects, doubled up to the max
+RETRY_MIN = 0.5
+RETRY_MAX = 5.0
+SEND_TIMEOUT = 10.0
+# what close() waits for the queue to go out
+DRAIN_TIMEOUT = 5.0
+
+def parse_address(s):
+    """('unix', path) for 'unix:PATH', ('tcp', (host, port)) for '[HOST:]PORT'"""
+    if s.startswith("unix:"):
+        if not s[5:]:
+            raise ValueError("'%s' has no path" % s)
+        return "unix", s[5:]
+    return "tcp", parse_listen(s)
+
+def describe(addr):
+    family, a = addr
+    return "unix:%s" % a if family == "unix" else "%s:%d" % a
+
+def hello(host, session, by, pmem):
+    meta = json.dumps({"host": host, "session": session, "by": by, "pmem": pmem}).encode("utf-8")
+    return HELLO_MAGIC + HELLO.pack(HELLO_VERSION, len(meta)) + meta
+
+class Sender(object):
+    """Queue intervals and send them in batches from a thread of its own
+
+    No more than queue_len intervals wait. When it's full, write() waits
+    for room if block, e.g. for a replay that can go at the collector's
+    pace, and drops the oldest one otherwise, counting stays on time
+    whatever the network does. Everything queued since the last send
+    goes in one send, the connection is made again if it breaks.
+    """
+    def __init__(self, addr, host, by, pmem, queue_len=DEFAULT_QUEUE, block=False):
+        self.addr = addr
+        self.hello = hello(host, "%d-%.6f" % (os.getpid(), time.time()), by, pmem)
+        self.queue_len = queue_len
+        self.block = block
+        self.queue = collections.deque()
+        self.cond = threading.Condition()
+        self.closing = False
+        self.dropped = 0
+        self.sent = 0
+        self.sock = None
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, ts, totals, rows, notes=()):
+        """One interval, totals as {socket: (DRAM read, DRAM write, PMEM read, PMEM write MiB/s, ...)}"""
+        data = encode_binary(ts, totals, rows, notes)
+        with self.cond:
+            while self.block and len(self.queue) >= self.queue_len and not self.closing:
+                self.cond.wait(1.0)
+            self.push([data])
+            self.cond.notify_all()
+
+    def push(self, batch, front=False):
+        # with the lock held, the oldest ones go if it's over queue_len
+        if front:
+            self.queue.extendleft(reversed(batch))
+        else:
+            self.queue.extend(batch)
+        while len(self.queue) > self.queue_len:
+            self.queue.popleft()
+            self.dropped += 1
+
+    def connect(self):
+        family, a = self.addr
+        s = socket.socket(socket.AF_UNIX if family == "unix" else socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            s.settimeout(SEND_TIMEOUT)
+            s.connect(a)
+            s.sendall(self.hello)
+        except (IOError, OSError, socket.error):
+            s.close()
+            raise
+        self.sock = s
+
+    def run(self):
+        retry = RETRY_MIN
+        while True:
+            with self.cond:
+                while not self.queue and not self.closing:
+                    self.cond.wait(1.0)
+                if not self.queue:
+                    break
+                batch = list(self.queue)
+                self.queue.clear()
+                self.cond.notify_all()
+            try:
+                if self.sock is None:
+                    self.connect()
+                self.sock.sendall(b"".join(batch))
+                self.sent += len(batch)
+                retry = RETRY_MIN
+            except (IOError, OSError, socket.error):
+                if self.sock is not None:
+                    self.sock.close()
+                    self.sock = None
+                with self.cond:
+                    if self.closing:
+                        self.dropped += len(batch) + len(self.queue)
+                        self.queue.clear()
+                        break
+                    # a batch cut off halfway is sent again, the collector
+                    # skips intervals it already has
+                    self.push(batch, front=True)
+                    self.cond.wait(retry)
+                retry = min(retry * 2, RETRY_MAX)
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def close(self):
+        """Send what's queued, waiting no more than DRAIN_TIMEOUT"""
+        with self.cond:
+            self.closing = True
+            self.cond.notify_all()
+        self.thread.join(DRAIN_TIMEOUT)
@@ -0,0 +1,131 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Per-interval bandwidth snapshots for embedding, no perf run or fork per interval
+
+    from membw.api import monitor
+    for snap in monitor([1234], interval=1.0):
+        print(snap.dram_read, [(t.comm, t.dram_read) for t in snap.tasks])
+
+Counters are read in-process with perf_event_open as in direct mode,
+importing this opens or runs nothing.
+"""
+
+import os
+
+class TaskSample(object):
+    """Bandwidths(MiB/s) of a task, or of a target PID and its threads"""
+    __slots__ = ("key", "pid", "comm", "dram_read", "dram_write", "pmem_read", "pmem_write")
+
+    def __init__(self, key, pid, comm, dram_read, dram_write, pmem_read, pmem_write):
+        self.key = key
+        self.pid = pid
+        self.comm = comm
+        self.dram_read = dram_read
+        self.dram_write = dram_write
+        self.pmem_read = pmem_read
+        self.pmem_write = pmem_write
+
+    def __repr__(self):
+        return "TaskSample(%s %s, read %.1f, write %.1f MiB/s)" % (self.pid, self.comm, self.dram_read,\
+                self.dram_write)
+
+class Snapshot(object):
+    """IMC totals(MiB/s) and tasks of one interval
+
+    ts is the wall clock interval start, elapsed its length in seconds,
+    coverage the share of it the counters ran and tasks the TaskSamples
+    over the listing threshold, heaviest DRAM read first.
+    """
+    __slots__ = ("ts", "elapsed", "dram_read", "dram_write", "pmem_read", "pmem_write", "coverage", "tasks")
+
+    def __init__(self, ts, elapsed, totals, coverage, tasks):
+        self.ts = ts
+        self.elapsed = elapsed
+        self.dram_read, self.dram_write, self.pmem_read, self.pmem_write = totals
+        self.coverage = coverage
+        self.tasks = tasks
+
+    def __repr__(self):
+        return "Snapshot(%.3f, read %.1f, write %.1f MiB/s, %d tasks)" % (self.ts, self.dram_read,\
+                self.dram_write, len(self.tasks))
+
+class Collector(object):
+    """Task, system store and IMC counts read in-process
+
+    pids None or [-1] counts all tasks, otherwise threads are counted
+    under the target PID they belong to. Raises ValueError on an
+    unsupported CPU and OSError if the counters can't be opened.
+    """
+    def __init__(self, pids=None, pmem=False, sys_root="/sys", proc_root="/proc"):
+        from membw import events
+        from membw.direct import DirectCollector
+
+        cpu = events.get_cpu_model(os.path.join(proc_root, "cpuinfo"))
+        if cpu not in events.supported_cpus:
+            raise ValueError("CPU model %s not supported" % cpu)
+        self.pids = list(pids) if pids else [-1]
+        self.pmem = pmem
+        self.direct = DirectCollector(cpu, self.pids, pmem, sys_root, proc_root)
+
+    def sample(self):
+        """(elapsed, task, system, unc) Counts since the last call, None once the PIDs are gone"""
+        return self.direct.sample()
+
+    def close(self):
+        self.direct.close()
+
+class Reporter(object):
+    """Snapshots from Collector samples"""
+    def __init__(self, pids=None, proc_root="/proc"):
+        from membw.procinfo import ProcResolver
+
+        self.all_tasks = not pids or list(pids) == [-1]
+        self.tasks = ProcResolver(proc_root)
+
+    def label(self, k):
+        # (pid, comm), keys are "comm-tid" for all tasks and target PIDs otherwise
+        if self.all_tasks:
+            comm, _, tid = k.rpartition("-")
+            return int(tid), comm
+        info = self.tasks.refresh([int(k)]).get(int(k))
+        return int(k), info.comm if info is not None else ""
+
+    def snapshot(self, ts, elapsed, task, system, unc):
+        from membw import compute, imc
+
+        totals = imc.totals(system, unc, elapsed).get(None, (0.0, 0.0, 0.0, 0.0, 0))
+        bw = compute.task_bw(compute.pivot(task), elapsed, *totals)
+        samples = []
+        for i in bw.order("read_bw"):
+            k = bw.ids[i]
+            pid, comm = self.label(k)
+            samples.append(TaskSample(k, pid, comm, float(bw.read_bw[i]), float(bw.write_bw[i]),\
+                    float(bw.pmem_read_bw[i]), float(bw.pmem_write_bw[i])))
+        coverage = min(task.coverage(), system.coverage(), unc.coverage())
+        return Snapshot(ts, elapsed, totals[:4], coverage, samples)
+
+def monitor(pids=None, interval=1.0, pmem=False, count=0, sys_root="/sys", proc_root="/proc"):
+    """Yield a Snapshot every interval seconds, no more than count if count > 0
+
+    Intervals start on wall clock multiples of interval. It ends once the
+    PIDs are all gone, the counters are closed with the generator.
+    """
+    from membw.clock import Ticker
+
+    collector = Collector(pids, pmem, sys_root, proc_root)
+    reporter = Reporter(pids, proc_root)
+    try:
+        ticker = Ticker(interval)
+        started = ticker.wait()
+        collector.sample()
+        n = 0
+        while not count or n < count:
+            now = ticker.wait()
+            s = collector.sample()
+            if s is None:
+                return
+            n += 1
+            yield reporter.snapshot(started, *s)
+            started = now
+    finally:
+        collector.close()
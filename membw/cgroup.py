@@ -0,0 +1,57 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""cgroup paths as 'perf stat -G' expects them"""
+
+import os
+
+CGROUP_FS = "/sys/fs/cgroup"
+
+def cgroup_root(fs=CGROUP_FS):
+    """Root of the hierarchy perf resolves -G names in"""
+    # cgroup v2 has the perf_event controller implicitly at its root
+    if os.path.exists(os.path.join(fs, "cgroup.controllers")):
+        return fs
+    return os.path.join(fs, "perf_event")
+
+def normalize(path):
+    # perf wants names relative to the root, "/" being the root itself
+    path = path.strip("/")
+    return path if path else "/"
+
+def children(root, path):
+    """cgroups right under path, sorted"""
+    d = os.path.join(root, normalize(path).lstrip("/"))
+    try:
+        names = sorted(os.listdir(d))
+    except OSError:
+        return []
+    parent = normalize(path)
+    return [n if parent == "/" else parent + "/" + n for n in names if os.path.isdir(os.path.join(d, n))]
+
+def exists(root, path):
+    return os.path.isdir(os.path.join(root, normalize(path).lstrip("/")))
+
+def resolve(root, paths, under):
+    """Existing cgroups among paths plus all cgroups right under the ones in under"""
+    found = []
+    for p in paths:
+        if exists(root, p) and normalize(p) not in found:
+            found.append(normalize(p))
+    for p in under:
+        for c in children(root, p):
+            if c not in found:
+                found.append(c)
+    return found
+
+def threads(root, path):
+    """TIDs in the cgroup and its descendants, as perf -G counts them"""
+    tids = []
+    for d, dirs, files in os.walk(os.path.join(root, normalize(path).lstrip("/"))):
+        # cgroup v2 lists threads in cgroup.threads, v1 in tasks
+        name = "cgroup.threads" if "cgroup.threads" in files else "tasks"
+        try:
+            with open(os.path.join(d, name)) as f:
+                tids.extend([int(l) for l in f if l.strip()])
+        except (IOError, OSError, ValueError):
+            continue
+    return tids
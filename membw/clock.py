@@ -0,0 +1,72 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Interval deadlines on the monotonic clock"""
+
+import time
+
+try:
+    monotonic = time.monotonic
+except AttributeError:
+    # python2 has no time.monotonic, ask libc for CLOCK_MONOTONIC
+    import ctypes
+    import ctypes.util
+
+    CLOCK_MONOTONIC = 1
+
+    class timespec(ctypes.Structure):
+        _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+    try:
+        _clock_gettime = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",\
+                use_errno=True).clock_gettime
+        _clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+    except (OSError, AttributeError):
+        _clock_gettime = None
+
+    def monotonic():
+        if _clock_gettime is None:
+            return time.time()
+        t = timespec()
+        if _clock_gettime(CLOCK_MONOTONIC, ctypes.byref(t)) != 0:
+            return time.time()
+        return t.tv_sec + t.tv_nsec * 1e-9
+
+class Ticker(object):
+    """Deadlines every interval seconds, aligned to wall clock multiples of it
+
+    Deadlines are fixed on the monotonic clock once, so neither the work
+    done between them nor wall clock steps make them drift. Deadlines
+    already passed by a whole interval are skipped and counted in missed.
+    clock and sleep are the monotonic clock and the sleep it's read with.
+    """
+    def __init__(self, interval, align=True, clock=monotonic, sleep=time.sleep):
+        self.interval = interval
+        self.clock = clock
+        self.sleep = sleep
+        self.start = clock() + ((-time.time()) % interval if align else 0.0)
+        self.n = 0
+        self.missed = 0
+
+    def wait(self):
+        """Sleep to the next deadline, return its wall clock time"""
+        deadline = self.start + self.n * self.interval
+        now = self.clock()
+        if now >= deadline + self.interval:
+            skip = int((now - deadline) / self.interval)
+            self.missed += skip
+            self.n += skip
+            deadline += skip * self.interval
+        if deadline > now:
+            self.sleep(deadline - now)
+        self.n += 1
+        return time.time() - (self.clock() - deadline)
+
+    def timeout(self):
+        """Seconds until the next deadline, 0 if it has passed"""
+        return max(self.start + self.n * self.interval - self.clock(), 0.0)
+
+    def due(self):
+        """Wall clock time of the next deadline once it has passed, None before"""
+        if self.timeout() > 0.0:
+            return None
+        return self.wait()
@@ -0,0 +1,358 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""bw-cluster.py: merge the intervals of bw-report.py --send agents into cluster-wide top views"""
+
+import os
+import sys
+import json
+import time
+import errno
+import heapq
+import select
+import socket
+import struct
+import argparse
+import collections
+from signal import signal, SIGINT, SIGTERM
+
+from membw import agent, sink
+from membw.clock import Ticker
+
+DEFAULT_INTERVAL = 5
+DEFAULT_TOP = 10
+DEFAULT_WINDOW = 1
+DEFAULT_EXPIRE = 30
+
+# what the rows of an agent are, by its --by or cgroup mode, and the
+# views they're merged into
+VIEWS = ("task", "command", "cgroup", "user")
+ROW_VIEWS = {
+    "thread": ("task", "command"),
+    "process": ("task", "command"),
+    "command": ("command",),
+    "cgroup": ("cgroup",),
+    "user": ("user",),
+}
+
+# --sort choices and their index in the merged values
+SORT_KEYS = {"dram-read": 0, "dram-write": 1, "pmem-read": 2, "pmem-write": 3}
+
+# MiB/s of a sink Row, DRAM read, DRAM write, PMEM read, PMEM write
+ROW_BW = (0, 2, 4, 6)
+
+# a frame over this is taken for a broken stream
+MAX_FRAME = 64 * 1024 * 1024
+
+class Host(object):
+    """An agent, its session and what it adds to the views"""
+    def __init__(self, name, session, by, pmem):
+        self.name = name
+        self.session = session
+        self.by = by
+        self.pmem = pmem
+        self.last_ts = None
+        self.seen = 0.0
+        # the contributions of its last window intervals, oldest first
+        self.window = collections.deque()
+
+class Cluster(object):
+    """Cluster-wide bandwidth merged interval by interval
+
+    Every view is {key: [count, 4 MiB/s means]} over the last window
+    intervals of every host, or the ones a host has so far, each weighing
+    1/n of the n it has. An interval is added and the one falling out of
+    the window taken back out, so a merge costs the rows of that interval
+    and not the size of the cluster. Task keys are (host, pid, comm), the
+    other views key by the name, merged across hosts.
+    """
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self.hosts = {}
+        self.views = dict((v, {}) for v in VIEWS)
+        self.totals = [0.0, 0.0, 0.0, 0.0]
+
+    def hello(self, name, session, by, pmem):
+        h = self.hosts.get(name)
+        if h is not None and h.session == session:
+            return h
+        # a new run on that host, what the old one added goes
+        if h is not None:
+            self.drop(name)
+        h = Host(name, session, by, pmem)
+        self.hosts[name] = h
+        return h
+
+    def apply(self, contrib, sign, weight):
+        t, entries = contrib
+        self.totals = [a + sign * weight * b for a, b in zip(self.totals, t)]
+        for view, key, v in entries:
+            d = self.views[view]
+            e = d.get(key)
+            if e is None:
+                e = d[key] = [0, 0.0, 0.0, 0.0, 0.0]
+            e[0] += sign
+            if e[0] <= 0:
+                # nothing left of it, float leftovers included
+                del d[key]
+                continue
+            for i in range(4):
+                e[i + 1] += sign * weight * v[i]
+
+    def add(self, h, ts, totals, rows, now=None):
+        """An interval of host h, False if it had it already"""
+        if h.last_ts is not None and ts <= h.last_ts:
+            return False
+        h.last_ts = ts
+        h.seen = time.time() if now is None else now
+        entries = []
+        views = ROW_VIEWS.get(h.by, ())
+        for r in rows:
+            v = [r.values[i] for i in ROW_BW]
+            for view in views:
+                entries.append((view, (h.name, r.pid, r.comm) if view == "task" else r.comm, v))
+        contrib = (sink.overall(totals), entries)
+        n = len(h.window)
+        if n < self.window:
+            # the window is filling up, every interval of the host goes
+            # from 1/n of its means to 1/(n + 1)
+            for c in h.window:
+                self.apply(c, -1, 1.0 / n)
+            h.window.append(contrib)
+            for c in h.window:
+                self.apply(c, 1, 1.0 / (n + 1))
+        else:
+            self.apply(h.window.popleft(), -1, 1.0 / n)
+            h.window.append(contrib)
+            self.apply(contrib, 1, 1.0 / n)
+        return True
+
+    def drop(self, name):
+        h = self.hosts.pop(name, None)
+        if h is not None:
+            n = len(h.window)
+            while h.window:
+                self.apply(h.window.popleft(), -1, 1.0 / n)
+
+    def expire(self, now, after):
+        """Drop the hosts not heard from for after seconds, return their names"""
+        gone = [n for n, h in self.hosts.items() if h.window and now - h.seen > after]
+        for n in gone:
+            self.drop(n)
+        return gone
+
+    def top(self, view, n, col=0):
+        """n heaviest (key, 4 MiB/s means over the window) of a view"""
+        items = self.views[view].items()
+        best = heapq.nlargest(n, items, key=lambda x: x[1][col + 1]) if n else\
+                sorted(items, key=lambda x: -x[1][col + 1])
+        return [(k, e[1:]) for k, e in best]
+
+    def mean_totals(self):
+        return list(self.totals)
+
+class Conn(object):
+    """An agent connection and the frames it's cut into"""
+    def __init__(self, sock, peer):
+        self.sock = sock
+        self.peer = peer
+        self.buf = b""
+        self.host = None
+
+    def frames(self):
+        # hello meta first, then record bodies, ValueError on a broken stream,
+        # what's left of the buffer is kept once it's all taken
+        buf = self.buf
+        p = 0
+        while True:
+            if self.host is None:
+                n = len(agent.HELLO_MAGIC) + agent.HELLO.size
+                if len(buf) - p < n:
+                    break
+                if buf[p:p + len(agent.HELLO_MAGIC)] != agent.HELLO_MAGIC:
+                    raise ValueError("not a bw-report.py agent")
+                version, length = agent.HELLO.unpack_from(buf, p + len(agent.HELLO_MAGIC))
+                if version != agent.HELLO_VERSION or length > MAX_FRAME:
+                    raise ValueError("agent version %d isn't supported" % version)
+            else:
+                n = sink.REC_LEN.size
+                if len(buf) - p < n:
+                    break
+                length = sink.REC_LEN.unpack_from(buf, p)[0]
+                if length > MAX_FRAME:
+                    raise ValueError("record of %d bytes" % length)
+            if len(buf) - p < n + length:
+                break
+            body = buf[p + n:p + n + length]
+            p += n + length
+            yield body
+        self.buf = buf[p:]
+
+class Server(object):
+    """Listening sockets and agent connections, read with select()"""
+    def __init__(self, cluster, addrs):
+        self.cluster = cluster
+        self.listeners = []
+        self.unix_paths = []
+        self.conns = {}
+        for family, a in addrs:
+            if family == "unix":
+                if os.path.exists(a):
+                    os.remove(a)
+                s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                s.bind(a)
+                self.unix_paths.append(a)
+            else:
+                s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                s.bind(a)
+            s.listen(64)
+            s.setblocking(False)
+            self.listeners.append(s)
+
+    def poll(self, timeout):
+        """Take in whatever arrives within timeout seconds"""
+        try:
+            ready = select.select(self.listeners + list(self.conns), [], [], max(timeout, 0))[0]
+        except (select.error, OSError) as e:
+            if e.args[0] == errno.EINTR:
+                return
+            raise
+        for s in ready:
+            if s in self.listeners:
+                self.accept(s)
+            else:
+                self.receive(self.conns[s])
+
+    def accept(self, ls):
+        try:
+            s, peer = ls.accept()
+        except (IOError, OSError, socket.error):
+            return
+        s.setblocking(False)
+        self.conns[s] = Conn(s, peer if peer else "unix")
+
+    def receive(self, c):
+        try:
+            data = c.sock.recv(262144)
+        except (IOError, OSError, socket.error) as e:
+            if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            data = b""
+        if not data:
+            self.close(c)
+            return
+        c.buf += data
+        now = time.time()
+        try:
+            for body in c.frames():
+                if c.host is None:
+                    meta = json.loads(body.decode("utf-8"))
+                    c.host = self.cluster.hello(meta["host"], meta["session"], meta["by"], meta["pmem"])
+                else:
+                    self.cluster.add(c.host, *sink.decode_binary(body), now=now)
+        except (ValueError, KeyError, TypeError, struct.error) as e:
+            sys.stderr.write("Dropping agent %s: %s\n" % (c.peer, e))
+            self.close(c)
+
+    def close(self, c):
+        del self.conns[c.sock]
+        c.sock.close()
+
+    def shutdown(self):
+        for c in list(self.conns.values()):
+            self.close(c)
+        for s in self.listeners:
+            s.close()
+        for p in self.unix_paths:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+def label(view, key):
+    if view == "task":
+        host, pid, comm = key
+        return "%s %s %s" % (host, pid, comm)
+    return key
+
+def report(cluster, top, sort, start_time):
+    # one block per interval, the totals and the views with anything in them
+    pmem = any([h.pmem for h in cluster.hosts.values()])
+    cols = 4 if pmem else 2
+    names = ("DramReadBW", "DramWriteBW", "PmemReadBW", "PmemWriteBW")[:cols]
+    t = cluster.mean_totals()
+    out = ["%8s %d host(s), %s\n" % (start_time, len(cluster.hosts), ", ".join(["%s %.1f MiB/s" % (names[i], t[i])\
+            for i in range(cols)]))]
+    for view in VIEWS:
+        rows = cluster.top(view, top, SORT_KEYS[sort])
+        if not rows:
+            continue
+        out.append("%8s top %s by %s\n" % (start_time, view, sort))
+        for k, v in rows:
+            out.append("%8s   %s  %s\n" % (start_time, "".join(["%16.1f MiB/s" % v[i] for i in range(cols)]),\
+                    label(view, k)))
+    sys.stdout.write("".join(out))
+    sys.stdout.flush()
+
+def parse_args(argv):
+    ap = argparse.ArgumentParser(description='Merge the per-interval bandwidth of bw-report.py --send agents '\
+            'into cluster-wide top views.')
+    ap.add_argument('-listen', '--listen', nargs='+', required=True, metavar='ADDR',\
+            help='addresses agents connect to, [HOST:]PORT or unix:PATH')
+    ap.add_argument('-i', '--interval', type=int, default=DEFAULT_INTERVAL,\
+            help='print the views every N seconds, default %d' % DEFAULT_INTERVAL)
+    ap.add_argument('-t', '--time', type=int, default=0,\
+            help='stop after N seconds, default 0 to run until interrupted')
+    ap.add_argument('-window', '--window', type=int, default=DEFAULT_WINDOW, metavar='N',\
+            help='average over the last N intervals of every host, default %d' % DEFAULT_WINDOW)
+    ap.add_argument('-top', '--top', type=int, default=DEFAULT_TOP,\
+            help='rows of every view, default %d, 0 for all' % DEFAULT_TOP)
+    ap.add_argument('-sort', '--sort', choices=sorted(SORT_KEYS), default='dram-read',\
+            help='bandwidth the views are ordered by, default dram-read')
+    ap.add_argument('-expire', '--expire', type=int, default=DEFAULT_EXPIRE, metavar='S',\
+            help='drop a host not heard from for S seconds, default %d' % DEFAULT_EXPIRE)
+    args = ap.parse_args(argv)
+    if args.interval <= 0 or args.time < 0 or args.window < 1 or args.top < 0 or args.expire <= 0:
+        ap.error("invalid --interval, --time, --window, --top or --expire")
+    try:
+        addrs = [agent.parse_address(a) for a in args.listen]
+    except ValueError as e:
+        ap.error("invalid listen address: %s" % e)
+    return args, addrs
+
+def stop(sig, frame):
+    raise KeyboardInterrupt
+
+def main(argv=None):
+    """Run bw-cluster.py with argv, return its exit code"""
+    args, addrs = parse_args(argv)
+    cluster = Cluster(args.window)
+    try:
+        server = Server(cluster, addrs)
+    except (IOError, OSError, socket.error) as e:
+        sys.exit("Can't listen: %s" % e)
+    signal(SIGTERM, stop)
+    signal(SIGINT, stop)
+    print("Merging agents on %s, every %d seconds." % (", ".join([agent.describe(a) for a in addrs]),\
+            args.interval))
+
+    ticker = Ticker(args.interval)
+    end = time.time() + args.time if args.time else None
+    # the first deadline starts the first interval
+    started = None
+    try:
+        while end is None or time.time() < end:
+            now = ticker.due()
+            if now is not None:
+                if started is not None:
+                    for n in cluster.expire(now, args.expire):
+                        print("%8s %s expired" % (started, n))
+                    report(cluster, args.top, args.sort, started)
+                started = time.strftime("%H:%M:%S", time.localtime(now))
+            server.poll(ticker.timeout())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+    print("Done!")
+    return 0
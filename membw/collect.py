@@ -0,0 +1,288 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""bw-collect.py: run perf for the task, uncore and system wide counts"""
+
+import os
+import sys
+import time
+import errno
+import argparse
+import subprocess
+from signal import signal, SIGINT, SIGTERM
+from membw.events import supported_cpus, uncore_dram_read, uncore_dram_write, uncore_pmem_read,\
+        uncore_pmem_write, core_all_stores, task_events, plan_groups, group_arg, get_cpu_model
+from membw.perfcsv import CSV_SEP
+
+# set up by main(), importing runs nothing
+FNULL = None
+perf = "perf"
+sys_root = "/sys"
+cpuinfo = "/proc/cpuinfo"
+interval_ms = 0
+pruns = []
+log_dir = None
+pmem_mon = False
+per_socket = False
+
+class PerfRun(object):
+    """Control a perf process"""
+    def __init__(self):
+        self.perf = None
+
+    def execute(self, r):
+        self.perf = subprocess.Popen(r, stdout=FNULL)
+
+    def wait(self):
+        ret = 0
+        if self.perf:
+            ret = self.perf.wait()
+        return ret
+
+    def poll(self):
+        if self.perf:
+            return self.perf.poll()
+        return 0
+
+    def stop(self):
+        # SIGINT makes perf stop the workload and flush what it has
+        if self.perf and self.perf.poll() is None:
+            self.perf.send_signal(SIGINT)
+        return self.wait()
+
+def interval_args():
+    if interval_ms:
+        return ['-I', str(interval_ms)]
+    return []
+
+def workload_args(measure_time):
+    if measure_time == 0:
+        return ['--', 'sleep', 'infinity']
+    return ['--', 'sleep', '%d' % (measure_time)]
+
+def prepare_log(lp):
+    if path_exists(lp):
+        os.remove(lp)
+
+    # in stream mode perf writes into a FIFO drained by bw-report.py,
+    # so nothing piles up on disk however long the session runs
+    if interval_ms:
+        os.mkfifo(lp, 0o600)
+
+def task_groups(cpu):
+    # the shared perf counts ALL_STORES on every CPU, one counter less
+    # for the task events, groups that still don't fit are multiplexed
+    return plan_groups(task_events(cpu, pmem_mon), reserved=1)
+
+def task_args(cpu, measure_time, pids, cgroups=None):
+    cmd = [perf, 'stat', '-x', CSV_SEP]
+    groups = task_groups(cpu)
+
+    if cgroups:
+        # -G applies to the events listed before it, so every cgroup gets
+        # its own copy of the task events, one count per cgroup and event
+        cmd.append('-a')
+        if per_socket:
+            cmd.append('-A')
+        n = sum([len(g) for g in groups])
+        for cg in cgroups:
+            for g in groups:
+                cmd.extend(['-e', group_arg(g)])
+            cmd.extend(['-G', ','.join([cg] * n)])
+        cmd.extend(['-o', os.path.join(log_dir, "task.log")])
+        cmd.extend(interval_args())
+        cmd.extend(workload_args(measure_time))
+        return cmd
+
+    if pids == [-1]:
+        cmd.extend(['-a', '--per-thread'])
+    elif per_socket:
+        # perf can't do --per-thread and -A at once, per-CPU counts of a
+        # single target tell which socket its traffic comes from
+        cmd.extend(['-p', str(pids[0]), '-A'])
+    else:
+        # one perf for all targets, bw-report.py folds threads back into them
+        cmd.extend(['-p', ','.join([str(pid) for pid in pids]), '--per-thread'])
+    for g in groups:
+        cmd.extend(['-e', group_arg(g)])
+    cmd.extend(['-o', os.path.join(log_dir, "task.log")])
+    cmd.extend(interval_args())
+    cmd.extend(workload_args(measure_time))
+
+    return cmd
+
+def start_task(cpu, measure_time, pids, cgroups=None):
+    lp = os.path.join(log_dir, "task.log")
+
+    prepare_log(lp)
+
+    task = PerfRun()
+    # collect per-task OCR DRAM/PMEM reads/writes, and MEM_INST_RETIRED.ALL_STORES
+    task.execute(task_args(cpu, measure_time, pids, cgroups))
+    return task
+
+exists_cache = dict()
+
+def path_exists(s):
+    if s in exists_cache:
+        return exists_cache[s]
+    found = os.path.exists(s)
+    exists_cache[s] = found
+    return found
+
+def multiple_imc(cpu, l):
+    i = 0
+
+    while True:
+        if i == 12:
+            break
+        path = os.path.join(sys_root, "devices/uncore_imc_%d" % i)
+        if path_exists(path):
+            l.append("-e")
+            s = uncore_dram_read[cpu]
+            s = s.replace("INDEX", str(i))
+            l.append(s)
+
+            l.append("-e")
+            s = uncore_dram_write[cpu]
+            s = s.replace("INDEX", str(i))
+            l.append(s)
+
+            if pmem_mon:
+                l.append("-e")
+                s = uncore_pmem_read[cpu]
+                s = s.replace("INDEX", str(i))
+                l.append(s)
+
+                l.append("-e")
+                s = uncore_pmem_write[cpu]
+                s = s.replace("INDEX", str(i))
+                l.append(s)
+        i += 1
+
+def shared_args(cpu, measure_time, log_path):
+    # the IMC counts and the system wide stores are both per-CPU(-A), one
+    # perf counts them all, time enabled gives the measure time in CSV mode
+    l = [perf, "stat", "-x", CSV_SEP, "-a", "-A"]
+    mult_imc = 0
+    if path_exists(os.path.join(sys_root, "devices/uncore_imc")):
+        l.extend(["-e", uncore_dram_read[cpu], "-e", uncore_dram_write[cpu]])
+    elif path_exists(os.path.join(sys_root, "devices/uncore_imc_0")):
+        multiple_imc(cpu, l)
+        mult_imc = 1
+    else:
+        print("Can't find uncore imc box. Missing kernel support?")
+        sys.exit(-1)
+    l.extend(["-e", core_all_stores[cpu], "-o", log_path])
+    l.extend(interval_args())
+    l.extend(workload_args(measure_time))
+    return l, mult_imc
+
+def start_shared(cpu, measure_time):
+    lp = os.path.join(log_dir, "shared.log")
+
+    prepare_log(lp)
+
+    shared = PerfRun()
+    # collect uncore IMC reads/writes and system wide MEM_INST_RETIRED.ALL_STORES
+    l, mult_imc = shared_args(cpu, measure_time, lp)
+
+    shared.execute(l)
+    return shared, mult_imc
+
+def get_pid_max():
+    m = os.popen('cat /proc/sys/kernel/pid_max').read().strip()
+    return int(m)
+
+def tool_installed(name):
+    try:
+        devnull = open(os.devnull)
+        subprocess.Popen([name], stdout=devnull, stderr=devnull).communicate()
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            return False
+    return True
+
+def stop_all(sig, frame):
+    for r in pruns:
+        r.stop()
+    sys.exit(0)
+
+def main(argv=None):
+    """Run bw-collect.py with argv, return its exit code"""
+    global FNULL, interval_ms, pruns, log_dir, pmem_mon, per_socket
+    FNULL = open(os.devnull, 'w')
+    pruns = []
+    m_time = 5
+
+    cpu_model = get_cpu_model(cpuinfo)
+    if cpu_model not in supported_cpus:
+        sys.exit("CPU not supported!")
+
+    if not tool_installed(perf):
+        sys.exit("perf not available. Please install it first.")
+
+    p = argparse.ArgumentParser(description='Collect per-task memory read/write bandwidth.')
+    p.add_argument('-p', '--pid', default="-1",\
+            help='task PID(s) to be monitored, multi PIDs with comma in between, default -1 for all tasks')
+    p.add_argument('-G', '--cgroup', default="",\
+            help='cgroup(s) to be monitored instead of tasks, relative to the cgroup root, '\
+            'multi cgroups with comma in between')
+    p.add_argument('-t', '--time', type=int, help='measure time in seconds, default 5s')
+    p.add_argument('-i', '--interval', type=int, default=0,\
+            help='stream mode: keep perf running for the whole measure time and print counts '\
+            'every INTERVAL seconds into FIFOs, 0 measure time for infinite, default off')
+    p.add_argument('-pmem', '--pmem', action="store_true",\
+            help='monitor persistent memory bandwidth too, default not')
+    p.add_argument('-o', '--log-dir', default="",\
+            help='directory the perf logs are written to, default ./logs')
+    p.add_argument('-only', '--only', choices=("all", "task", "shared"), default="all",\
+            help='only the task events, or only the uncore and system wide ones shared by all tasks, '\
+            'default all')
+    p.add_argument('-S', '--per-socket', action="store_true",\
+            help='count the task events per CPU, for a single PID or for cgroups, default not')
+
+    args = p.parse_args(argv)
+    try:
+        p_ids = [int(pid) for pid in args.pid.split(",")]
+    except ValueError:
+        sys.exit("Invalid PID: %s" % args.pid)
+    for pid in p_ids:
+        if pid > get_pid_max() or pid < -1 or (pid == -1 and len(p_ids) > 1):
+            sys.exit("Invalid PID: %d" % pid)
+    cgroups = [cg for cg in args.cgroup.split(",") if cg]
+    if args.interval < 0:
+        sys.exit("Invalid interval: %d" % args.interval)
+    interval_ms = args.interval * 1000
+    if args.time != "":
+        m_time = int(args.time)
+        if m_time < 0 or (m_time == 0 and not interval_ms):
+            sys.exit("Invalid measure time: %d" % m_time)
+    pmem_mon = args.pmem
+    per_socket = args.per_socket
+    if per_socket and args.only != "shared" and not cgroups and (p_ids == [-1] or len(p_ids) > 1):
+        sys.exit("--per-socket needs a single PID or cgroups")
+
+    log_dir = args.log_dir if args.log_dir else os.path.join(os.getcwd(), "logs")
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+
+    # uncore and system wide stores are shared by all monitored tasks
+    multi_imc = 0
+    if args.only != "task":
+        shared_prun, multi_imc = start_shared(cpu_model, m_time)
+        pruns.append(shared_prun)
+    if args.only != "shared":
+        pruns.append(start_task(cpu_model, m_time, p_ids, cgroups))
+
+    if interval_ms:
+        signal(SIGTERM, stop_all)
+        # the task going away ends the stream, don't leave system-wide perfs behind
+        while all([r.poll() is None for r in pruns]):
+            time.sleep(0.5)
+        for r in pruns:
+            r.stop()
+
+    for r in pruns:
+        r.wait()
+
+    return multi_imc
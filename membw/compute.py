@@ -0,0 +1,173 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Per-task bandwidth over aligned columns, NumPy when available"""
+
+import heapq
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EVENTS = ("OCR_READ_DRAM", "OCR_READ_PMEM", "OCR_WRITE_PMEM", "MEM_INST_RETIRED.ALL_STORES")
+DRAM_READ, PMEM_READ, PMEM_WRITE, STORES = range(len(EVENTS))
+
+# tasks below this share of every total are not listed
+MIN_SHARE = 0.0005
+
+MiB = 1024.0 * 1024.0
+
+class TaskTable(object):
+    """Per-task counts pivoted into aligned columns, one row per task key"""
+    __slots__ = ("ids", "cols")
+
+    def __init__(self, ids, cols):
+        self.ids = ids
+        self.cols = cols
+
+    def __len__(self):
+        return len(self.ids)
+
+def columns(ids, dram_read, pmem_read=None, pmem_write=None, stores=None):
+    """Build a TaskTable from per-task lists of counts(64B lines), missing ones are 0"""
+    cols = []
+    for c in (dram_read, pmem_read, pmem_write, stores):
+        if c is None:
+            c = [0.0] * len(ids)
+        cols.append(np.array(c, dtype=np.float64) if np is not None else [float(v) for v in c])
+    return TaskTable(ids, cols)
+
+def pivot(task):
+    """Build a TaskTable from task Counts, rows with a None key are dropped"""
+    col_of = dict((e, i) for i, e in enumerate(EVENTS))
+    index = {}
+    setdefault = index.setdefault
+    inv = [setdefault(k, len(index)) for k in task.keys]
+    ev = [-1 if k is None else col_of.get(e, -1) for k, e in zip(task.keys, task.events)]
+
+    ids = [None] * len(index)
+    for k, i in index.items():
+        ids[i] = k
+    n = len(ids)
+
+    if np is not None:
+        inv = np.array(inv, dtype=np.intp)
+        ev = np.array(ev, dtype=np.intp)
+        values = np.frombuffer(task.values, dtype=np.float64) if len(task) else np.zeros(0)
+        cols = []
+        for c in range(len(EVENTS)):
+            m = ev == c
+            cols.append(np.bincount(inv[m], weights=values[m], minlength=n).astype(np.float64))
+        return TaskTable(ids, cols)
+
+    cols = [[0.0] * n for e in EVENTS]
+    for i, c, v in zip(inv, ev, task.values):
+        if c >= 0:
+            cols[c][i] += v
+    return TaskTable(ids, cols)
+
+def aggregate(table, keys):
+    """Sum the rows of table sharing a key, keys is aligned with table.ids
+
+    Returns the grouped TaskTable and, for every row of table, the index
+    of the group it went into.
+    """
+    index = {}
+    setdefault = index.setdefault
+    inv = [setdefault(k, len(index)) for k in keys]
+
+    ids = [None] * len(index)
+    for k, i in index.items():
+        ids[i] = k
+    n = len(ids)
+
+    if np is not None:
+        inv = np.array(inv, dtype=np.intp)
+        cols = [np.bincount(inv, weights=c, minlength=n).astype(np.float64) for c in table.cols]
+        return TaskTable(ids, cols), inv
+
+    cols = []
+    for c in table.cols:
+        s = [0.0] * n
+        for i, v in zip(inv, c):
+            s[i] += v
+        cols.append(s)
+    return TaskTable(ids, cols), inv
+
+def take(table, rows, ids=None):
+    """TaskTable of the given rows of table, renamed to ids if given"""
+    if ids is None:
+        ids = [table.ids[i] for i in rows]
+    if np is not None:
+        rows = np.array(rows, dtype=np.intp)
+        return TaskTable(ids, [c[rows] for c in table.cols])
+    return TaskTable(ids, [[c[i] for i in rows] for c in table.cols])
+
+def members(inv, g):
+    """Rows that aggregate() put into group g"""
+    if np is not None:
+        return np.nonzero(inv == g)[0]
+    return [i for i, x in enumerate(inv) if x == g]
+
+class TaskBW(object):
+    """Per-task bandwidths(MiB/s) and shares(0..1) of the IMC totals"""
+    __slots__ = ("ids", "read_bw", "read_share", "write_bw", "write_share",\
+            "pmem_read_bw", "pmem_read_share", "pmem_write_bw", "pmem_write_share", "listed")
+
+    def order(self, key="read_bw", n=0, rows=None):
+        """Indices of listed tasks, heaviest first by key, only the top n if n > 0
+
+        rows orders those rows instead of the listed ones.
+        """
+        listed = self.listed if rows is None else rows
+        col = getattr(self, key)
+        if np is not None:
+            if n > 0 and n < len(listed):
+                listed = listed[np.argpartition(-col[listed], n - 1)[:n]]
+            return listed[np.argsort(-col[listed], kind="mergesort")].tolist()
+
+        if n > 0 and n < len(listed):
+            return heapq.nlargest(n, listed, key=col.__getitem__)
+        return sorted(listed, key=col.__getitem__, reverse=True)
+
+def task_bw(table, task_time, dram_read_bw, dram_write_bw, pmem_read_bw, pmem_write_bw, system_stores):
+    """Per-task bandwidth of a TaskTable against the IMC totals(MiB/s)
+
+    Write bandwidth has no per-task counter, it's estimated from the
+    task's share of all retired stores.
+    """
+    scale = 64.0 / MiB / task_time
+    dram_read, pmem_read, pmem_write, stores = table.cols
+    b = TaskBW()
+    b.ids = table.ids
+
+    if np is not None:
+        def share(bw, total):
+            return bw / total if total != 0 else np.zeros(len(bw))
+
+        b.read_bw = dram_read * scale
+        b.read_share = share(b.read_bw, dram_read_bw)
+        b.write_share = stores / system_stores if system_stores > 0 else np.zeros(len(stores))
+        b.write_bw = b.write_share * dram_write_bw
+        b.pmem_read_bw = pmem_read * scale
+        b.pmem_read_share = share(b.pmem_read_bw, pmem_read_bw)
+        b.pmem_write_bw = pmem_write * scale
+        b.pmem_write_share = share(b.pmem_write_bw, pmem_write_bw)
+        b.listed = np.nonzero((b.read_share > MIN_SHARE) | (b.write_share > MIN_SHARE) |\
+                (b.pmem_read_share > MIN_SHARE))[0]
+        return b
+
+    def share(bw, total):
+        return [v / total for v in bw] if total != 0 else [0.0] * len(bw)
+
+    b.read_bw = [v * scale for v in dram_read]
+    b.read_share = share(b.read_bw, dram_read_bw)
+    b.write_share = [float(v) / system_stores for v in stores] if system_stores > 0 else [0.0] * len(stores)
+    b.write_bw = [v * dram_write_bw for v in b.write_share]
+    b.pmem_read_bw = [v * scale for v in pmem_read]
+    b.pmem_read_share = share(b.pmem_read_bw, pmem_read_bw)
+    b.pmem_write_bw = [v * scale for v in pmem_write]
+    b.pmem_write_share = share(b.pmem_write_bw, pmem_write_bw)
+    b.listed = [i for i in range(len(b.ids)) if b.read_share[i] > MIN_SHARE or\
+            b.write_share[i] > MIN_SHARE or b.pmem_read_share[i] > MIN_SHARE]
+    return b
@@ -0,0 +1,171 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Collect the bw-collect.py event sets in-process, without running perf"""
+
+import os
+import time
+
+from membw import events
+from membw.perfcsv import Counts
+from membw.perf_event import EventSpec, EventGroup, Syscalls, SYSFS_PMU, parse_cpu_list, read_file
+
+# scans between reads of a known thread's comm, it only changes on exec
+# or a rename and reading it for every thread every interval adds up
+COMM_REFRESH = 8
+
+def raise_fd_limit():
+    # one fd per event per thread adds up quickly in all-tasks mode
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+def add_group(c, key, g):
+    values, enabled, running = g.delta()
+    for e, v in zip(g.events, values):
+        c.append(key, e.name, v, enabled, running)
+
+class DirectCollector(object):
+    """Task, system-store and IMC counters read with perf_event_open
+
+    pids is [-1] for all tasks, otherwise threads are counted under the
+    target PID they belong to, system-store and IMC counts are shared.
+    """
+    def __init__(self, cpu, pids, pmem_mon, sys_root="/sys", proc_root="/proc", sc=None):
+        self.pids = pids
+        self.proc_root = proc_root
+        self.sc = sc if sc else Syscalls()
+        self.task_groups = {}
+        self.scans = 0
+        self.system_groups = []
+        self.imc_groups = []
+        raise_fd_limit()
+
+        # the system wide ALL_STORES below takes a counter on every CPU
+        self.task_specs = [[EventSpec(s, sys_root) for s in g]\
+                for g in events.plan_groups(events.task_events(cpu, pmem_mon), reserved=1)]
+        store_spec = EventSpec(events.core_all_stores[cpu], sys_root)
+
+        # system wide ALL_STORES, one group on every online CPU
+        cpus = parse_cpu_list(read_file(os.path.join(sys_root, "devices/system/cpu/online")))
+        for c in cpus:
+            self.system_groups.append(EventGroup(self.sc, [store_spec], -1, c))
+
+        # IMC boxes count per socket, open them on the CPU in their cpumask
+        pmu_dir = os.path.join(sys_root, SYSFS_PMU)
+        for box in sorted(os.listdir(pmu_dir)):
+            if not box.startswith("uncore_imc"):
+                continue
+            index = box[len("uncore_imc_"):] if box != "uncore_imc" else "0"
+            specs = [EventSpec(s.replace("uncore_imc_" + index, box), sys_root)
+                    for s in events.imc_events(cpu, pmem_mon, index)]
+            for c in parse_cpu_list(read_file(os.path.join(pmu_dir, box, "cpumask"))):
+                self.imc_groups.append(EventGroup(self.sc, specs, -1, c))
+        if not self.imc_groups:
+            self.close()
+            raise OSError("Can't find uncore imc box. Missing kernel support?")
+
+        self.scan_tasks()
+        for g in self.system_groups + self.imc_groups:
+            g.enable()
+        self.last = time.time()
+        self.sample()
+
+    def task_ids(self):
+        # (pid, tid) of every thread being monitored
+        pids = self.pids if self.pids != [-1] else [p for p in os.listdir(self.proc_root) if p.isdigit()]
+        ids = []
+        for pid in pids:
+            d = os.path.join(self.proc_root, str(pid), "task")
+            try:
+                ids.extend([(str(pid), int(t)) for t in os.listdir(d)])
+            except OSError:
+                # target is gone, or raced with an exiting process
+                continue
+        return ids
+
+    def task_key(self, pid, tid):
+        # the target PID a thread is counted under, comm-tid for all tasks
+        if self.pids != [-1]:
+            return pid
+        return "%s-%d" % (read_file(os.path.join(self.proc_root, pid, "task", str(tid), "comm")), tid)
+
+    def scan_tasks(self):
+        # only new threads are opened and have their comm read, a known
+        # thread's comm is read again every COMM_REFRESH scans for an exec
+        self.scans += 1
+        seen = set()
+        for pid, tid in self.task_ids():
+            seen.add(tid)
+            known = self.task_groups.get(tid)
+            if known is not None:
+                if self.pids == [-1] and (tid + self.scans) % COMM_REFRESH == 0:
+                    try:
+                        known[0] = self.task_key(pid, tid)
+                    except (IOError, OSError):
+                        pass
+                continue
+            try:
+                key = self.task_key(pid, tid)
+            except (IOError, OSError):
+                # raced with an exiting thread
+                continue
+            groups = []
+            try:
+                for specs in self.task_specs:
+                    groups.append(EventGroup(self.sc, specs, tid, -1))
+            except OSError:
+                for g in groups:
+                    g.close()
+                continue
+            for g in groups:
+                g.enable()
+            self.task_groups[tid] = [key, groups]
+        return seen
+
+    def sample(self):
+        """Return (elapsed, task, system, unc) Counts since the last call
+
+        None is returned once all monitored PIDs have gone away.
+        """
+        now = time.time()
+        elapsed = now - self.last
+        self.last = now
+
+        task = Counts()
+        for tid in list(self.task_groups):
+            key, groups = self.task_groups[tid]
+            for g in groups:
+                add_group(task, key, g)
+
+        system = Counts()
+        for g in self.system_groups:
+            add_group(system, "CPU%d" % g.cpu, g)
+
+        unc = Counts()
+        for g in self.imc_groups:
+            add_group(unc, "CPU%d" % g.cpu, g)
+
+        try:
+            seen = self.scan_tasks()
+        except OSError:
+            seen = set()
+        # exited threads already gave their final counts above
+        for tid in [t for t in self.task_groups if t not in seen]:
+            for g in self.task_groups[tid][1]:
+                g.close()
+            del self.task_groups[tid]
+
+        if self.pids != [-1] and not seen:
+            return None
+        return elapsed, task, system, unc
+
+    def close(self):
+        for key, groups in self.task_groups.values():
+            for g in groups:
+                g.close()
+        for g in self.system_groups + self.imc_groups:
+            g.close()
@@ -0,0 +1,91 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Find target processes in /proc by comm, cmdline or cgroup"""
+
+import os
+import re
+
+from membw.procinfo import read_cmdline, read_ppid
+
+KINDS = ("comm", "cmdline", "cgroup")
+
+# parents walked up from a match to tell whether an excluded PID started it
+MAX_DEPTH = 64
+
+class Matcher(object):
+    """One --match, 'comm:REGEX', 'cmdline:SUBSTRING' or 'cgroup:PATH'"""
+    __slots__ = ("kind", "pattern", "regex")
+
+    def __init__(self, kind, pattern):
+        self.kind = kind
+        self.pattern = pattern
+        self.regex = re.compile(pattern) if kind == "comm" else None
+
+    def match(self, proc_root, pid, comm):
+        if self.kind == "comm":
+            return self.regex.search(comm) is not None
+        if self.kind == "cmdline":
+            return self.pattern in read_cmdline(proc_root, pid)
+        return in_cgroup(proc_root, pid, self.pattern)
+
+def parse_matcher(s):
+    kind, _, pattern = s.partition(":")
+    if kind not in KINDS or not pattern:
+        raise ValueError("'%s' isn't comm:REGEX, cmdline:SUBSTRING or cgroup:PATH" % s)
+    try:
+        return Matcher(kind, pattern if kind != "cgroup" else "/" + pattern.strip("/"))
+    except re.error as e:
+        raise ValueError("'%s': %s" % (s, e))
+
+def read_comm(proc_root, pid):
+    try:
+        with open(os.path.join(proc_root, pid, "comm"), "rb") as f:
+            return f.read().rstrip(b"\n").decode("utf-8", "replace")
+    except (IOError, OSError):
+        return None
+
+def in_cgroup(proc_root, pid, path):
+    # any hierarchy will do, "0::/a/b" on v2, "N:ctrl:/a/b" on v1
+    try:
+        with open(os.path.join(proc_root, pid, "cgroup"), "rb") as f:
+            for l in f:
+                cg = l.rstrip(b"\n").split(b":", 2)[-1].decode("utf-8", "replace")
+                if cg == path or cg.startswith(path.rstrip("/") + "/"):
+                    return True
+    except (IOError, OSError):
+        pass
+    return False
+
+def started_by(proc_root, pid, ancestors):
+    # whether one of ancestors started pid, directly or not
+    for _ in range(MAX_DEPTH):
+        pid = read_ppid(proc_root, pid)
+        if pid is None or pid <= 1:
+            return False
+        if pid in ancestors:
+            return True
+    return False
+
+def scan(matchers, proc_root="/proc", exclude=()):
+    """PIDs of the processes any of matchers matches, in PID order
+
+    Only comm is read for every process, cmdline and cgroup just for the
+    matchers that need them. The exclude PIDs are left out, and so is
+    everything they started, e.g. our own bw-collect.py and perf, whose
+    cmdline has the patterns in it.
+    """
+    found = []
+    for p in os.listdir(proc_root):
+        if not p.isdigit() or int(p) in exclude:
+            continue
+        comm = read_comm(proc_root, p)
+        if comm is None:
+            # exited meanwhile
+            continue
+        for m in matchers:
+            if m.match(proc_root, p, comm):
+                # only matches pay for the walk up their parents
+                if not exclude or not started_by(proc_root, int(p), exclude):
+                    found.append(int(p))
+                break
+    return sorted(found)
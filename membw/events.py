@@ -0,0 +1,112 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""PMU events used for per-task memory bandwidth, keyed by CPU model"""
+
+supported_cpus = (
+    "85",   # SKX/CLX
+)
+
+ocr_read_dram = {
+    "85": "cpu/event=0xbb,umask=0x1,offcore_rsp=0x7bc0007f7,name=OCR_READ_DRAM/",
+}
+
+ocr_read_pmem = {
+    "85": "cpu/event=0xbb,umask=0x1,offcore_rsp=0x783c007f7,name=OCR_READ_PMEM/",
+}
+
+ocr_write_pmem = {
+    "85": "cpu/event=0xb7,umask=0x1,offcore_rsp=0x3f83c00002,name=OCR_WRITE_PMEM/",
+}
+
+uncore_dram_read = {
+    "85": "uncore_imc_INDEX/event=0x10,umask=0x0,name=UNC_M_RPQ_INSERTS_IMC_INDEX/",
+}
+
+uncore_pmem_read = {
+    "85": "uncore_imc_INDEX/event=0xe3,umask=0x0,name=UNC_M_PMM_RPQ_INSERTS_IMC_INDEX/",
+}
+
+uncore_dram_write = {
+    "85": "uncore_imc_INDEX/event=0x20,umask=0x0,name=UNC_M_WPQ_INSERTS_IMC_INDEX/",
+}
+
+uncore_pmem_write = {
+    "85": "uncore_imc_INDEX/event=0xe7,umask=0x0,name=UNC_M_PMM_WPQ_INSERTS_IMC_INDEX/",
+}
+
+core_all_loads = {
+    "85": "cpu/event=0xd0,umask=0x81,name=MEM_INST_RETIRED.ALL_LOADS/",
+}
+
+core_all_stores = {
+    "85": "cpu/event=0xd0,umask=0x82,name=MEM_INST_RETIRED.ALL_STORES/",
+}
+
+def task_events(cpu, pmem_mon):
+    e = [ocr_read_dram[cpu]]
+    if pmem_mon:
+        e.append(ocr_read_pmem[cpu])
+        e.append(ocr_write_pmem[cpu])
+    e.append(core_all_stores[cpu])
+    return e
+
+# general purpose core counters of a logical CPU with HT on
+GP_COUNTERS = 4
+
+# OCR event codes, each has an offcore_rsp MSR of its own
+OFFCORE_CODES = ("0xb7", "0xbb")
+
+def spec_terms(spec):
+    """[(term, value)] of a 'pmu/term=val,...,name=NAME/' spec, in order"""
+    return [t.partition("=")[::2] for t in spec.strip("/").partition("/")[2].split(",")]
+
+def with_term(spec, key, value):
+    pmu = spec.strip("/").partition("/")[0]
+    return "%s/%s/" % (pmu, ",".join(["%s=%s" % (k, value if k == key else v) for k, v in spec_terms(spec)]))
+
+def plan_groups(specs, reserved=0):
+    """Split core event specs into groups that can each be counted at once
+
+    A group takes no more than GP_COUNTERS - reserved counters, reserved
+    being those other collections take on the same CPUs, and no two OCR
+    events of a group share an offcore_rsp MSR, one is moved to the
+    other event code if need be. Groups are multiplexed with each other, a single
+    group never is.
+    """
+    size = max(GP_COUNTERS - reserved, 1)
+    groups = []
+    for s in specs:
+        terms = dict(spec_terms(s))
+        ocr = "offcore_rsp" in terms
+        for g, free in groups:
+            if len(g) < size and (not ocr or free):
+                break
+        else:
+            g, free = [], list(OFFCORE_CODES)
+            groups.append((g, free))
+        if ocr:
+            code = terms["event"] if terms["event"] in free else free[0]
+            free.remove(code)
+            s = with_term(s, "event", code)
+        g.append(s)
+    return [g for g, free in groups]
+
+def group_arg(group):
+    # perf's -e syntax for an event group, braces only around several
+    return group[0] if len(group) == 1 else "{%s}" % ",".join(group)
+
+def imc_events(cpu, pmem_mon, index):
+    e = [uncore_dram_read[cpu], uncore_dram_write[cpu]]
+    if pmem_mon:
+        e.append(uncore_pmem_read[cpu])
+        e.append(uncore_pmem_write[cpu])
+    return [s.replace("INDEX", str(index)) for s in e]
+
+def get_cpu_model(cpuinfo="/proc/cpuinfo"):
+    # same value as lscpu's "Model:", without running lscpu
+    with open(cpuinfo) as f:
+        for l in f:
+            k, _, v = l.partition(":")
+            if k.strip() == "model":
+                return v.strip()
+    return ""
@@ -0,0 +1,139 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Prometheus text exposition of the last interval, served from a cached body"""
+
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from membw.sink import TOTAL_FIELDS
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# task rows with labels of their own, the rest add up to pid="other"
+DEFAULT_TOP = 20
+
+# comm prefix of the --drill thread rows under a group, they're part of it
+DRILL_MARK = "`-"
+
+# bandwidth values of a sink Row by TOTAL_FIELDS kind
+ROW_VALUE = (0, 2, 4, 6)
+
+MiB = 1024 * 1024
+
+HEADER = """# HELP membw_imc_bandwidth_bytes_per_second IMC bandwidth over the last interval.
+# TYPE membw_imc_bandwidth_bytes_per_second gauge
+# HELP membw_task_bandwidth_bytes_per_second Task bandwidth over the last interval, pid="other" sums the rest.
+# TYPE membw_task_bandwidth_bytes_per_second gauge
+# HELP membw_last_interval_timestamp_seconds Start of the last interval reported.
+# TYPE membw_last_interval_timestamp_seconds gauge
+"""
+
+def escape(v):
+    return ("%s" % v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def labels(**kv):
+    # socket None is left out, it's only there when split by socket
+    return "{%s}" % ",".join(['%s="%s"' % (k, escape(v)) for k, v in sorted(kv.items()) if v is not None])
+
+class Exporter(object):
+    """Metrics body rendered once per interval, every scrape gets it as is
+
+    kinds are the TOTAL_FIELDS indices reported. Only the top heaviest
+    tasks of an interval, by the bandwidth of those kinds, are labeled by
+    PID, the others are summed into pid="other" so the series count stays
+    bounded. With -S, a task on each socket is a task of its own. --drill
+    thread rows are left out, their bandwidth is already in their group's.
+    """
+    def __init__(self, kinds, top=DEFAULT_TOP):
+        self.kinds = kinds
+        self.top = top
+        self.body = HEADER.encode("utf-8")
+        self.server = None
+
+    def write(self, ts, totals, rows, notes=()):
+        # same interface as a sink
+        out = [HEADER]
+        for sk, t in sorted(totals.items(), key=lambda x: -1 if x[0] is None else x[0]):
+            for k in self.kinds:
+                out.append("membw_imc_bandwidth_bytes_per_second%s %.0f\n"\
+                        % (labels(kind=TOTAL_FIELDS[k], socket="all" if sk is None else sk), t[k] * MiB))
+
+        # a series per task and socket, heaviest first over all the sockets
+        series = {}
+        for r in rows:
+            if r.comm.startswith(DRILL_MARK):
+                continue
+            key = (r.pid, r.socket) if r.pid != "-" else (r.pid, r.comm, r.socket)
+            v = [r.values[ROW_VALUE[k]] for k in self.kinds]
+            if key in series:
+                # a labelset comes out once, the same one twice adds up
+                series[key] = (r, [a + b for a, b in zip(series[key][1], v)])
+            else:
+                series[key] = (r, v)
+        ranked = sorted(series.values(), key=lambda x: -sum(x[1]))
+
+        other = {}
+        for i, (r, v) in enumerate(ranked):
+            for k, b in zip(self.kinds, v):
+                if i < self.top:
+                    out.append("membw_task_bandwidth_bytes_per_second%s %.0f\n"\
+                            % (labels(kind=TOTAL_FIELDS[k], pid=r.pid, comm=r.comm, socket=r.socket), b * MiB))
+                else:
+                    other[(k, r.socket)] = other.get((k, r.socket), 0.0) + b
+        for (k, socket), v in sorted(other.items(), key=lambda x: (x[0][0], -1 if x[0][1] is None else x[0][1])):
+            out.append("membw_task_bandwidth_bytes_per_second%s %.0f\n"\
+                    % (labels(kind=TOTAL_FIELDS[k], pid="other", comm="other", socket=socket), v * MiB))
+        out.append("membw_last_interval_timestamp_seconds %.3f\n" % ts)
+        # a reference swap, a scrape gets either the old body or the new one
+        self.body = "".join(out).encode("utf-8")
+
+    def serve(self, host, port):
+        """Serve GET /metrics on a thread of its own"""
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = exporter.body
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                pass
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self.server = Server((host, port), Handler)
+        t = threading.Thread(target=self.server.serve_forever)
+        t.daemon = True
+        t.start()
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+def parse_listen(s):
+    """(host, port) of '[HOST:]PORT', the host defaults to localhost"""
+    host, _, port = s.rpartition(":")
+    try:
+        port = int(port)
+    except ValueError:
+        raise ValueError("'%s' isn't [HOST:]PORT" % s)
+    if port < 0 or port > 65535:
+        raise ValueError("port %d out of range" % port)
+    return host.strip("[]") if host else "127.0.0.1", port
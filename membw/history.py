@@ -0,0 +1,98 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Bounded per-task bandwidth history in ring buffers"""
+
+import math
+from array import array
+from collections import OrderedDict
+
+# series kept at most, the least recently updated go first
+MAX_SERIES = 4096
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+class Series(object):
+    """The last window samples of one bandwidth, plus an EWMA over all of them"""
+    __slots__ = ("ring", "head", "n", "tick", "ewma")
+
+    def __init__(self, window, tick):
+        self.ring = array('d', [0.0]) * window
+        self.head = 0
+        self.n = 0
+        self.tick = tick
+        self.ewma = 0.0
+
+    def push(self, v):
+        self.ring[self.head] = v
+        self.head = (self.head + 1) % len(self.ring)
+        if self.n < len(self.ring):
+            self.n += 1
+
+    def values(self):
+        # in no particular order, none of the stats needs it
+        return self.ring[:self.n]
+
+def quantile(ordered, q):
+    # nearest rank
+    return ordered[max(int(math.ceil(q * len(ordered))) - 1, 0)]
+
+class History(object):
+    """Series by key over the last window intervals, memory is bounded
+
+    A series not updated in an interval had nothing to report, it gets a
+    0 sample for it when it's updated again. Series idle for a whole
+    window hold only zeros and are dropped, as are the least recently
+    updated ones beyond max_series.
+    """
+    def __init__(self, window, max_series=MAX_SERIES, alpha=None):
+        self.window = window
+        self.max_series = max_series
+        self.alpha = alpha if alpha else 2.0 / (window + 1)
+        self.series = OrderedDict()
+        self.tick = 0
+
+    def next(self):
+        """Start the next interval"""
+        self.tick += 1
+        self.evict()
+
+    def add(self, key, v):
+        s = self.series.pop(key, None)
+        if s is None:
+            s = Series(self.window, self.tick - 1)
+        elif s.tick == self.tick:
+            # a second sample of the same interval adds up
+            s.ring[s.head - 1] += v
+            # the EWMA starts out as the first interval's sum
+            s.ewma += self.alpha * v if s.n > 1 else v
+            self.series[key] = s
+            return
+
+        gap = self.tick - s.tick - 1
+        for i in range(min(gap, self.window)):
+            s.push(0.0)
+        s.push(v)
+        s.ewma = s.ewma * (1 - self.alpha) ** (gap + 1) + self.alpha * v if s.n > 1 else v
+        s.tick = self.tick
+        self.series[key] = s
+        if len(self.series) > self.max_series:
+            self.series.popitem(last=False)
+
+    def evict(self):
+        while self.series:
+            key = next(iter(self.series))
+            s = self.series[key]
+            if len(self.series) <= self.max_series and self.tick - s.tick <= self.window:
+                break
+            del self.series[key]
+
+    def stats(self, key):
+        """(mean, EWMA, peak, p50, p95, p99) of key over the window, None if unknown"""
+        s = self.series.get(key)
+        if s is None or not s.n:
+            return None
+        v = sorted(s.values())
+        return (sum(v) / len(v), s.ewma, v[-1]) + tuple([quantile(v, q) for q in QUANTILES])
+
+    def __len__(self):
+        return len(self.series)
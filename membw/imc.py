@@ -0,0 +1,135 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""IMC totals, per-channel(IMC box) bandwidth and imbalance from the uncore counts"""
+
+import math
+
+from membw import topology
+
+# DRAM read, DRAM write, PMEM read, PMEM write, the order of the IMC totals
+KINDS = ("DramRead", "DramWrite", "PmemRead", "PmemWrite")
+
+# the system wide event the per-task stores are a share of
+STORES = "MEM_INST_RETIRED.ALL_STORES"
+
+# a channel this much over the mean of its socket is hot ...
+HOT_MARGIN = 0.2
+
+# ... and flagged once it has been hot this many intervals in a row
+HOT_INTERVALS = 3
+
+def kind_of(event):
+    """Index into KINDS of an uncore event, -1 for others"""
+    # PMM_RPQ/PMM_WPQ contain RPQ/WPQ too, test them first
+    if "PMM_RPQ" in event:
+        return 2
+    if "PMM_WPQ" in event:
+        return 3
+    if "RPQ" in event:
+        return 0
+    if "WPQ" in event:
+        return 1
+    return -1
+
+def box_of(event):
+    """IMC box of an UNC_M_*_IMC_<N> event, 0 for a lone uncore_imc box"""
+    n = event.rpartition("_")[2]
+    return int(n) if n.isdigit() else 0
+
+def channel_bw(unc, imc_time, sockets):
+    """{(socket, box): [DRAM read, DRAM write, PMEM read, PMEM write MiB/s]}
+
+    A box counts on one CPU per socket, the socket comes from the perf -A
+    "CPUn" key of the row.
+    """
+    scale = 64.0 / (1024*1024) / imc_time
+    bw = {}
+    for k, v, event in unc.rows():
+        i = kind_of(event)
+        if i < 0:
+            continue
+        ch = (topology.socket_of(k, sockets) if k else 0, box_of(event))
+        bw.setdefault(ch, [0.0, 0.0, 0.0, 0.0])[i] += v * scale
+    return bw
+
+def totals(system, unc, imc_time, sockets=None):
+    """{socket: (DRAM read, DRAM write, PMEM read, PMEM write MiB/s, system stores)}
+
+    Summed over the per-CPU rows, a single None entry unless sockets
+    ({cpu: socket}) is given.
+    """
+    acc = {}
+    for k, v, event in system.rows():
+        if event == STORES:
+            acc.setdefault(topology.socket_of(k, sockets) if sockets is not None else None, [0, 0, 0, 0, 0])[4] += v
+
+    for k, v, event in unc.rows():
+        i = kind_of(event)
+        if i < 0:
+            continue
+        acc.setdefault(topology.socket_of(k, sockets) if sockets is not None else None, [0, 0, 0, 0, 0])[i] += v
+
+    t = {}
+    for sk, a in acc.items():
+        t[sk] = tuple([float(v) * 64 / (1024*1024) / imc_time for v in a[:4]]) + (a[4],)
+    return t
+
+def imbalance(values):
+    """(max/mean, coefficient of variation) of per-channel bandwidths, None when idle"""
+    if not values:
+        return None
+    mean = float(sum(values)) / len(values)
+    if mean <= 0.0:
+        return None
+    var = sum([(v - mean) ** 2 for v in values]) / len(values)
+    return max(values) / mean, math.sqrt(var) / mean
+
+class ChannelMonitor(object):
+    """Channel bandwidth over the intervals of a run
+
+    A channel is hot in an interval when its DRAM read plus write
+    bandwidth is over the mean of its socket's channels by more than
+    margin, it's flagged after being hot for intervals in a row and stays
+    flagged until it isn't hot any more.
+    """
+    def __init__(self, margin=HOT_MARGIN, intervals=HOT_INTERVALS):
+        self.margin = margin
+        self.intervals = intervals
+        self.n = 0
+        self.sums = {}
+        self.streak = {}
+        self.hot_count = {}
+
+    def update(self, bw):
+        """Add one interval of channel_bw(), return {socket: [imbalance() per kind]}"""
+        self.n += 1
+        by_socket = {}
+        for ch, v in bw.items():
+            by_socket.setdefault(ch[0], []).append(ch)
+            s = self.sums.setdefault(ch, [0.0, 0.0, 0.0, 0.0])
+            for i in range(len(KINDS)):
+                s[i] += v[i]
+
+        result = {}
+        for sk, chans in by_socket.items():
+            result[sk] = [imbalance([bw[ch][i] for ch in chans]) for i in range(len(KINDS))]
+            dram = [bw[ch][0] + bw[ch][1] for ch in chans]
+            mean = sum(dram) / len(dram)
+            for ch, d in zip(chans, dram):
+                if mean > 0.0 and d > mean * (1 + self.margin):
+                    self.streak[ch] = self.streak.get(ch, 0) + 1
+                else:
+                    self.streak[ch] = 0
+                if self.streak[ch] >= self.intervals:
+                    self.hot_count[ch] = self.hot_count.get(ch, 0) + 1
+        return result
+
+    def hot(self, ch):
+        return self.streak.get(ch, 0) >= self.intervals
+
+    def mean(self, ch):
+        """Mean bandwidth of a channel per kind over the run"""
+        return [s / self.n for s in self.sums.get(ch, [0.0, 0.0, 0.0, 0.0])] if self.n else [0.0] * 4
+
+    def channels(self):
+        return sorted(self.sums)
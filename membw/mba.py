@@ -0,0 +1,158 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Keep targets within bandwidth budgets with resctrl MBA"""
+
+import os
+
+from membw.resctrl import RESCTRL, MBMGroup, target_tids
+
+# prefix of the control groups made by us, removed again on close()
+GROUP_PREFIX = "membw-mba-"
+
+# no change while the bandwidth is within this fraction of the budget
+HYSTERESIS = 0.1
+
+def read_int(path, default):
+    try:
+        with open(path) as f:
+            return int(f.read())
+    except (IOError, OSError, ValueError):
+        return default
+
+def mb_line(path):
+    """The MB line of a schemata file, None if there's none"""
+    try:
+        with open(path) as f:
+            for l in f:
+                if l.strip().partition(":")[0].strip() == "MB":
+                    return l.strip()
+    except (IOError, OSError):
+        pass
+    return None
+
+def mb_domains(root):
+    """Domain ids of the MB line in the default group's schemata"""
+    l = mb_line(os.path.join(root, "schemata"))
+    if l is None:
+        return []
+    return [d.split("=")[0].strip() for d in l.partition(":")[2].split(";") if "=" in d]
+
+def parse_budget(s):
+    """'KEY=MiB/s' as given to --budget"""
+    key, _, mib = s.rpartition("=")
+    if not key:
+        raise ValueError("budget '%s' isn't KEY=MiB/s" % s)
+    budget = float(mib)
+    if budget <= 0:
+        raise ValueError("budget '%s' isn't positive" % s)
+    return key.strip("/") if key != "/" else key, budget
+
+class Throttle(object):
+    """MBA state of one budgeted target"""
+    def __init__(self, key, budget):
+        self.key = key
+        self.budget = budget
+        self.pct = 100
+        self.group = None
+        # the MB line of a group that was there already, put back on release
+        self.schemata = None
+
+class MBAController(object):
+    """Feedback loop from measured bandwidth to MBA percentages
+
+    A target over its budget gets a control group of its own, its MB
+    schemata is lowered in proportion to the overshoot and raised a step
+    at a time once it is back under, the group is removed again when it
+    reaches 100%. Nothing is written in dry_run mode, actions are still
+    returned as if it was. rmdir removes the groups made.
+    """
+    def __init__(self, budgets, cgroups=False, dry_run=False, root=RESCTRL, proc_root="/proc",\
+            cgroup_root=None, hysteresis=HYSTERESIS, rmdir=os.rmdir):
+        self.root = root
+        self.rmdir = rmdir
+        self.proc_root = proc_root
+        self.cgroup_root = cgroup_root
+        self.cgroups = cgroups
+        self.dry_run = dry_run
+        self.hysteresis = hysteresis
+        self.targets = dict((k, Throttle(k, b)) for k, b in budgets)
+
+        info = os.path.join(root, "info", "MB")
+        if not os.path.isdir(info) and not dry_run:
+            raise OSError("No MBA support, is resctrl mounted on %s?" % root)
+        self.min_pct = read_int(os.path.join(info, "min_bandwidth"), 10)
+        self.gran = read_int(os.path.join(info, "bandwidth_gran"), 10)
+        self.domains = mb_domains(root)
+
+    def step(self, t, bw):
+        # the next MBA percentage of t at bw MiB/s, t.pct if it's fine as is
+        if bw > t.budget * (1 + self.hysteresis):
+            # proportional cut, at least one step, rounded down to the granularity
+            pct = min(t.pct * t.budget / bw, t.pct - self.gran)
+            pct = int(pct) // self.gran * self.gran
+            return max(pct, self.min_pct)
+        if bw < t.budget * (1 - self.hysteresis) and t.pct < 100:
+            return min(t.pct + self.gran, 100)
+        return t.pct
+
+    def update(self, measured):
+        """Act on {key: MiB/s} of one interval, return what was done as text"""
+        actions = []
+        for key, t in self.targets.items():
+            bw = measured.get(key)
+            if bw is None:
+                continue
+            if t.group is not None and not self.dry_run:
+                # threads that joined a throttled cgroup later
+                t.group.assign(self.tids(key))
+            pct = self.step(t, bw)
+            if pct == t.pct:
+                continue
+            try:
+                self.apply(t, pct)
+            except (IOError, OSError) as e:
+                actions.append("%s: can't set MBA to %d%%: %s" % (key, pct, e))
+                continue
+            actions.append("%s: %.1f MiB/s, budget %.1f MiB/s, MBA %d%% -> %d%%"\
+                    % (key, bw, t.budget, t.pct, pct))
+            t.pct = pct
+        return actions
+
+    def tids(self, key):
+        return target_tids(key, self.cgroups, self.proc_root, self.cgroup_root)
+
+    def apply(self, t, pct):
+        if self.dry_run:
+            return
+        if pct >= 100:
+            self.release(t)
+            return
+        if t.group is None:
+            path = os.path.join(self.root, GROUP_PREFIX + t.key.strip("/").replace("/", "_"))
+            created = not os.path.isdir(path)
+            if created:
+                os.mkdir(path)
+            else:
+                # not ours to remove, only to throttle
+                t.schemata = mb_line(os.path.join(path, "schemata"))
+            t.group = MBMGroup(path, created, self.rmdir)
+            t.group.assign(self.tids(t.key))
+        with open(os.path.join(t.group.path, "schemata"), "w") as f:
+            f.write("MB:%s\n" % ";".join(["%s=%d" % (d, pct) for d in self.domains]))
+
+    def release(self, t):
+        if t.group is not None:
+            if t.schemata is not None:
+                try:
+                    with open(os.path.join(t.group.path, "schemata"), "w") as f:
+                        f.write(t.schemata + "\n")
+                except (IOError, OSError):
+                    pass
+                t.schemata = None
+            t.group.remove()
+            t.group = None
+
+    def close(self):
+        for t in self.targets.values():
+            self.release(t)
+            t.pct = 100
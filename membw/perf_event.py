@@ -0,0 +1,220 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Minimal perf_event_open(2) binding: raw PMU events, group reads"""
+
+import os
+import fcntl
+import ctypes
+import struct
+import platform
+
+SYSFS_PMU = "bus/event_source/devices"
+
+PERF_FORMAT_TOTAL_TIME_ENABLED = 1 << 0
+PERF_FORMAT_TOTAL_TIME_RUNNING = 1 << 1
+PERF_FORMAT_GROUP = 1 << 3
+READ_FORMAT = PERF_FORMAT_GROUP | PERF_FORMAT_TOTAL_TIME_ENABLED | PERF_FORMAT_TOTAL_TIME_RUNNING
+
+PERF_EVENT_IOC_ENABLE = 0x2400
+PERF_EVENT_IOC_DISABLE = 0x2401
+PERF_EVENT_IOC_RESET = 0x2403
+PERF_IOC_FLAG_GROUP = 1
+PERF_FLAG_FD_CLOEXEC = 1 << 3
+
+# bits of perf_event_attr.flags
+ATTR_DISABLED = 1 << 0
+
+SYSCALL_NR = {
+    "x86_64": 298,
+    "i386": 336,
+    "i686": 336,
+    "aarch64": 241,
+}
+
+class perf_event_attr(ctypes.Structure):
+    """struct perf_event_attr, PERF_ATTR_SIZE_VER5 layout"""
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("size", ctypes.c_uint32),
+        ("config", ctypes.c_uint64),
+        ("sample_period", ctypes.c_uint64),
+        ("sample_type", ctypes.c_uint64),
+        ("read_format", ctypes.c_uint64),
+        ("flags", ctypes.c_uint64),
+        ("wakeup_events", ctypes.c_uint32),
+        ("bp_type", ctypes.c_uint32),
+        ("config1", ctypes.c_uint64),
+        ("config2", ctypes.c_uint64),
+        ("branch_sample_type", ctypes.c_uint64),
+        ("sample_regs_user", ctypes.c_uint64),
+        ("sample_stack_user", ctypes.c_uint32),
+        ("clockid", ctypes.c_int32),
+        ("sample_regs_intr", ctypes.c_uint64),
+        ("aux_watermark", ctypes.c_uint32),
+        ("sample_max_stack", ctypes.c_uint16),
+        ("reserved_2", ctypes.c_uint16),
+    ]
+
+def parse_cpu_list(s):
+    # "0-3,8,10-11" as found in cpumask/online files
+    cpus = []
+    for r in s.strip().split(","):
+        if not r:
+            continue
+        lo, _, hi = r.partition("-")
+        cpus.extend(range(int(lo), int(hi if hi else lo) + 1))
+    return cpus
+
+def read_file(path):
+    with open(path) as f:
+        return f.read().strip()
+
+class EventSpec(object):
+    """A 'pmu/term=val,...,name=NAME/' event resolved through sysfs"""
+    def __init__(self, spec, sys_root="/sys"):
+        pmu, _, terms = spec.strip("/").partition("/")
+        d = os.path.join(sys_root, SYSFS_PMU, pmu)
+
+        self.spec = spec
+        self.pmu = pmu
+        self.name = spec
+        self.type = int(read_file(os.path.join(d, "type")))
+        self.terms = {}
+        conf = {"config": 0, "config1": 0, "config2": 0}
+
+        for t in terms.split(","):
+            k, _, v = t.partition("=")
+            if k == "name":
+                self.name = v
+                continue
+            value = int(v, 0) if v else 1
+            self.terms[k] = value
+            # format files look like "config:0-7" or "config1:0-63"
+            field, _, bits = read_file(os.path.join(d, "format", k)).partition(":")
+            for r in bits.split(","):
+                lo, _, hi = r.partition("-")
+                lo = int(lo)
+                width = int(hi if hi else lo) - lo + 1
+                conf[field] |= (value & ((1 << width) - 1)) << lo
+                value >>= width
+
+        self.config = conf["config"]
+        self.config1 = conf["config1"]
+        self.config2 = conf["config2"]
+
+    def attr(self, disabled=False):
+        a = perf_event_attr()
+        a.type = self.type
+        a.size = ctypes.sizeof(a)
+        a.config = self.config
+        a.config1 = self.config1
+        a.config2 = self.config2
+        a.read_format = READ_FORMAT
+        if disabled:
+            a.flags = ATTR_DISABLED
+        return a
+
+class Syscalls(object):
+    """perf_event_open/read/ioctl/close on the running kernel"""
+    def __init__(self):
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.nr = SYSCALL_NR[platform.machine()]
+
+    def open(self, attr, pid, cpu, group_fd, flags):
+        fd = self.libc.syscall(self.nr, ctypes.byref(attr), pid, cpu, group_fd, flags)
+        if fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+        return fd
+
+    def read(self, fd, size):
+        return os.read(fd, size)
+
+    def ioctl(self, fd, req, arg):
+        fcntl.ioctl(fd, req, arg)
+
+    def close(self, fd):
+        os.close(fd)
+
+class FakeSyscalls(object):
+    """Stand-in for Syscalls without PMUs, counts come from counts(attr, pid, cpu)"""
+    def __init__(self, counts):
+        self.counts = counts
+        self.fds = {}
+        self.next_fd = 1000
+        self.enabled = 0
+        self.running = 0
+
+    def open(self, attr, pid, cpu, group_fd, flags):
+        fd = self.next_fd
+        self.next_fd += 1
+        a = perf_event_attr()
+        ctypes.memmove(ctypes.byref(a), ctypes.byref(attr), ctypes.sizeof(a))
+        self.fds[fd] = (a, pid, cpu, [])
+        if group_fd != -1:
+            self.fds[group_fd][3].append(fd)
+        return fd
+
+    def read(self, fd, size):
+        a, pid, cpu, members = self.fds[fd]
+        values = [self.counts(self.fds[f][0], pid, cpu) for f in [fd] + members]
+        return struct.pack("%dQ" % (3 + len(values)), len(values), self.enabled, self.running, *values)
+
+    def ioctl(self, fd, req, arg):
+        pass
+
+    def close(self, fd):
+        del self.fds[fd]
+
+class EventGroup(object):
+    """Events opened as one group on a (pid, cpu) pair, read with one read()"""
+    def __init__(self, sc, events, pid, cpu):
+        self.sc = sc
+        self.events = events
+        self.pid = pid
+        self.cpu = cpu
+        self.fds = []
+        self.size = 8 * (3 + len(events))
+        self.last = None
+
+        leader = -1
+        try:
+            for e in events:
+                # the leader starts disabled so all members count the same time
+                fd = sc.open(e.attr(disabled=(leader == -1)), pid, cpu, leader, PERF_FLAG_FD_CLOEXEC)
+                if leader == -1:
+                    leader = fd
+                self.fds.append(fd)
+        except OSError:
+            self.close()
+            raise
+
+    def enable(self):
+        self.sc.ioctl(self.fds[0], PERF_EVENT_IOC_ENABLE, PERF_IOC_FLAG_GROUP)
+
+    def read(self):
+        buf = self.sc.read(self.fds[0], self.size)
+        nr, enabled, running = struct.unpack_from("3Q", buf)
+        return struct.unpack_from("%dQ" % nr, buf, 24), enabled, running
+
+    def delta(self):
+        """Counts since the previous call, scaled up if the group was multiplexed"""
+        values, enabled, running = self.read()
+        if self.last is None:
+            last = ((0,) * len(values), 0, 0)
+        else:
+            last = self.last
+        self.last = (values, enabled, running)
+
+        d_run = running - last[2]
+        d_ena = enabled - last[1]
+        if d_run <= 0:
+            return [0] * len(values), d_ena, d_run
+        scale = float(d_ena) / d_run
+        return [int((v - l) * scale) for v, l in zip(values, last[0])], d_ena, d_run
+
+    def close(self):
+        # members first, the leader keeps the group alive until last
+        for fd in reversed(self.fds):
+            self.sc.close(fd)
+        self.fds = []
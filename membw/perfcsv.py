@@ -0,0 +1,173 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Single pass parser for 'perf stat -x' output"""
+
+import sys
+import time
+from array import array
+
+# comm names may well contain commas, semicolons are much rarer
+CSV_SEP = ";"
+
+if sys.version_info.major > 2:
+    intern = sys.intern
+
+class Counts(object):
+    """Columnar perf counts, one entry per (key, event) row
+
+    key is "comm-tid" for --per-thread, "CPUn" for -A, the cgroup for -G,
+    "cgroup@CPUn" for both and None otherwise.
+    values are already scaled by perf, running is in ns and pct is the
+    percentage of time enabled the counter was running. ts is only filled
+    for -I output.
+    """
+    __slots__ = ("started", "ts", "keys", "events", "values", "running", "pct")
+
+    def __init__(self):
+        self.started = None
+        self.ts = array('d')
+        self.keys = []
+        self.events = []
+        self.values = array('d')
+        self.running = array('d')
+        self.pct = array('d')
+
+    def __len__(self):
+        return len(self.values)
+
+    def slice(self, lo, hi):
+        c = Counts()
+        c.started = self.started
+        c.ts = self.ts[lo:hi]
+        c.keys = self.keys[lo:hi]
+        c.events = self.events[lo:hi]
+        c.values = self.values[lo:hi]
+        c.running = self.running[lo:hi]
+        c.pct = self.pct[lo:hi]
+        return c
+
+    def extend(self, other):
+        if self.started is None:
+            self.started = other.started
+        self.ts.extend(other.ts)
+        self.keys.extend(other.keys)
+        self.events.extend(other.events)
+        self.values.extend(other.values)
+        self.running.extend(other.running)
+        self.pct.extend(other.pct)
+
+    def append(self, key, event, value, enabled, running):
+        self.keys.append(key)
+        self.events.append(event)
+        self.values.append(value)
+        self.running.append(running)
+        self.pct.append(running * 100.0 / enabled if enabled > 0 else 0.0)
+
+    def partition(self, events):
+        """(Counts of the rows of any of events, Counts of the other rows)"""
+        a, b = Counts(), Counts()
+        a.started = b.started = self.started
+        for i, e in enumerate(self.events):
+            c = a if e in events else b
+            if self.ts:
+                c.ts.append(self.ts[i])
+            c.keys.append(self.keys[i])
+            c.events.append(e)
+            c.values.append(self.values[i])
+            c.running.append(self.running[i])
+            c.pct.append(self.pct[i])
+        return a, b
+
+    def enabled(self):
+        """Time enabled of every row in ns, from running and the percentage"""
+        return array('d', [run * 100.0 / pct if pct > 0.0 else 0.0 for run, pct in zip(self.running, self.pct)])
+
+    def coverage(self):
+        """Share of the time enabled the counters were running, 1.0 if unknown
+
+        perf already scaled the values by the inverse of it, the lower it
+        is the more of them is extrapolated.
+        """
+        enabled = running = 0.0
+        for run, en in zip(self.running, self.enabled()):
+            if run > 0.0:
+                enabled += en
+                running += run
+        return running / enabled if enabled > 0.0 else 1.0
+
+    def elapsed(self):
+        # for per-CPU rows time enabled is wall time
+        t = 0.0
+        for run, pct in zip(self.running, self.pct):
+            if pct > 0.0 and run * 100.0 / pct > t:
+                t = run * 100.0 / pct
+        return t / 1e9
+
+    def rows(self):
+        return zip(self.keys, self.values, self.events)
+
+def parse_started(line):
+    # "# started on Mon Oct 17 10:00:00 2026"
+    try:
+        return time.mktime(time.strptime(line.split(None, 3)[3].strip(), "%a %b %d %H:%M:%S %Y"))
+    except (IndexError, ValueError):
+        return None
+
+def parse(lines, interval=False, keyed=False, sep=CSV_SEP, counts=None, cgroup=False):
+    """Parse perf CSV lines into a Counts
+
+    interval: lines start with the -I timestamp
+    keyed: a --per-thread/-A key column comes before the count
+    cgroup: a -G cgroup column comes after the event, it's used as key
+    """
+    c = counts if counts is not None else Counts()
+    names = {}
+    # only a handful of distinct multiplexing percentages show up
+    pcts = {"": 100.0}
+
+    ts_append = c.ts.append
+    key_append = c.keys.append
+    event_append = c.events.append
+    value_append = c.values.append
+    running_append = c.running.append
+    pct_append = c.pct.append
+
+    ki = 1 if interval else 0
+    vi = ki + 1 if keyed else ki
+    ei = vi + 2
+    gi = ei + 1
+    ri = gi + 1 if cgroup else vi + 3
+    pi = ri + 1
+
+    for line in lines:
+        f = line.split(sep)
+        try:
+            # "<not counted>"/"<not supported>" counts and comment lines
+            # fail here, no need to look at them beforehand
+            value = float(f[vi])
+            e = f[ei]
+            event = names.get(e)
+            if event is None:
+                event = names[e] = intern(e)
+            p = f[pi]
+            pct = pcts.get(p)
+            if pct is None:
+                pct = pcts[p] = float(p)
+            run = float(f[ri] or 0.0)
+            if interval:
+                ts_append(float(f[0]))
+        except (ValueError, IndexError):
+            if line.startswith("# started on"):
+                c.started = parse_started(line)
+            continue
+
+        if cgroup:
+            key_append(f[gi] + "@" + f[ki] if keyed else f[gi])
+        else:
+            key_append(f[ki] if keyed else None)
+        event_append(event)
+        value_append(value)
+        running_append(run)
+        pct_append(pct)
+
+    return c
@@ -0,0 +1,154 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Cached task identities read straight from /proc"""
+
+import os
+from collections import OrderedDict
+
+MAX_ENTRIES = 65536
+
+class TaskInfo(object):
+    """comm, tgid, uid and cmdline of one (pid, starttime) task"""
+    __slots__ = ("pid", "starttime", "comm", "tgid", "uid", "cmdline", "alive")
+
+    def __init__(self, pid, starttime, comm, tgid, uid, cmdline):
+        self.pid = pid
+        self.starttime = starttime
+        self.comm = comm
+        self.tgid = tgid
+        self.uid = uid
+        self.cmdline = cmdline
+        self.alive = True
+
+def read_stat(proc_root, pid):
+    # (comm, starttime) from /proc/PID/stat, None once the task is gone
+    try:
+        with open(os.path.join(proc_root, str(pid), "stat"), "rb") as f:
+            data = f.read()
+    except (IOError, OSError):
+        return None
+
+    # comm is in parentheses and may contain spaces and ')' itself
+    l = data.find(b"(")
+    r = data.rfind(b")")
+    if l < 0 or r < 0:
+        return None
+    fields = data[r + 2:].split()
+    if len(fields) < 20:
+        return None
+    return data[l + 1:r].decode("utf-8", "replace"), int(fields[19])
+
+def read_ppid(proc_root, pid):
+    # parent PID from /proc/PID/stat, None once the task is gone
+    try:
+        with open(os.path.join(proc_root, str(pid), "stat"), "rb") as f:
+            data = f.read()
+        return int(data[data.rfind(b")") + 2:].split()[1])
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+def read_status(proc_root, pid):
+    # (tgid, real uid) from /proc/PID/status
+    tgid, uid = pid, -1
+    try:
+        with open(os.path.join(proc_root, str(pid), "status"), "rb") as f:
+            for l in f:
+                if l.startswith(b"Tgid:"):
+                    tgid = int(l.split()[1])
+                elif l.startswith(b"Uid:"):
+                    uid = int(l.split()[1])
+                    break
+    except (IOError, OSError, ValueError):
+        pass
+    return tgid, uid
+
+def read_cmdline(proc_root, pid):
+    try:
+        with open(os.path.join(proc_root, str(pid), "cmdline"), "rb") as f:
+            data = f.read()
+    except (IOError, OSError):
+        return ""
+    return data.rstrip(b"\0").replace(b"\0", b" ").decode("utf-8", "replace")
+
+class ProcResolver(object):
+    """Resolve PIDs/TIDs to TaskInfo without spawning anything
+
+    Entries are keyed by (pid, starttime) so a reused PID gets a fresh
+    entry, exited tasks stay resolvable until they are evicted, least
+    recently used first.
+    """
+    def __init__(self, proc_root="/proc", max_entries=MAX_ENTRIES):
+        self.proc_root = proc_root
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.current = {}
+
+    def load(self, pid, comm, starttime):
+        tgid, uid = read_status(self.proc_root, pid)
+        info = TaskInfo(pid, starttime, comm, tgid, uid, read_cmdline(self.proc_root, pid))
+        old = self.current.get(pid)
+        if old is not None and old != starttime and (pid, old) in self.entries:
+            # PID reused, the old task is gone
+            self.entries[(pid, old)].alive = False
+        self.entries[(pid, starttime)] = info
+        self.current[pid] = starttime
+        return info
+
+    def refresh(self, pids):
+        """Revalidate pids in one go, return {pid: TaskInfo} of the live ones"""
+        live = {}
+        for pid in pids:
+            s = read_stat(self.proc_root, pid)
+            start = self.current.get(pid)
+            if s is None:
+                if start is not None and (pid, start) in self.entries:
+                    self.entries[(pid, start)].alive = False
+                continue
+
+            comm, starttime = s
+            info = self.entries.get((pid, starttime))
+            if info is None:
+                info = self.load(pid, comm, starttime)
+            else:
+                # comm can be changed with prctl() at any time
+                info.comm = comm
+                self.touch((pid, starttime))
+            live[pid] = info
+
+        self.evict()
+        return live
+
+    def cached(self, pid):
+        """TaskInfo pid had when it was last read, None if it never was, /proc isn't read"""
+        start = self.current.get(pid)
+        if start is None:
+            return None
+        info = self.entries.get((pid, start))
+        if info is not None:
+            self.touch((pid, start))
+        return info
+
+    def lookup(self, pid):
+        """Cached TaskInfo of pid, read from /proc on a miss, None if unknown"""
+        info = self.cached(pid)
+        return info if info is not None else self.refresh([pid]).get(pid)
+
+    def touch(self, key):
+        info = self.entries.pop(key)
+        self.entries[key] = info
+
+    def evict(self):
+        if len(self.entries) <= self.max_entries:
+            return
+        # exited tasks go first, oldest ones before the rest
+        for key in [k for k in self.entries if not self.entries[k].alive]:
+            self.drop(key)
+            if len(self.entries) <= self.max_entries:
+                return
+        while len(self.entries) > self.max_entries:
+            self.drop(next(iter(self.entries)))
+
+    def drop(self, key):
+        del self.entries[key]
+        if self.current.get(key[0]) == key[1]:
+            del self.current[key[0]]
@@ -0,0 +1,375 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Append-only binary recording of interval counts, replayed through mmap
+
+Layout, integers are little endian:
+
+    header   MAGIC, u32 length, JSON metadata(targets, options, CPU to
+             socket map and the event names, once per file)
+    chunk    CHUNK_MAGIC, u32 payload length, u32 intervals, f64 first
+             and last interval timestamp, payload
+    ...
+    index    per chunk: f64 first, f64 last timestamp, u64 offset, u64 intervals
+    trailer  u64 index offset, u64 chunks, INDEX_MAGIC
+
+A payload starts with the string table of the row keys used in the
+chunk, with the task identity(pid, comm, tgid, uid) recorded for each,
+followed by its intervals: f64 timestamp, task time and IMC time, then
+the task, system and IMC rows. A row is varints: key and event index,
+then value, running time and percentage running(x100), zigzag encoded
+as the delta to the same row of the chunk's previous interval.
+
+Chunks decode on their own. The index and trailer are written on
+close(), a file without them, e.g. after a crash, is recovered by
+walking the chunks.
+"""
+
+import os
+import json
+import mmap
+import struct
+
+from membw.perfcsv import Counts
+from membw.procinfo import TaskInfo
+
+MAGIC = b"MEMBWREC"
+CHUNK_MAGIC = b"MBWC"
+INDEX_MAGIC = b"MEMBWIDX"
+VERSION = 1
+
+CHUNK = struct.Struct("<4sIIdd")
+INDEX_ENTRY = struct.Struct("<ddQQ")
+TRAILER = struct.Struct("<QQ8s")
+TIMES = struct.Struct("<ddd")
+
+# intervals per chunk, a crash loses at most the one being filled
+CHUNK_INTERVALS = 32
+
+# recordings appended to must agree on these
+SAME_META = ("pids", "cgroup", "socket_split", "pmem")
+
+STREAMS = 3
+
+def put_uvarint(buf, n):
+    while n >= 0x80:
+        buf.append((n & 0x7f) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+def get_uvarint(buf, pos):
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+def zigzag(n):
+    return n * 2 if n >= 0 else -n * 2 - 1
+
+def unzigzag(z):
+    return z >> 1 if not z & 1 else -((z + 1) >> 1)
+
+def put_str(buf, s):
+    b = s.encode("utf-8")
+    put_uvarint(buf, len(b))
+    buf.extend(b)
+
+def get_str(buf, pos):
+    n, pos = get_uvarint(buf, pos)
+    return bytes(buf[pos:pos + n]).decode("utf-8"), pos + n
+
+class ChunkWriter(object):
+    """Intervals encoded so far, the string table grows along"""
+    def __init__(self, events, identity):
+        self.events = events
+        self.identity = identity
+        self.keys = {None: 0}
+        self.table = bytearray()
+        self.body = bytearray()
+        self.prev = {}
+        self.n = 0
+        self.first = self.last = 0.0
+
+    def key_index(self, k, task):
+        i = self.keys.get(k)
+        if i is None:
+            i = self.keys[k] = len(self.keys)
+            put_str(self.table, k)
+            ident = self.identity(k) if task and self.identity is not None else None
+            if ident is None:
+                put_uvarint(self.table, 0)
+            else:
+                put_uvarint(self.table, 1)
+                put_uvarint(self.table, zigzag(ident[0]))
+                put_str(self.table, ident[1])
+                put_uvarint(self.table, zigzag(ident[2]))
+                put_uvarint(self.table, zigzag(ident[3]))
+        return i
+
+    def add(self, ts, task_time, imc_time, streams):
+        if not self.n:
+            self.first = ts
+        self.last = ts
+        self.n += 1
+        body = self.body
+        body.extend(TIMES.pack(ts, task_time, imc_time))
+
+        for s, c in enumerate(streams):
+            put_uvarint(body, len(c))
+            for k, e, v, r, p in zip(c.keys, c.events, c.values, c.running, c.pct):
+                ki = self.key_index(k, s == 0)
+                ei = self.events.get(e)
+                if ei is None:
+                    raise ValueError("event %s isn't in the recording" % e)
+                cur = (int(round(v)), int(round(r)), int(round(p * 100)))
+                last = self.prev.get((s, ki, ei), (0, 0, 0))
+                self.prev[(s, ki, ei)] = cur
+                put_uvarint(body, ki)
+                put_uvarint(body, ei)
+                put_uvarint(body, zigzag(cur[0] - last[0]))
+                put_uvarint(body, zigzag(cur[1] - last[1]))
+                put_uvarint(body, zigzag(cur[2] - last[2]))
+
+    def encode(self):
+        table = bytearray()
+        put_uvarint(table, len(self.keys) - 1)
+        payload = bytes(table + self.table + self.body)
+        return CHUNK.pack(CHUNK_MAGIC, len(payload), self.n, self.first, self.last) + payload
+
+class Recorder(object):
+    """Append interval counts to a recording
+
+    identity(key) gives (pid, comm, tgid, uid) of a task key or None, it
+    is asked once per key and chunk.
+    """
+    def __init__(self, path, meta, identity=None, chunk_intervals=CHUNK_INTERVALS):
+        self.path = path
+        self.meta = meta
+        self.identity = identity
+        self.chunk_intervals = chunk_intervals
+        self.index = []
+        self.events = None
+        self.chunk = None
+        self.f = None
+        if os.path.exists(path) and os.path.getsize(path):
+            self.reopen()
+
+    def reopen(self):
+        rec = Recording(self.path)
+        try:
+            for k in SAME_META:
+                if rec.meta.get(k) != self.meta.get(k):
+                    raise ValueError("%s was recorded with other targets or options" % self.path)
+            self.meta = rec.meta
+            self.events = dict((e, i) for i, e in enumerate(rec.meta["events"]))
+            self.index = [rec.entry(i) for i in range(rec.chunks)]
+            end = rec.data_end
+        finally:
+            rec.close()
+        # the old index goes, it's written again on close()
+        self.f = open(self.path, "r+b")
+        self.f.truncate(end)
+        self.f.seek(end)
+
+    def start(self, streams):
+        # the meta can name events ahead of the first interval having them
+        events = list(self.meta.get("events", []))
+        for c in streams:
+            for e in c.events:
+                if e not in events:
+                    events.append(e)
+        self.meta = dict(self.meta, version=VERSION, events=events)
+        self.events = dict((e, i) for i, e in enumerate(events))
+        header = json.dumps(self.meta, sort_keys=True).encode("utf-8")
+        self.f = open(self.path, "wb")
+        self.f.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+    def write(self, ts, task_time, imc_time, task, system, unc):
+        """Add one interval, ts is its start in seconds since the epoch"""
+        if self.f is None:
+            self.start((task, system, unc))
+        if self.chunk is None:
+            self.chunk = ChunkWriter(self.events, self.identity)
+        self.chunk.add(ts, task_time, imc_time, (task, system, unc))
+        if self.chunk.n >= self.chunk_intervals:
+            self.flush()
+
+    def flush(self):
+        if self.chunk is None or not self.chunk.n:
+            return
+        offset = self.f.tell()
+        self.f.write(self.chunk.encode())
+        self.f.flush()
+        self.index.append((self.chunk.first, self.chunk.last, offset, self.chunk.n))
+        self.chunk = None
+
+    def close(self):
+        if self.f is None:
+            return
+        self.flush()
+        offset = self.f.tell()
+        self.f.write(b"".join([INDEX_ENTRY.pack(*e) for e in self.index]))
+        self.f.write(TRAILER.pack(offset, len(self.index), INDEX_MAGIC))
+        self.f.close()
+        self.f = None
+
+class Identities(object):
+    """Recorded task identities, looked up like a ProcResolver"""
+    def __init__(self):
+        self.info = {}
+
+    def add(self, pid, comm, tgid, uid):
+        self.info[pid] = TaskInfo(pid, 0, comm, tgid, uid, "")
+
+    def lookup(self, pid):
+        return self.info.get(pid)
+
+    def cached(self, pid):
+        return self.info.get(pid)
+
+    def refresh(self, pids):
+        # the recorded identities are as they were at the time, nothing to revalidate
+        return dict((pid, self.info[pid]) for pid in pids if pid in self.info)
+
+class Interval(object):
+    __slots__ = ("ts", "task_time", "imc_time", "task", "system", "unc")
+
+class Recording(object):
+    """A recording mapped into memory, chunks are decoded when iterated
+
+    Finding an interval by time is a bisection over the fixed size
+    index entries, only the chunks iterated over are decoded.
+    """
+    def __init__(self, path):
+        self.f = open(path, "rb")
+        size = os.fstat(self.f.fileno()).st_size
+        if size < len(MAGIC) + 4:
+            self.f.close()
+            raise ValueError("%s isn't a recording" % path)
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("%s isn't a recording" % path)
+
+        n = struct.unpack_from("<I", self.mm, len(MAGIC))[0]
+        start = len(MAGIC) + 4
+        self.meta = json.loads(self.mm[start:start + n].decode("utf-8"))
+        self.data_start = start + n
+        self.tasks = Identities()
+
+        self.index_at = None
+        self.scanned = []
+        trailer = size - TRAILER.size
+        if trailer >= self.data_start:
+            offset, chunks, magic = TRAILER.unpack_from(self.mm, trailer)
+            if magic == INDEX_MAGIC and offset + chunks * INDEX_ENTRY.size == trailer:
+                self.index_at = offset
+                self.chunks = chunks
+                self.data_end = offset
+        if self.index_at is None:
+            self.scan(size)
+
+    def scan(self, size):
+        # no index, walk the chunks up to the last complete one
+        pos = self.data_start
+        while pos + CHUNK.size <= size:
+            magic, length, n, first, last = CHUNK.unpack_from(self.mm, pos)
+            if magic != CHUNK_MAGIC or pos + CHUNK.size + length > size:
+                break
+            self.scanned.append((first, last, pos, n))
+            pos += CHUNK.size + length
+        self.chunks = len(self.scanned)
+        self.data_end = pos
+
+    def entry(self, i):
+        """(first, last timestamp, offset, intervals) of chunk i"""
+        if self.index_at is None:
+            return self.scanned[i]
+        return INDEX_ENTRY.unpack_from(self.mm, self.index_at + i * INDEX_ENTRY.size)
+
+    def __len__(self):
+        return sum([self.entry(i)[3] for i in range(self.chunks)])
+
+    def span(self):
+        """(first, last) interval timestamp, None when empty"""
+        if not self.chunks:
+            return None
+        return self.entry(0)[0], self.entry(self.chunks - 1)[1]
+
+    def find(self, ts):
+        """First chunk with an interval at or after ts"""
+        lo, hi = 0, self.chunks
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.entry(mid)[1] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def intervals(self, start=None, end=None):
+        """Intervals with start <= timestamp <= end, in order"""
+        i = self.find(start) if start is not None else 0
+        events = self.meta["events"]
+        while i < self.chunks:
+            first, last, offset, n = self.entry(i)
+            if end is not None and first > end:
+                return
+            for iv in self.decode(offset, events):
+                if start is not None and iv.ts < start:
+                    continue
+                if end is not None and iv.ts > end:
+                    return
+                yield iv
+            i += 1
+
+    def decode(self, offset, events):
+        magic, length, n, first, last = CHUNK.unpack_from(self.mm, offset)
+        buf = bytearray(self.mm[offset + CHUNK.size:offset + CHUNK.size + length])
+
+        nkeys, pos = get_uvarint(buf, 0)
+        keys = [None]
+        for i in range(nkeys):
+            k, pos = get_str(buf, pos)
+            has, pos = get_uvarint(buf, pos)
+            if has:
+                pid, pos = get_uvarint(buf, pos)
+                comm, pos = get_str(buf, pos)
+                tgid, pos = get_uvarint(buf, pos)
+                uid, pos = get_uvarint(buf, pos)
+                self.tasks.add(unzigzag(pid), comm, unzigzag(tgid), unzigzag(uid))
+            keys.append(k)
+
+        prev = {}
+        for j in range(n):
+            iv = Interval()
+            iv.ts, iv.task_time, iv.imc_time = TIMES.unpack_from(buf, pos)
+            pos += TIMES.size
+            streams = []
+            for s in range(STREAMS):
+                c = Counts()
+                rows, pos = get_uvarint(buf, pos)
+                for r in range(rows):
+                    ki, pos = get_uvarint(buf, pos)
+                    ei, pos = get_uvarint(buf, pos)
+                    dv, pos = get_uvarint(buf, pos)
+                    dr, pos = get_uvarint(buf, pos)
+                    dp, pos = get_uvarint(buf, pos)
+                    last = prev.get((s, ki, ei), (0, 0, 0))
+                    cur = (last[0] + unzigzag(dv), last[1] + unzigzag(dr), last[2] + unzigzag(dp))
+                    prev[(s, ki, ei)] = cur
+                    c.keys.append(keys[ki])
+                    c.events.append(events[ei])
+                    c.values.append(cur[0])
+                    c.running.append(cur[1])
+                    c.pct.append(cur[2] / 100.0)
+                streams.append(c)
+            iv.task, iv.system, iv.unc = streams
+            yield iv
+
+    def close(self):
+        self.mm.close()
+        self.f.close()
@@ -0,0 +1,1428 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""bw-report.py: report per-task memory bandwidth from the collected counts"""
+
+import os
+import sys
+import atexit
+import stat
+import time
+import errno
+import select
+import subprocess
+import argparse
+import pwd
+from signal import signal, SIGINT
+from membw import perfcsv, compute, cgroup, mba, topology, imc, record, discover
+from membw.history import History
+from membw.clock import Ticker
+from membw.adaptive import Tiers
+from membw.procinfo import ProcResolver
+from membw.sink import Sink, Row, FORMATS
+from membw.exporter import Exporter, parse_listen, DEFAULT_TOP
+from membw import shm, agent
+
+# all time in seconds
+DEFAULT_MEASURE_TIME = 1000
+DEFAULT_INTERVAL = 5
+
+GROUP_BY = ("thread", "process", "command", "user")
+
+# --sort choices and the TaskBW column they order by
+SORT_KEYS = {
+    "dram-read": "read_bw",
+    "dram-write": "write_bw",
+    "pmem-read": "pmem_read_bw",
+    "pmem-write": "pmem_write_bw",
+}
+
+# --sort choices in the order of the IMC totals
+SORT_TOTALS = ("dram-read", "dram-write", "pmem-read", "pmem-write")
+
+# --history columns, of the --sort bandwidth
+HISTORY_COLS = ("Mean", "EWMA", "Peak", "P50", "P95", "P99")
+
+# shared.log events that are system wide stores, the rest are IMC counts
+SYSTEM_EVENTS = (imc.STORES,)
+
+# below this share of time running, the multiplexed counts are reported
+MIN_COVERAGE = 0.995
+
+def get_pid_max():
+    m = os.popen('cat /proc/sys/kernel/pid_max').read().strip()
+    return int(m)
+
+def parse_when(s, first):
+    # "YYYY-mm-dd HH:MM[:SS]", "HH:MM[:SS]" on the day the recording starts,
+    # or seconds since the epoch
+    try:
+        return float(s)
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+        try:
+            return time.mktime(time.strptime(s, fmt))
+        except ValueError:
+            pass
+    day = time.strftime("%Y-%m-%d ", time.localtime(first))
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            return time.mktime(time.strptime(day + s, "%Y-%m-%d " + fmt))
+        except ValueError:
+            pass
+    sys.exit("Invalid time: %s" % s)
+
+def parse_args(argv=None):
+    """Options of a run, the parsed arguments and what's made of them
+
+    pids, m_time, interval, top, matchers, budgets, split, recording,
+    start, end, listen, send, out_fd and cmd, the bw-collect.py command,
+    are set on top of the arguments.
+    """
+    ap = argparse.ArgumentParser(description='Report per-task memory read/write bandwidth.')
+    ap.add_argument('-p', '--pid', type=int, nargs='*', default=-1,\
+            help='task PID to monitor, multi PIDs with space in between, default -1 for all tasks')
+    ap.add_argument('-G', '--cgroup', nargs='+', default=[],\
+            help='cgroup(s) to monitor instead of tasks, relative to the cgroup root, '\
+            'multi cgroups with space in between')
+    ap.add_argument('-under', '--cgroup-under', nargs='+', default=[],\
+            help='monitor all cgroups right under the given cgroup(s)')
+    ap.add_argument('-m', '--match', action='append', default=[],\
+            help='also monitor processes matching comm:REGEX, cmdline:SUBSTRING or cgroup:PATH, '\
+            'found again every interval, can be repeated')
+    ap.add_argument('-t', '--time', type=int, default=1000,\
+            help='measure time in seconds, 0 for infinite, default 1000s')
+    ap.add_argument('-i', '--interval', type=int, default=5,\
+            help='refresh interval in seconds, default 5s')
+    ap.add_argument('-pmem', '--pmem', action="store_true",\
+            help='monitor persistent memory bandwidth too, default not')
+    ap.add_argument('-s', '--stream', action="store_true",\
+            help='keep one perf session running and stream interval counts, '\
+            'no collection gaps between refreshes, default not')
+    ap.add_argument('-direct', '--direct', action="store_true",\
+            help='read counters in-process with perf_event_open instead of running perf, '\
+            'no collection gaps between refreshes, default not')
+    ap.add_argument('-resctrl', '--resctrl', action="store_true",\
+            help='read resctrl MBM counters instead of perf events, DRAM reads and writes '\
+            'are reported together as read, default not')
+    ap.add_argument('-budget', '--budget', action='append', default=[],\
+            help='DRAM bandwidth budget KEY=MiB/s of a --pid or --cgroup target, targets going '\
+            'over it are throttled with resctrl MBA, can be repeated')
+    ap.add_argument('-dry-run', '--dry-run', action="store_true",\
+            help='with --budget, only print what would be throttled, default not')
+    ap.add_argument('-S', '--per-socket', action="store_true",\
+            help='report IMC bandwidth per socket, and split a single PID, cgroups or resctrl '\
+            'groups by socket too, default not')
+    ap.add_argument('-C', '--channels', action="store_true",\
+            help='report the bandwidth of every IMC channel, its imbalance and hot channels, '\
+            'default not')
+    ap.add_argument('-adaptive', '--adaptive', type=float, default=0, metavar='MIB',\
+            help='count per task only in the interval after one with DRAM read or write bandwidth '\
+            'of MIB MiB/s or more, IMC totals only in the others, default 0 for every interval')
+    ap.add_argument('-duty', '--duty', type=int, default=0, metavar='N',\
+            help='with --adaptive, count per task every Nth interval anyway, default 0 for never')
+    ap.add_argument('-record', '--record', metavar='FILE',\
+            help='append the raw counts of every interval to a binary recording')
+    ap.add_argument('-replay', '--replay', metavar='FILE',\
+            help='report from a recording instead of monitoring, --by, --top, --sort, --per-socket '\
+            'and --channels apply as usual')
+    ap.add_argument('-from', '--from', dest='start',\
+            help='with --replay, first interval to report, [YYYY-mm-dd ]HH:MM[:SS] or epoch seconds')
+    ap.add_argument('-to', '--to', dest='end',\
+            help='with --replay, last interval to report, same formats as --from')
+    ap.add_argument('-history', '--history', type=int, default=0, metavar='N',\
+            help='add the mean, EWMA, peak and p50/p95/p99 of the --sort bandwidth over the last N '\
+            'intervals, default 0 for none')
+    ap.add_argument('-format', '--format', choices=("text",) + FORMATS, default='text',\
+            help='output format, text columns or an interval per JSON line, CSV lines or '\
+            'length-prefixed binary records, default text')
+    ap.add_argument('-out', '--out', metavar='FILE',\
+            help='with --format, write to FILE instead of stdout, messages stay on stdout')
+    ap.add_argument('-rotate', '--rotate', type=float, default=0, metavar='MB',\
+            help='with --out, rotate FILE before it grows over MB MiB, default 0 for never')
+    ap.add_argument('-keep', '--keep', type=int, default=5, metavar='N',\
+            help='with --rotate, rotated files kept as FILE.1 to FILE.N, default 5')
+    ap.add_argument('-listen', '--listen', metavar='[HOST:]PORT',\
+            help='serve the last interval as Prometheus metrics on http://HOST:PORT/metrics instead '\
+            'of printing it, HOST defaults to 127.0.0.1')
+    ap.add_argument('-metrics-top', '--metrics-top', type=int, default=DEFAULT_TOP, metavar='N',\
+            help='with --listen, label only the N heaviest tasks, the rest add up to pid "other", '\
+            'default %d' % DEFAULT_TOP)
+    ap.add_argument('-shm', '--shm', metavar='NAME',\
+            help='publish every interval to a shared memory ring /dev/shm/NAME for local readers of '\
+            'membw.shm instead of printing it, NAME may be a path')
+    ap.add_argument('-shm-slots', '--shm-slots', type=int, default=shm.DEFAULT_SLOTS, metavar='N',\
+            help='with --shm, intervals the ring holds, default %d' % shm.DEFAULT_SLOTS)
+    ap.add_argument('-shm-rows', '--shm-rows', type=int, default=shm.DEFAULT_ROWS, metavar='N',\
+            help='with --shm, task rows kept per interval, heaviest first, default %d' % shm.DEFAULT_ROWS)
+    ap.add_argument('-send', '--send', metavar='ADDR',\
+            help='stream every interval to a bw-cluster.py at [HOST:]PORT or unix:PATH instead of '\
+            'printing it')
+    ap.add_argument('-hostname', '--hostname', default=os.uname()[1],\
+            help='with --send, name the intervals go under, default the host name')
+    ap.add_argument('-send-queue', '--send-queue', type=int, default=agent.DEFAULT_QUEUE, metavar='N',\
+            help='with --send, intervals held while the collector is slow or away, the oldest are '\
+            'dropped past N, a replay waits instead, default %d' % agent.DEFAULT_QUEUE)
+    ap.add_argument('-top', '--top', type=int, default=0,\
+            help='only list the N heaviest tasks, default 0 for all')
+    ap.add_argument('-sort', '--sort', choices=sorted(SORT_KEYS), default='dram-read',\
+            help='bandwidth the tasks are ordered by, default dram-read')
+    ap.add_argument('-by', '--by', choices=GROUP_BY, default='thread',\
+            help='aggregate all tasks by thread, process, command or user, default thread')
+    ap.add_argument('-drill', '--drill', action='append', default=[],\
+            help='also list the threads of the given --by group(PID, command or user), '\
+            'can be repeated')
+    ap.add_argument('-tui', '--tui', action="store_true",\
+            help='full-screen live view redrawn in place instead of scrolling rows, default not')
+    g = ap.add_mutually_exclusive_group(required=False)
+    g.add_argument('-dram', '--dram', dest='dram', action="store_true",\
+            help='monitor DRAM related bandwidths, default TRUE')
+    g.add_argument('-no-dram', '--no-dram', dest='dram', action="store_false",\
+            help='do not monitor DRAM realted bandwidths')
+    ap.set_defaults(dram=True)
+
+    args = ap.parse_args(argv)
+    replay = None
+    if args.replay:
+        if args.pid != -1 or args.cgroup or args.cgroup_under or args.stream or args.direct or args.resctrl\
+                or args.budget or args.record or args.match or args.adaptive:
+            sys.exit("--replay can't be used with --pid, --cgroup, --stream, --direct, --resctrl, "\
+                    "--budget, --record, --match or --adaptive")
+        try:
+            replay = record.Recording(args.replay)
+        except (IOError, OSError, ValueError) as e:
+            sys.exit("Can't read recording: %s" % e)
+        args.pid = replay.meta["pids"]
+        args.pmem = args.pmem or replay.meta["pmem"]
+    elif args.start or args.end:
+        sys.exit("--from/--to need --replay")
+    if args.record and args.resctrl:
+        sys.exit("--record needs perf counters, not --resctrl")
+
+    if replay is not None and replay.meta["cgroup"]:
+        pids = args.pid
+    elif args.pid != -1:
+        pids = args.pid
+        for pid in pids:
+            if pid > get_pid_max() or pid < -1 or (pid == -1 and len(pids) > 1):
+                sys.exit("Invalid PID: %d" % pid)
+    else:
+        pids = [-1]
+    try:
+        matchers = [discover.parse_matcher(m) for m in args.match]
+    except ValueError as e:
+        sys.exit("Invalid match: %s" % e)
+    if matchers:
+        if args.cgroup or args.cgroup_under:
+            sys.exit("--match finds processes, it can't be used with --cgroup/--cgroup-under")
+        # targets are found as they show up
+        pids = [] if pids == [-1] else pids
+
+    if args.time > 0:
+        m_time = args.time
+    elif args.time == 0:
+        m_time = sys.maxint if (sys.version == 2) else sys.maxsize
+    else:
+        print("Invalid measure time(%d), using default(1000s)." % args.time)
+        m_time = DEFAULT_MEASURE_TIME
+
+    if args.interval:
+        if args.interval > 0 and args.interval < m_time:
+            i = args.interval
+        else:
+            print("Invalid interval(%d), using default(5s)." % args.interval)
+            i = DEFAULT_INTERVAL
+    else:
+        i = DEFAULT_INTERVAL if(m_time > DEFAULT_INTERVAL) else m_time
+
+    if args.history < 0:
+        sys.exit("Invalid history: %d" % args.history)
+    top = args.top
+    if top < 0:
+        print("Invalid top(%d), listing all tasks." % args.top)
+        top = 0
+    if args.cgroup or args.cgroup_under:
+        if pids != [-1] or args.by != "thread" or args.direct:
+            sys.exit("--cgroup/--cgroup-under can't be used with --pid, --by or --direct")
+        pids = cgroup.resolve(cgroup.cgroup_root(), args.cgroup, args.cgroup_under)
+        if not pids:
+            sys.exit("No cgroup found.")
+    if args.resctrl and (args.stream or args.direct or args.pmem or args.by != "thread"):
+        sys.exit("--resctrl can't be used with --stream, --direct, --pmem or --by")
+    try:
+        budgets = [mba.parse_budget(b) for b in args.budget]
+    except ValueError as e:
+        sys.exit("Invalid budget: %s" % e)
+    if budgets:
+        if pids == [-1] or args.resctrl:
+            sys.exit("--budget needs --pid or --cgroup targets and perf counters, not --resctrl")
+        for key, b in budgets:
+            if not args.cgroup and not args.cgroup_under and key not in [str(pid) for pid in pids]:
+                sys.exit("No budget target %s in --pid" % key)
+    if args.format == "text" and (args.out or args.rotate):
+        sys.exit("--out and --rotate need --format jsonl, csv or binary")
+    if args.format != "text" and args.tui:
+        sys.exit("--format %s can't be used with --tui" % args.format)
+    if args.rotate < 0 or args.keep < 0 or (args.rotate and not args.out):
+        sys.exit("--rotate needs --out, and --rotate/--keep can't be negative")
+    listen = None
+    if args.listen:
+        if args.tui or args.replay:
+            sys.exit("--listen can't be used with --tui or --replay")
+        if args.format != "text" and not args.out:
+            sys.exit("--listen and --format need --out, the metrics take the place of stdout")
+        try:
+            listen = parse_listen(args.listen)
+        except ValueError as e:
+            sys.exit("Invalid listen address: %s" % e)
+    if args.metrics_top < 0:
+        sys.exit("Invalid metrics top: %d" % args.metrics_top)
+    if args.shm and args.tui:
+        sys.exit("--shm can't be used with --tui")
+    if args.shm_slots < 1 or args.shm_rows < 0:
+        sys.exit("Invalid --shm-slots or --shm-rows")
+    send = None
+    if args.send:
+        if args.tui:
+            sys.exit("--send can't be used with --tui")
+        if args.send_queue < 1:
+            sys.exit("Invalid send queue: %d" % args.send_queue)
+        try:
+            send = agent.parse_address(args.send)
+        except ValueError as e:
+            sys.exit("Invalid send address: %s" % e)
+    out_fd = None
+    if args.format != "text" and not args.out:
+        # the intervals get stdout to themselves, messages go to stderr
+        sys.stdout.flush()
+        out_fd = os.dup(sys.stdout.fileno())
+        sys.stdout = sys.stderr
+    if args.adaptive < 0 or args.duty < 0:
+        sys.exit("Invalid --adaptive or --duty")
+    if args.duty and not args.adaptive:
+        sys.exit("--duty needs --adaptive")
+    if args.adaptive and (args.stream or args.direct or args.resctrl):
+        sys.exit("--adaptive needs the default mode, not --stream, --direct or --resctrl")
+    if args.channels and args.resctrl:
+        sys.exit("--channels needs the IMC counters, not --resctrl")
+    if budgets and args.per_socket:
+        sys.exit("--budget can't be used with --per-socket")
+    # perf gives per-CPU task counts only when they aren't per-thread
+    split = args.per_socket and not args.direct and (args.resctrl or args.cgroup or args.cgroup_under\
+            or (pids != [-1] and len(pids) == 1 and not matchers))
+    if replay is not None:
+        # the recorded task keys tell whether it was split
+        split = replay.meta["socket_split"]
+        args.per_socket = args.per_socket or split
+    if args.by != "thread" and pids != [-1]:
+        sys.exit("--by %s needs all tasks monitored" % args.by)
+    if args.drill and args.by == "thread":
+        sys.exit("--drill needs --by process, command or user")
+    if args.sort.startswith("pmem") and not args.pmem:
+        sys.exit("--sort %s needs --pmem" % args.sort)
+
+    start = end = None
+    if replay is not None:
+        span = replay.span()
+        if span is None:
+            sys.exit("Empty recording.")
+        start = parse_when(args.start, span[0]) if args.start else None
+        end = parse_when(args.end, span[0]) if args.end else None
+        print("")
+        print("Replaying %d interval(s) of %s from %s to %s." % (len(replay), "all tasks" if pids == [-1]\
+                else "%d %s(s)" % (len(pids), "cgroup" if replay.meta["cgroup"] else "task"),\
+                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(span[0])),\
+                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(span[1]))))
+        # the recorded cgroups are the targets, as if given with --cgroup
+        args.cgroup = pids if replay.meta["cgroup"] else []
+        args.cgroup_under = []
+        cmd = []
+    else:
+        # one bw-collect.py for all PIDs, uncore and system wide counts are shared
+        cmd = ["./bw-collect.py"]
+        if args.stream:
+            # one bw-collect.py for the whole run, perf prints every interval
+            cmd.extend(["--time", str(0 if args.time == 0 else m_time), "--interval", str(i)])
+        else:
+            cmd.extend(["--time", str(i)])
+        if args.pmem:
+            cmd.append("--pmem")
+        if split:
+            cmd.append("--per-socket")
+
+        print("")
+        print("Monitoring %s for %d seconds, refreshing in every %d seconds."\
+                % ("all tasks" if(pids == [-1]) else "%d %s(s)" % (len(pids),\
+                "cgroup" if args.cgroup or args.cgroup_under else "task"), m_time, i))
+        if matchers:
+            print("Adding processes matching %s as they show up." % ", ".join(args.match))
+
+    args.pids = pids
+    args.m_time = m_time
+    args.interval = i
+    args.top = top
+    args.drill = set(args.drill)
+    args.matchers = matchers
+    args.budgets = budgets
+    args.split = split
+    args.recording = replay
+    args.start = start
+    args.end = end
+    args.listen = listen
+    args.send = send
+    args.out_fd = out_fd
+    args.cmd = cmd
+    return args
+
+def clean_dir(d):
+    for name in ("task.log", "shared.log"):
+        if os.path.exists(os.path.join(d, name)):
+            os.remove(os.path.join(d, name))
+
+    # remove the folder if it's empty
+    if os.path.isdir(d) and not os.listdir(d):
+        os.rmdir(d)
+
+def close_sender(sender):
+    sender.close()
+    if sender.dropped:
+        sys.stderr.write("%d interval(s) not sent to %s.\n" % (sender.dropped, agent.describe(sender.addr)))
+
+def sum_totals(totals):
+    t = [0.0, 0.0, 0.0, 0.0, 0]
+    for x in totals:
+        t = [a + b for a, b in zip(t, x)]
+    return tuple(t)
+
+class IntervalStream(object):
+    """Incrementally parse 'perf stat -I -x' output read from a FIFO
+
+    Intervals are indexed by the wall clock slot they end in, base is
+    the wall clock time perf was started at.
+    """
+    def __init__(self, path, interval, keyed, cgroup=False, base=0.0):
+        self.path = path
+        self.base = base
+        self.interval = float(interval)
+        self.keyed = keyed
+        self.cgroup = cgroup
+        self.fd = None
+        self.buf = b""
+        self.started = None
+        self.prev_ts = 0.0
+        self.last_data = 0.0
+        self.cur = None
+        self.cur_index = 0
+        self.done = {}
+
+    def open(self):
+        if self.fd is None:
+            try:
+                if not stat.S_ISFIFO(os.stat(self.path).st_mode):
+                    return None
+                # O_RDWR keeps the FIFO from reporting EOF before perf opens
+                # it, perf exiting is noticed through bw-collect.py instead
+                self.fd = os.open(self.path, os.O_RDWR | os.O_NONBLOCK)
+            except OSError:
+                return None
+        return self.fd
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def feed(self):
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            if not data:
+                break
+            self.buf += data
+        self.last_data = time.time()
+
+        lines = self.buf.split(b"\n")
+        self.buf = lines.pop()
+        if sys.version_info.major > 2:
+            lines = [l.decode('utf-8', 'replace') for l in lines]
+
+        c = perfcsv.parse(lines, interval=True, keyed=self.keyed, cgroup=self.cgroup)
+        if c.started is not None:
+            self.started = c.started
+
+        # all rows of one interval carry the same timestamp
+        ts = c.ts
+        n = len(c)
+        lo = 0
+        while lo < n:
+            t = ts[lo]
+            hi = lo + 1
+            while hi < n and ts[hi] == t:
+                hi += 1
+            index = int(round((self.base + t) / self.interval))
+            if self.cur is not None and self.cur_index != index:
+                self.complete()
+            if self.cur is None:
+                self.cur = c.slice(lo, hi)
+                self.cur_index = index
+            else:
+                self.cur.extend(c.slice(lo, hi))
+            lo = hi
+
+    def complete(self):
+        ts = self.cur.ts[0]
+        self.done[self.cur_index] = (ts, ts - self.prev_ts, self.cur)
+        self.prev_ts = ts
+        self.cur = None
+
+    def flush_idle(self, now, quiet):
+        # perf writes an interval in one go, a quiet FIFO means it's finished
+        if self.cur is not None and now - self.last_data >= quiet:
+            self.complete()
+
+class StreamChild(object):
+    """A bw-collect.py streaming into the FIFOs of its own log directory"""
+    def __init__(self, cmd, log_dir, streams, pids=None, first=0, stderr=None):
+        self.log_dir = log_dir
+        self.streams = streams
+        self.pids = pids
+        # first slot it can have counts for
+        self.first = first
+        self.proc = subprocess.Popen(cmd, stderr=stderr)
+
+    def finished(self):
+        return self.proc.poll() is not None
+
+    def reached(self, index):
+        s = self.streams[0]
+        return index < self.first or any([i >= index for i in s.done])\
+                or (s.cur is not None and s.cur_index > index)
+
+    def drained(self):
+        return self.finished() and not any([s.done or s.cur is not None for s in self.streams])
+
+    def stop(self):
+        if self.proc.poll() is None:
+            self.proc.terminate()
+        # a perf blocked on a full FIFO that's no longer drained gets EPIPE
+        # and exits, instead of keeping bw-collect.py from exiting
+        for s in self.streams:
+            s.close()
+        self.proc.wait()
+        clean_dir(self.log_dir)
+
+class Supervisor(object):
+    """Stream children, their intervals joined by wall clock slot
+
+    One child counts the uncore and system wide events, every batch of
+    targets gets one of its own for the task events. Targets found later
+    make a new batch at the next interval boundary, a batch whose targets
+    are gone just ends, neither holds up the intervals of the others.
+    The logs and task keys are those of reporter.
+    """
+    def __init__(self, reporter, cmd, interval):
+        self.reporter = reporter
+        self.cmd = cmd
+        self.interval = float(interval)
+        self.shared = None
+        self.batches = []
+        self.seq = 0
+
+    def start_shared(self, base):
+        r = self.reporter
+        d = os.path.join(r.cur_dir, "logs", "shared")
+        streams = (IntervalStream(os.path.join(d, "shared.log"), self.interval, True, base=base),)
+        self.shared = StreamChild(self.cmd[:1] + ["--only", "shared", "--log-dir", d] + self.cmd[1:], d, streams,\
+                stderr=r.fnull)
+
+    def add_batch(self, pids, base):
+        self.seq += 1
+        r = self.reporter
+        d = os.path.join(r.cur_dir, "logs", "task%d" % self.seq)
+        task = IntervalStream(os.path.join(d, "task.log"), self.interval, not r.cgroup_mon or r.socket_split,\
+                r.cgroup_mon, base)
+        cmd = r.collect_cmd(self.cmd, pids, d)
+        self.batches.append(StreamChild(cmd[:1] + ["--only", "task"] + cmd[1:], d, (task,), list(pids),\
+                int(round(base / self.interval)) + 1, r.fnull))
+
+    def covered(self):
+        return set([p for c in self.batches for p in c.pids])
+
+    def children(self):
+        return [self.shared] + self.batches
+
+    def poll(self, timeout, quiet):
+        fds = {}
+        for c in self.children():
+            for s in c.streams:
+                if s.open() is not None:
+                    fds[s.fd] = s
+
+        if fds:
+            try:
+                r = select.select(list(fds), [], [], timeout)[0]
+            except select.error:
+                r = []
+            for fd in r:
+                fds[fd].feed()
+        else:
+            # the children haven't created their FIFOs yet
+            time.sleep(min(timeout, 0.05))
+
+        now = time.time()
+        for c in self.children():
+            finished = c.finished()
+            for s in c.streams:
+                if finished and s.fd is not None:
+                    s.feed()
+                s.flush_idle(now, 0 if finished else quiet)
+
+    def ready(self, final=False):
+        """(slot, task, length, system, unc) of the slots all running batches are done with"""
+        shared = self.shared.streams[0]
+        for index in sorted(shared.done):
+            waiting = [c for c in self.batches if not c.finished() and not c.reached(index)]
+            # a batch late by a whole interval doesn't hold up the rest
+            if waiting and not final and time.time() < (index + 1) * self.interval:
+                return
+
+            task = perfcsv.Counts()
+            for c in self.batches:
+                t = c.streams[0].done.get(index)
+                if t is not None:
+                    task.extend(self.reporter.target_keys(t[2], c.pids))
+            ts, length, counts = shared.done[index]
+            yield (index, task, length) + counts.partition(SYSTEM_EVENTS)
+
+            # anything older than a joined slot can never be completed
+            for c in self.children():
+                for s in c.streams:
+                    for i in [i for i in s.done if i <= index]:
+                        del s.done[i]
+
+    def reap(self):
+        for c in [c for c in self.batches if c.drained()]:
+            c.stop()
+            self.batches.remove(c)
+
+    def close(self):
+        for c in self.children():
+            c.stop()
+
+class Reporter(object):
+    """A run of bw-report.py, its options and everything it keeps between intervals
+
+    args are those of parse_args(). Sinks, the exporter, the ring, the
+    sender, MBA throttling and the recording are set up here and closed at
+    exit, run() then monitors or replays.
+    """
+    def __init__(self, args):
+        self.args = args
+        self.fnull = open(os.devnull, 'w')
+        self.cur_dir = os.getcwd()
+        self.tid_map = {}
+        self.tasks = ProcResolver()
+        self.target_start = {}
+        self.user_names = {}
+        self.view = None
+        self.controller = None
+        self.recorder = None
+
+        self.pids = args.pids
+        self.pmem_mon = args.pmem
+        self.dram_mon = args.dram
+        self.top = args.top
+        self.sort_by = args.sort
+        self.group_by = args.by
+        self.drill_keys = args.drill
+        self.cgroup_paths = args.cgroup
+        self.cgroup_under = args.cgroup_under
+        self.dry_run = args.dry_run
+        self.per_socket = args.per_socket
+        self.socket_split = args.split
+        self.matchers = args.matchers
+        self.tiers = Tiers(args.adaptive, args.duty) if args.adaptive else None
+        self.cgroup_mon = bool(self.cgroup_paths or self.cgroup_under)
+        self.cgroup_root = cgroup.cgroup_root()
+        replay = args.recording
+        if replay is not None:
+            # the CPUs of the recording machine
+            self.sockets = dict((int(c), sk) for c, sk in replay.meta["sockets"].items())
+        else:
+            self.sockets = topology.cpu_sockets() if args.per_socket or args.channels else {}
+        self.channel_mon = imc.ChannelMonitor() if args.channels else None
+        self.history = History(args.history) if args.history else None
+
+        if self.pmem_mon:
+            print("\"pmem\" specified, persistent memory related bandwidth monitoring added.")
+        if not self.dram_mon:
+            print("\"no-dram\" specified, DRAM related bandwidth will not be printed.")
+        if args.resctrl:
+            print("\"resctrl\" specified, read bandwidth is all DRAM traffic(mbm_total_bytes), writes included.")
+        if self.per_socket:
+            print("\"per-socket\" specified, IMC bandwidth is reported per socket%s."\
+                    % (", tasks are split by socket too" if self.socket_split else ""))
+        if args.channels:
+            print("\"channels\" specified, channels over their socket's mean by %d%% for %d intervals are hot."\
+                    % (imc.HOT_MARGIN * 100, imc.HOT_INTERVALS))
+        if (self.per_socket or args.channels) and replay is None:
+            for box, s in sorted(topology.imc_sockets().items()):
+                print("    %s: socket %s" % (box, ",".join([str(x) for x in s])))
+        if self.pids == [-1]:
+            print("")
+            print("!!! NOTE: Tasks with all 0.0% read/write BW consumptions are not listed.")
+        if args.budgets:
+            try:
+                self.controller = mba.MBAController(args.budgets, self.cgroup_mon, self.dry_run,\
+                        cgroup_root=self.cgroup_root)
+            except (IOError, OSError) as e:
+                sys.exit("Failed to set up MBA throttling: %s" % e)
+            # throttled tasks must not stay throttled after the run
+            atexit.register(self.controller.close)
+            print("Throttling %d target(s) over their budget%s." % (len(args.budgets),\
+                    ", dry run" if self.dry_run else ""))
+        if self.tiers is not None:
+            print("\"adaptive\" specified, per-task counts only after intervals with DRAM read or write "\
+                    "bandwidth of %.1f MiB/s or more%s." % (self.tiers.threshold,\
+                    ", and every %d intervals" % self.tiers.duty if self.tiers.duty else ""))
+        if self.history is not None:
+            print("\"history\" specified, %s bandwidth stats(MiB/s) over the last %d intervals added."\
+                    % (self.sort_by, args.history))
+        if args.record:
+            meta = {"pids": self.pids, "cgroup": self.cgroup_mon, "socket_split": self.socket_split,\
+                    "pmem": self.pmem_mon, "interval": args.interval, "host": os.uname()[1],\
+                    "events": list(compute.EVENTS),\
+                    "sockets": dict((str(c), sk) for c, sk in topology.cpu_sockets().items())}
+            try:
+                self.recorder = record.Recorder(args.record, meta, self.identity)
+            except (IOError, OSError, ValueError) as e:
+                sys.exit("Can't record to %s: %s" % (args.record, e))
+            atexit.register(self.recorder.close)
+            print("Recording the counts to %s." % args.record)
+        sink = None
+        if args.format != "text":
+            try:
+                sink = Sink(args.format, args.out, args.out_fd, int(args.rotate * 1024 * 1024), args.keep)
+            except (IOError, OSError) as e:
+                sys.exit("Can't write to %s: %s" % (args.out, e))
+            atexit.register(sink.close)
+        exporter = None
+        if args.listen is not None:
+            exporter = Exporter(self.kind_cols(), args.metrics_top)
+            try:
+                exporter.serve(*args.listen)
+            except (IOError, OSError) as e:
+                sys.exit("Can't listen on %s:%d: %s" % (args.listen[0], args.listen[1], e))
+            atexit.register(exporter.close)
+            print("Serving metrics on http://%s:%d/metrics." % args.listen)
+        ring = None
+        if args.shm:
+            try:
+                ring = shm.Ring(args.shm, args.shm_slots, args.shm_rows)
+            except (IOError, OSError) as e:
+                sys.exit("Can't set up the ring %s: %s" % (shm.shm_path(args.shm), e))
+            atexit.register(ring.close)
+            print("Publishing to %s, %d intervals of up to %d tasks." % (ring.path, args.shm_slots, args.shm_rows))
+        sender = None
+        if args.send is not None:
+            # a replay can wait for the collector, live counting can't
+            sender = agent.Sender(args.send, args.hostname, "cgroup" if self.cgroup_mon else self.group_by,\
+                    self.pmem_mon, args.send_queue, block=replay is not None)
+            atexit.register(close_sender, sender)
+            print("Sending to %s as %s." % (agent.describe(args.send), args.hostname))
+        self.publishers = [p for p in (sink, exporter, ring, sender) if p is not None]
+        if args.tui:
+            from membw.tui import LiveView
+            self.view = LiveView([len(h) for h in self.header_cells()])
+            atexit.register(self.view.close)
+        elif not self.publishers:
+            self.print_header()
+
+    def read_log(self, name, keyed, cgroup=False, log_dir=None):
+        lp = os.path.join(log_dir if log_dir else os.path.join(self.cur_dir, "logs"), name)
+
+        if not os.path.exists(lp):
+            sys.exit("No %s found, something wrong!\n" % lp)
+
+        with open(lp) as fd:
+            return perfcsv.parse(fd, keyed=keyed, cgroup=cgroup)
+
+    def live_targets(self, pids):
+        if self.cgroup_mon:
+            # cgroups come and go under the --cgroup-under parents
+            return cgroup.resolve(self.cgroup_root, self.cgroup_paths, self.cgroup_under)
+        if pids == [-1]:
+            return pids
+        matched = set()
+        if self.matchers:
+            # matching processes started since join, restarted services included
+            matched = set(discover.scan(self.matchers, self.tasks.proc_root, exclude=(os.getpid(),)))
+            pids = pids + [p for p in sorted(matched) if p not in pids]
+
+        live = []
+        found = self.tasks.refresh(pids)
+        for pid in pids:
+            info = found.get(pid)
+            start = self.target_start.get(pid)
+            if info is not None and pid in matched and start != info.starttime:
+                # what matches on a reused PID is a target too, e.g. a service
+                # restarted, threads of what ran there before aren't its own
+                if start is not None:
+                    self.drop_threads(pid)
+                start = self.target_start[pid] = info.starttime
+            # a reused PID is some other task, not the one asked for
+            if info is not None and (start is None or start == info.starttime):
+                self.target_start[pid] = info.starttime
+                live.append(pid)
+            else:
+                self.drop_threads(pid)
+        return live
+
+    def drop_threads(self, pid):
+        for t in [t for t in self.tid_map if self.tid_map[t] == str(pid)]:
+            del self.tid_map[t]
+
+    def target_keys(self, task, pids):
+        if self.cgroup_mon:
+            return task
+        if self.socket_split:
+            # per-CPU counts of the single target PID
+            task.keys = ["%d@%s" % (pids[0], k) for k in task.keys]
+            return task
+        if pids != [-1]:
+            self.by_target(task, pids)
+        return task
+
+    def by_target(self, task, pids):
+        # 'perf stat -p PIDs --per-thread' keys rows by "comm-tid", fold the
+        # threads back into their target, exited ones keep their last owner
+        for pid in pids:
+            try:
+                for t in os.listdir("/proc/%d/task" % pid):
+                    self.tid_map[t] = str(pid)
+            except OSError:
+                continue
+        task.keys = [self.tid_map.get(k.rpartition('-')[2]) for k in task.keys]
+        return task
+
+    def identity(self, k):
+        # (pid, comm, tgid, uid) kept with a task key in --record
+        if self.cgroup_mon or k is None:
+            return None
+        try:
+            pid = int(k.rpartition("-")[2] if self.pids == [-1] else k.partition("@")[0])
+        except ValueError:
+            return None
+        info = self.tasks.lookup(pid)
+        if info is None:
+            return None
+        return pid, info.comm, info.tgid, info.uid
+
+    def collect_cmd(self, cmd, pids, log_dir=None):
+        extra = ["--log-dir", log_dir] if log_dir else []
+        if self.cgroup_mon:
+            return cmd[:1] + ["--cgroup", ",".join(pids)] + extra + cmd[1:]
+        return cmd[:1] + ["--pid", ",".join([str(pid) for pid in pids])] + extra + cmd[1:]
+
+    def log_buffers(self):
+        # snapshot mode collects into these by turns
+        return [os.path.join(self.cur_dir, "logs", "0"), os.path.join(self.cur_dir, "logs", "1")]
+
+    def clean_logs(self):
+        # snapshot buffers and stream children have directories of their own
+        logs = os.path.join(self.cur_dir, "logs")
+        if os.path.isdir(logs):
+            for n in os.listdir(logs):
+                if os.path.isdir(os.path.join(logs, n)):
+                    clean_dir(os.path.join(logs, n))
+        clean_dir(logs)
+
+    def calc_print_bw(self, pids, log_dir=None, started=None, attributed=True):
+        # attributed is False for intervals collected with --only shared
+        task = self.read_log("task.log", not self.cgroup_mon or self.socket_split, self.cgroup_mon, log_dir)\
+                if attributed else perfcsv.Counts()
+        system, unc = self.read_log("shared.log", True, False, log_dir).partition(SYSTEM_EVENTS)
+
+        # uncore/system counts are per CPU, their time enabled is the measure time
+        imc_time = unc.elapsed()
+        if (attributed and not len(task)) or imc_time == 0.0 or system.elapsed() == 0.0:
+            # no counts means tasks ended, just return
+            return 0
+
+        self.target_keys(task, pids)
+        if started is None:
+            started = task.started if task.started else time.time()
+        start_time = time.strftime("%H:%M:%S", time.localtime(started))
+        self.report_counts(pids == [-1], start_time, imc_time, imc_time, task, system, unc, started, attributed)
+
+        clean_dir(log_dir if log_dir else os.path.join(self.cur_dir, "logs"))
+        return 1
+
+    def unc_bw(self, log_dir):
+        # DRAM read and write MiB/s of a finished interval, from its shared.log alone
+        if not os.path.exists(os.path.join(log_dir, "shared.log")):
+            return 0.0, 0.0
+        unc = self.read_log("shared.log", True, False, log_dir).partition(SYSTEM_EVENTS)[1]
+        t = imc.totals(perfcsv.Counts(), unc, unc.elapsed()) if unc.elapsed() else {}
+        return t[None][:2] if None in t else (0.0, 0.0)
+
+    def snapshot_bw(self, cmd, pids, interval, m_time):
+        # a bw-collect.py per interval, started on wall clock multiples of the
+        # interval, interval N+1 is collected into the other log buffer while
+        # interval N is parsed and reported, skipped deadlines or not
+        ticker = Ticker(interval)
+        buffers = self.log_buffers()
+        pending = None
+        elapsed = 0
+        while True:
+            started = ticker.wait()
+            if self.tiers is not None and pending is not None:
+                # the totals of the interval just ended pick the tier of the next
+                pending[0].communicate()
+                self.tiers.update(*self.unc_bw(pending[2]))
+            nxt = None
+            if elapsed < m_time:
+                # tasks stopped, stop monitoring them
+                pids[:] = self.live_targets(pids)
+                if pids:
+                    d = buffers[1] if pending is not None and pending[2] == buffers[0] else buffers[0]
+                    full = self.tiers is None or self.tiers.next()
+                    c = self.collect_cmd(cmd, pids, d)
+                    if not full:
+                        # no per-thread perf, IMC and system wide counts only
+                        c = c[:1] + ["--only", "shared"] + c[1:]
+                    nxt = (subprocess.Popen(c, stderr=self.fnull), list(pids), d, started, full)
+                elapsed += interval
+
+            if pending is not None:
+                proc, p, d, t, full = pending
+                proc.communicate()
+                if self.calc_print_bw(p, d, t, full) == 0:
+                    clean_dir(d)
+                    if not self.matchers:
+                        # 'perf stat' failed means tasks stopped
+                        if nxt is not None:
+                            nxt[0].communicate()
+                        break
+            # with --match, intervals without targets wait for new ones
+            if nxt is None and (elapsed >= m_time or not self.matchers):
+                break
+            pending = nxt
+        self.clean_logs()
+        return ticker.missed
+
+    def direct_bw(self, pids, interval, m_time):
+        from membw.events import supported_cpus, get_cpu_model
+        from membw.direct import DirectCollector
+
+        cpu = get_cpu_model()
+        if cpu not in supported_cpus:
+            sys.exit("CPU not supported!")
+
+        try:
+            collector = DirectCollector(cpu, pids, self.pmem_mon)
+        except (IOError, OSError) as e:
+            sys.exit("Failed to open counters: %s" % e)
+
+        # intervals start on wall clock multiples of the interval
+        ticker = Ticker(interval)
+        started = ticker.wait()
+        collector.sample()
+        n = 0
+        while (pids or self.matchers) and n * interval < m_time:
+            n += 1
+            now = ticker.wait()
+            s = collector.sample()
+            if s is None:
+                if not self.matchers:
+                    break
+                started = now
+                pids[:] = self.live_targets(pids)
+                continue
+            elapsed, task, system, unc = s
+            self.report_counts(pids == [-1], time.strftime("%H:%M:%S", time.localtime(started)), elapsed, elapsed,\
+                    task, system, unc, started)
+            started = now
+            # tasks stopped, stop monitoring them
+            pids[:] = self.live_targets(pids)
+
+        collector.close()
+
+    def resctrl_bw(self, pids, interval, m_time):
+        from membw.resctrl import MBMCollector, domain_id
+
+        try:
+            collector = MBMCollector(pids, self.cgroup_mon, cgroup_root=self.cgroup_root)
+        except (IOError, OSError) as e:
+            sys.exit("Failed to set up resctrl monitoring: %s" % e)
+        # monitoring groups made for us must not outlive the run
+        atexit.register(collector.close)
+
+        if pids == [-1]:
+            label = lambda k: ("-", k)
+        else:
+            label = lambda k: self.task_label(False, k)
+
+        ticker = Ticker(interval)
+        started = ticker.wait()
+        collector.sample()
+        n = 0
+        while (pids or self.matchers) and n * interval < m_time:
+            n += 1
+            now = ticker.wait()
+            elapsed, groups, system = collector.sample()
+            ts = started
+            start_time = time.strftime("%H:%M:%S", time.localtime(started))
+            started = now
+            if elapsed <= 0.0:
+                continue
+            if self.history is not None:
+                self.history.next()
+            # MBM can't tell reads from writes so all of it goes to read
+            totals = {}
+            for dom, t in system.items():
+                totals[domain_id(dom)] = (float(t) / (1024*1024) / elapsed, 0.0, 0.0, 0.0, 0)
+
+            if self.socket_split:
+                # an L3 domain is a socket, every group counts per domain
+                ids = []
+                lines = []
+                for k, doms in groups.items():
+                    for dom, t in doms.items():
+                        ids.append("%s@%d" % (k, domain_id(dom)))
+                        lines.append(t / 64.0)
+                rows, listed = self.split_sockets(start_time, elapsed, compute.columns(ids, lines), totals, label)
+            else:
+                # per-domain counts add up to the group's traffic
+                ids = list(groups)
+                lines = [sum(groups[k].values()) / 64.0 for k in ids]
+                t = sum_totals(totals.values())
+                rows, listed = self.report_table(start_time, elapsed, compute.columns(ids, lines), t[:4], 0, label)
+            summary = self.socket_summary(totals) if self.per_socket else []
+            if self.history is not None:
+                summary.extend(self.history_summary(totals if self.per_socket\
+                        else {None: sum_totals(totals.values())}))
+            self.show(start_time, rows, listed, summary, None, ts, totals)
+
+            if pids != [-1]:
+                # tasks stopped, stop monitoring them, new ones get a group
+                pids[:] = self.live_targets(pids)
+                for k in [str(p) for p in pids if str(p) not in collector.groups]:
+                    try:
+                        collector.add(k)
+                    except (IOError, OSError):
+                        continue
+
+        collector.close()
+
+    def replay_bw(self, rec, start, end):
+        # labels and groups come from the task identities in the recording
+        self.tasks = rec.tasks
+        for iv in rec.intervals(start, end):
+            self.report_counts(self.pids == [-1], time.strftime("%H:%M:%S", time.localtime(iv.ts)), iv.task_time,\
+                    iv.imc_time, iv.task, iv.system, iv.unc, iv.ts)
+        rec.close()
+
+    def stream_bw(self, cmd, pids, interval):
+        quiet = min(0.25, interval / 4.0)
+
+        # a stale FIFO left over by an earlier run would never be written to
+        self.clean_logs()
+
+        # perf -I counts from its start, children starting on wall clock
+        # multiples of the interval have their intervals line up
+        ticker = Ticker(interval)
+        base = ticker.wait()
+        sup = Supervisor(self, cmd, interval)
+        sup.start_shared(base)
+        if pids:
+            sup.add_batch(pids, base)
+
+        while True:
+            sup.poll(min(quiet, ticker.timeout()), quiet)
+            finished = sup.shared.finished()
+            for index, task, length, system, unc in sup.ready(finished):
+                start = (index - 1) * float(interval)
+                self.report_counts(pids == [-1], time.strftime("%H:%M:%S", time.localtime(start)), length, length,\
+                        task, system, unc, start)
+            sup.reap()
+            if finished or (not sup.batches and not self.matchers):
+                break
+
+            base = ticker.due()
+            if base is not None:
+                # tasks stopped, stop monitoring them, new matches get a batch
+                pids[:] = self.live_targets(pids)
+                covered = sup.covered()
+                new = [p for p in pids if p not in covered]
+                if new:
+                    sup.add_batch(new, base)
+
+        sup.close()
+        self.clean_logs()
+
+    def task_label(self, all_tasks, k):
+        # (TaskPID, TaskName) of a per-task row, None if the task is gone
+        if self.cgroup_mon:
+            # keep the leaf end of long paths, it's what tells cgroups apart,
+            # records and metrics get them whole so they stay apart there
+            return "-", k if len(k) <= 20 or self.publishers else ".." + k[-18:]
+        if all_tasks:
+            # when "perf stat -a --per-thread..", k looks like "python2-47361",
+            # need to extract pid out from the string, comm may contain '-' too
+            task_name, _, task_pid = k.rpartition('-')
+            return task_pid, task_name
+
+        # targets were revalidated for this interval, it's a cache hit
+        info = self.tasks.lookup(int(k))
+        if info is None or not info.alive:
+            # the task is gone, do not print for it
+            return None
+        return k, info.comm
+
+    def group_of(self, k, found):
+        # --by group of a "comm-tid" row, found has the threads revalidated
+        # for this interval, an exited one keeps the identity it was last
+        # seen with and makes its own process if it never was
+        comm, _, tid = k.rpartition('-')
+        if self.group_by == "command":
+            return comm
+        tid = int(tid)
+        info = found.get(tid) or self.tasks.cached(tid)
+        if self.group_by == "process":
+            return info.tgid if info is not None else tid
+        return info.uid if info is not None else -1
+
+    def group_label(self, g, found):
+        if self.group_by == "process":
+            # a reused PID doesn't lend its comm to the process that had it
+            info = found.get(g)
+            if info is None:
+                info = self.tasks.refresh([g]).get(g) or self.tasks.cached(g)
+            return str(g), info.comm if info is not None else ""
+        if self.group_by == "user":
+            if g not in self.user_names:
+                try:
+                    self.user_names[g] = pwd.getpwuid(g).pw_name
+                except KeyError:
+                    self.user_names[g] = str(g)
+            return str(g), self.user_names[g]
+        return "-", g
+
+    def report_bw(self, start_time, bw, label, dram_read_bw, dram_write_bw, pmem_read_bw, pmem_write_bw,\
+            drill=None, socket=""):
+        # drill is (thread TaskBW, group of every thread) for --drill
+        n = self.top
+        if self.view is not None:
+            # never format more rows than fit on the screen
+            n = min(n, self.view.rows()) if n else self.view.rows()
+            n = max(n, 1)
+        key = SORT_KEYS[self.sort_by]
+        if self.history is not None:
+            # listed tasks only, the others had next to nothing to add
+            col = getattr(bw, key)
+            for i in bw.listed:
+                self.history.add((socket, bw.ids[i]), col[i])
+
+        rows = []
+        for i in bw.order(key, n):
+            l = label(bw.ids[i])
+            if l is None:
+                continue
+            rows.append(self.bw_cells(start_time, dram_read_bw, dram_write_bw, pmem_read_bw, pmem_write_bw,\
+                    l[0], l[1], bw.read_bw[i], bw.read_share[i] * 100.0,\
+                    bw.write_bw[i], bw.write_share[i] * 100.0, bw.pmem_read_bw[i],\
+                    bw.pmem_read_share[i] * 100.0, bw.pmem_write_bw[i], bw.pmem_write_share[i] * 100.0, socket,\
+                    self.history.stats((socket, bw.ids[i])) if self.history is not None else None))
+
+            if drill is None or (l[0] not in self.drill_keys and l[1] not in self.drill_keys):
+                continue
+            threads, inv = drill
+            for j in threads.order(key, n, compute.members(inv, i)):
+                task_pid, task_name = self.task_label(True, threads.ids[j])
+                rows.append(self.bw_cells(start_time, dram_read_bw, dram_write_bw, pmem_read_bw, pmem_write_bw,\
+                        task_pid, "`-" + task_name, threads.read_bw[j], threads.read_share[j] * 100.0,\
+                        threads.write_bw[j], threads.write_share[j] * 100.0, threads.pmem_read_bw[j],\
+                        threads.pmem_read_share[j] * 100.0, threads.pmem_write_bw[j],\
+                        threads.pmem_write_share[j] * 100.0))
+
+        return rows
+
+    def show(self, start_time, rows, listed, summary=None, detail=None, ts=None, totals=None):
+        # summary lines go to the status line of the live view as well,
+        # detail lines only to the text output, ts and totals are for sinks
+        summary = summary if summary else []
+        if self.publishers:
+            for p in self.publishers:
+                p.write(ts if ts is not None else time.time(), totals if totals else {}, rows,\
+                        (detail if detail else []) + summary)
+            return
+        if self.view is not None:
+            self.view.update("%s  %d of %d %ss listed, by %s, Ctrl-C to quit  %s"\
+                    % (start_time, len(rows), listed, "cgroup" if self.cgroup_mon else\
+                    "task" if self.group_by == "thread" else self.group_by,\
+                    self.sort_by, ", ".join(summary)), self.header_cells(), rows)
+            return
+        out = ["%8s %s\n" % (start_time, l) for l in (detail if detail else []) + summary]\
+                + ["".join(r) + "\n" for r in rows]
+        if out:
+            sys.stdout.write("".join(out))
+            sys.stdout.flush()
+
+    def kind_cols(self):
+        # the bandwidths printed, indices into imc.KINDS
+        return [i for i, on in enumerate((self.dram_mon, self.dram_mon, self.pmem_mon, self.pmem_mon)) if on]
+
+    def socket_summary(self, totals):
+        return ["Socket%d %s" % (sk, " ".join(["%sBW %.1f MiB/s" % (imc.KINDS[i], totals[sk][i])\
+                for i in self.kind_cols()])) for sk in sorted(totals)]
+
+    def history_summary(self, totals):
+        # the --sort bandwidth of the IMC totals over the --history window
+        i = SORT_TOTALS.index(self.sort_by)
+        lines = []
+        for sk in sorted(totals):
+            self.history.add((sk,), totals[sk][i])
+            st = self.history.stats((sk,))
+            lines.append("%s%sBW %s MiB/s" % ("Socket%d " % sk if sk is not None else "", imc.KINDS[i],\
+                    " ".join(["%s %.1f" % (h.lower(), v) for h, v in zip(HISTORY_COLS, st)])))
+        return lines
+
+    def channel_report(self, unc, imc_time):
+        # a line per channel, and the imbalance and hot channels of every socket
+        bw = imc.channel_bw(unc, imc_time, self.sockets)
+        result = self.channel_mon.update(bw)
+        detail = []
+        for ch in sorted(bw):
+            detail.append("Socket%d IMC%-2d %s%s" % (ch[0], ch[1],\
+                    " ".join(["%sBW %.1f MiB/s" % (imc.KINDS[i], bw[ch][i]) for i in self.kind_cols()]),\
+                    " HOT" if self.channel_mon.hot(ch) else ""))
+
+        summary = []
+        for sk in sorted(result):
+            m = ["%s max/mean %.2f cv %.2f" % (imc.KINDS[i], result[sk][i][0], result[sk][i][1])\
+                    for i in self.kind_cols() if result[sk][i] is not None]
+            hot = ["IMC%d" % ch[1] for ch in sorted(bw) if ch[0] == sk and self.channel_mon.hot(ch)]
+            summary.append("Socket%d imbalance %s%s" % (sk, ", ".join(m) if m else "idle",\
+                    ", hot " + ",".join(hot) if hot else ""))
+        return detail, summary
+
+    def print_channels(self):
+        if not self.channel_mon.n:
+            return
+        print("")
+        print("Channel means over %d intervals:" % self.channel_mon.n)
+        for ch in self.channel_mon.channels():
+            m = self.channel_mon.mean(ch)
+            hot = self.channel_mon.hot_count.get(ch, 0)
+            print("    Socket%d IMC%-2d %s%s" % (ch[0], ch[1],\
+                    " ".join(["%sBW %.1f MiB/s" % (imc.KINDS[i], m[i]) for i in self.kind_cols()]),\
+                    ", hot in %d" % hot if hot else ""))
+
+    def split_sockets(self, start_time, task_time, table, totals, label):
+        # "target@socket" rows, every socket reported against its own totals
+        by_socket = {}
+        for i, k in enumerate(table.ids):
+            base, _, sk = k.rpartition("@")
+            r = by_socket.setdefault(int(sk), ([], []))
+            r[0].append(i)
+            r[1].append(base)
+
+        rows = []
+        listed = 0
+        for sk in sorted(totals):
+            r, ids = by_socket.get(sk, ([], []))
+            t = totals[sk]
+            srows, slisted = self.report_table(start_time, task_time, compute.take(table, r, ids), t[:4], t[4],\
+                    label, sk)
+            rows.extend(srows)
+            listed += slisted
+        return rows, listed
+
+    def report_counts(self, all_tasks, start_time, task_time, imc_time, task, system, unc, ts=None,\
+            attributed=True):
+        # task keys are "comm-tid" for all tasks, target PIDs otherwise and
+        # None for threads not belonging to any target, ts is the interval start,
+        # an interval not attributed has the totals only
+        if task_time <= 0.0 or imc_time <= 0.0:
+            return
+        if ts is None:
+            ts = time.time() - task_time
+        if self.recorder is not None:
+            self.recorder.write(ts, task_time, imc_time, task, system, unc)
+        if self.history is not None:
+            self.history.next()
+        label = lambda k: self.task_label(all_tasks, k)
+
+        totals = imc.totals(system, unc, imc_time, self.sockets if self.per_socket else None)
+        if not attributed:
+            rows, listed = [], 0
+        elif self.socket_split:
+            # "target@CPUn" keys, the task is split by the socket it ran on
+            keys = []
+            for k in task.keys:
+                base, _, cpu = k.rpartition("@")
+                keys.append("%s@%d" % (base, topology.socket_of(cpu, self.sockets)))
+            task.keys = keys
+            rows, listed = self.split_sockets(start_time, task_time, compute.pivot(task), totals, label)
+        else:
+            t = sum_totals(totals.values())
+            rows, listed = self.report_table(start_time, task_time, compute.pivot(task), t[:4], t[4], label)
+
+        summary = self.socket_summary(totals) if self.per_socket else []
+        if not attributed:
+            t = sum_totals(totals.values())
+            summary.insert(0, "%s, no per-task counts" % " ".join(["%sBW %.1f MiB/s" % (imc.KINDS[i], t[i])\
+                    for i in self.kind_cols()]))
+        if self.history is not None:
+            summary.extend(self.history_summary(totals if self.per_socket\
+                    else {None: sum_totals(totals.values())}))
+        coverage = min(task.coverage(), system.coverage(), unc.coverage())
+        if coverage < MIN_COVERAGE:
+            summary.append("counters multiplexed, running %.0f%% of the time, counts scaled up" % (coverage * 100))
+        detail = None
+        if self.channel_mon is not None:
+            detail, imbalance = self.channel_report(unc, imc_time)
+            summary.extend(imbalance)
+        self.show(start_time, rows, listed, summary, detail, ts, totals)
+
+    def throttle(self, start_time, bw):
+        # MBA acts on all DRAM traffic of a target, reads and writes alike
+        measured = {}
+        for i, k in enumerate(bw.ids):
+            if k is not None:
+                measured[k] = bw.read_bw[i] + bw.write_bw[i]
+        actions = self.controller.update(measured)
+        if actions and self.view is None:
+            sys.stdout.write("".join(["%8s %s%s\n" % (start_time, "[dry-run] " if self.dry_run else "", a)\
+                    for a in actions]))
+            sys.stdout.flush()
+
+    def report_table(self, start_time, task_time, table, totals, system_stores, label, socket=""):
+        # totals are the DRAM read/write and PMEM read/write bandwidths(MiB/s),
+        # return the formatted rows and how many passed the threshold
+        if self.group_by == "thread":
+            bw = compute.task_bw(table, task_time, *(totals + (system_stores,)))
+            rows = self.report_bw(start_time, bw, label, *totals, socket=socket)
+            if self.controller is not None:
+                self.throttle(start_time, bw)
+            return rows, len(bw.listed)
+
+        # threads of the interval revalidated in one go, like the targets are
+        found = self.tasks.refresh([int(k.rpartition('-')[2]) for k in table.ids])\
+                if self.group_by != "command" else {}
+        # one hash reduction over the threads, they are only kept for --drill
+        groups, inv = compute.aggregate(table, [self.group_of(k, found) for k in table.ids])
+        bw = compute.task_bw(groups, task_time, *(totals + (system_stores,)))
+        drill = None
+        if self.drill_keys:
+            drill = (compute.task_bw(table, task_time, *(totals + (system_stores,))), inv)
+        label = lambda g: self.group_label(g, found)
+        return self.report_bw(start_time, bw, label, *(totals + (drill,))), len(bw.listed)
+
+    def header_cells(self):
+        h = ["%8s" % "Time"]
+        if self.dram_mon:
+            h.append("%16s" % "DramReadBW")
+            h.append("%16s" % "DramWriteBW")
+        if self.pmem_mon:
+            h.append("%16s" % "PmemReadBW")
+            h.append("%16s" % "PmemWriteBW")
+        if self.socket_split:
+            h.append("%7s" % "Socket")
+        h.append("%8s" % "TaskPID")
+        h.append("%21s" % "TaskName")
+        if self.dram_mon:
+            h.append("%15s" % "TaskDramReadBW")
+            h.append("%12s" % "DramReadBW%")
+            h.append("%17s" % "*TaskDramWriteBW")
+            h.append("%14s" % "*DramWriteBW%")
+        if self.pmem_mon:
+            h.append("%15s" % "TaskPmemReadBW")
+            h.append("%12s" % "PmemReadBW%")
+            h.append("%17s" % "*TaskPmemWriteBW")
+            h.append("%14s" % "*PmemWriteBW%")
+        if self.history is not None:
+            h.extend(["%10s" % c for c in HISTORY_COLS])
+        return h
+
+    def print_header(self):
+        sys.stdout.write("\n" + "".join(self.header_cells()) + "\n")
+        sys.stdout.flush()
+
+    def bw_cells(self, time, dram_r, dram_w, pmem_r, pmem_w, t_pid, t_name, t_r, t_r_perc,\
+            t_w, t_w_perc, t_pmem_r_bw, t_pmem_r_bw_perc, t_pmem_w_bw, t_pmem_w_bw_perc, socket="", stats=None):
+        if self.publishers:
+            return Row(None if socket == "" else socket, t_pid, t_name, (t_r, t_r_perc, t_w, t_w_perc,\
+                    t_pmem_r_bw, t_pmem_r_bw_perc, t_pmem_w_bw, t_pmem_w_bw_perc), stats)
+        c = ["%8s" % time]
+        if self.dram_mon:
+            c.append("%10.1f MiB/s" % dram_r)
+            c.append("%10.1f MiB/s" % dram_w)
+        if self.pmem_mon:
+            c.append("%10.1f MiB/s" % pmem_r)
+            c.append("%10.1f MiB/s" % pmem_w)
+        if self.socket_split:
+            c.append("%7s" % socket)
+        c.append("%8s" % t_pid)
+        c.append("%21s" % t_name)
+        if self.dram_mon:
+            c.append("%9.1f MiB/s" % t_r)
+            c.append("%11.1f%%" % t_r_perc)
+            c.append("%11.1f MiB/s" % t_w)
+            c.append("%13.1f%%" % t_w_perc)
+        if self.pmem_mon:
+            c.append("%9.1f MiB/s" % t_pmem_r_bw)
+            c.append("%11.1f%%" % t_pmem_r_bw_perc)
+            c.append("%9.1f MiB/s" % t_pmem_w_bw)
+            c.append("%11.1f%%" % t_pmem_w_bw_perc)
+        if self.history is not None:
+            c.extend(["%10.1f" % v for v in stats] if stats else ["%10s" % "-"] * len(HISTORY_COLS))
+        return c
+
+    def run(self):
+        """Monitor or replay as the options say, until done"""
+        args = self.args
+        if args.recording is not None:
+            self.replay_bw(args.recording, args.start, args.end)
+        else:
+            self.pids = self.live_targets(self.pids)
+            if not self.pids and not self.matchers:
+                if self.view is not None:
+                    self.view.close()
+                sys.exit("The targets have all exited, nothing to monitor.")
+            if args.direct:
+                self.direct_bw(self.pids, args.interval, args.m_time)
+            elif args.resctrl:
+                self.resctrl_bw(self.pids, args.interval, args.m_time)
+            elif args.stream:
+                self.stream_bw(args.cmd, self.pids, args.interval)
+            else:
+                missed = self.snapshot_bw(args.cmd, self.pids, args.interval, args.m_time)
+                if missed:
+                    print("Reporting fell behind, %d interval(s) skipped." % missed)
+                if self.tiers is not None:
+                    print("Per-task counts in %d of %d intervals." % (self.tiers.full, self.tiers.n))
+
+        if self.view is not None:
+            self.view.close()
+        if self.channel_mon is not None:
+            self.print_channels()
+        print("Done!")
+
+    def interrupted(self, sig, frame):
+        self.clean_logs()
+        if self.view is not None:
+            self.view.close()
+        print("")
+        exit("Monitoring interrupted by SIGINT or user CTRL-C. Logs cleared.")
+
+def main():
+    """Run bw-report.py with the command line arguments"""
+    r = Reporter(parse_args())
+    signal(SIGINT, r.interrupted)
+    r.run()
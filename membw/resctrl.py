@@ -0,0 +1,186 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Memory bandwidth from resctrl MBM counters, no perf involved"""
+
+import os
+import time
+
+from membw import cgroup
+
+RESCTRL = "/sys/fs/resctrl"
+
+# prefix of the monitoring groups made by us, removed again on close()
+GROUP_PREFIX = "membw-"
+
+def read_counter(path):
+    # "Unavailable" is reported while the RMID isn't counting yet
+    try:
+        with open(path) as f:
+            return int(f.read())
+    except (IOError, OSError, ValueError):
+        return None
+
+def domains(group_dir):
+    """mon_L3_XX directories of a group, one per L3 domain(socket)"""
+    d = os.path.join(group_dir, "mon_data")
+    try:
+        return sorted([n for n in os.listdir(d) if n.startswith("mon_L3_")])
+    except OSError:
+        return []
+
+def domain_id(dom):
+    # "mon_L3_01" -> 1, the L3 domain id is the socket id
+    try:
+        return int(dom[len("mon_L3_"):])
+    except ValueError:
+        return 0
+
+def mbm_delta(new, old):
+    # the kernel widens the hardware counter, it only goes back when the
+    # RMID was reset, e.g. the group was made again, it counts from 0 then
+    return new - old if new >= old else new
+
+def group_name(key):
+    return GROUP_PREFIX + key.strip("/").replace("/", "_")
+
+def target_tids(key, cgroups, proc_root="/proc", cgroup_root=None):
+    """Threads of a PID or, with cgroups, of a cgroup path"""
+    if cgroups:
+        return cgroup.threads(cgroup_root, key)
+    try:
+        return [int(t) for t in os.listdir(os.path.join(proc_root, key, "task"))]
+    except OSError:
+        return []
+
+def ctrl_groups(root):
+    """Group directories whose mon_data covers the tasks of their whole CLOSID"""
+    groups = [root]
+    try:
+        for n in sorted(os.listdir(root)):
+            d = os.path.join(root, n)
+            if n not in ("info", "mon_groups", "mon_data") and os.path.isdir(os.path.join(d, "mon_data")):
+                groups.append(d)
+    except OSError:
+        pass
+    return groups
+
+class MBMGroup(object):
+    """One monitoring group and its last mbm_total_bytes per domain
+
+    created is whether it was made here, only then remove() takes it out
+    with rmdir.
+    """
+    def __init__(self, path, created, rmdir=os.rmdir):
+        self.path = path
+        self.created = created
+        self.rmdir = rmdir
+        self.last = {}
+        self.tids = set()
+
+    def read(self):
+        """Bytes since the last read, {domain: total}"""
+        delta = {}
+        for dom in domains(self.path):
+            cur = read_counter(os.path.join(self.path, "mon_data", dom, "mbm_total_bytes"))
+            last = self.last.get(dom)
+            self.last[dom] = cur
+            if last is None:
+                continue
+            delta[dom] = mbm_delta(cur, last) if cur is not None else 0
+        return delta
+
+    def assign(self, tids):
+        # new threads inherit the group on clone, only strays need a write
+        for tid in tids:
+            if tid in self.tids:
+                continue
+            self.tids.add(tid)
+            try:
+                with open(os.path.join(self.path, "tasks"), "w") as f:
+                    f.write("%d\n" % tid)
+            except (IOError, OSError):
+                # exited, or in another control group than ours
+                continue
+
+    def remove(self):
+        if self.created:
+            try:
+                # tasks go back to the default group
+                self.rmdir(self.path)
+            except OSError:
+                pass
+            self.created = False
+
+class MBMCollector(object):
+    """Per-target MBM bytes from resctrl monitoring groups
+
+    targets are PIDs or cgroup paths, each one gets a monitoring group
+    under the default control group, an existing group of the same name
+    is attached to and left in place. targets [-1] attaches to all
+    monitoring groups that already exist. rmdir removes the groups made.
+    """
+    def __init__(self, targets, cgroups=False, root=RESCTRL, proc_root="/proc", cgroup_root=None,\
+            rmdir=os.rmdir):
+        self.root = root
+        self.rmdir = rmdir
+        self.proc_root = proc_root
+        self.cgroup_root = cgroup_root
+        self.cgroups = cgroups
+        self.groups = {}
+        self.totals = {}
+
+        if not os.path.isdir(os.path.join(root, "mon_groups")):
+            raise OSError("No resctrl monitoring, is resctrl mounted on %s?" % root)
+
+        if targets == [-1]:
+            for g in ctrl_groups(root):
+                key = "/" if g == root else os.path.basename(g)
+                self.groups[key] = MBMGroup(g, False)
+                for n in sorted(os.listdir(os.path.join(g, "mon_groups"))):
+                    p = os.path.join(g, "mon_groups", n)
+                    self.groups[n if g == root else key + "/" + n] = MBMGroup(p, False)
+        else:
+            for t in targets:
+                self.add(str(t))
+
+        for g in ctrl_groups(root):
+            self.totals[g] = MBMGroup(g, False)
+        self.last = time.time()
+        self.sample()
+
+    def add(self, key):
+        path = os.path.join(self.root, "mon_groups", group_name(key))
+        created = False
+        if not os.path.isdir(path):
+            os.mkdir(path)
+            created = True
+        g = self.groups[key] = MBMGroup(path, created, self.rmdir)
+        g.assign(self.tids(key))
+
+    def tids(self, key):
+        return target_tids(key, self.cgroups, self.proc_root, self.cgroup_root)
+
+    def sample(self):
+        """(elapsed, {key: {domain: total bytes}}, {domain: total bytes})
+
+        The last one sums every control group, i.e. all tasks on the system.
+        """
+        now = time.time()
+        elapsed = now - self.last
+        self.last = now
+
+        per_group = {}
+        for key, g in self.groups.items():
+            if g.created:
+                g.assign(self.tids(key))
+            per_group[key] = g.read()
+
+        system = {}
+        for g in self.totals.values():
+            for dom, total in g.read().items():
+                system[dom] = system.get(dom, 0) + total
+        return elapsed, per_group, system
+
+    def close(self):
+        for g in self.groups.values():
+            g.remove()
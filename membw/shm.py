@@ -0,0 +1,232 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Per-interval snapshots in a seqlock ring in shared memory, one writer and any number of readers
+
+    from membw.shm import RingReader
+    ring = RingReader("membw")
+    snap = ring.latest()
+    print(snap.ts, snap.totals, [(r.pid, r.comm, r.values[0]) for r in snap.rows])
+
+The file starts with HEADER, published is the number of snapshots
+written so far. Snapshot n is in slot n % slots, a slot is SLOT_HEAD,
+then max_sockets + 1 TOTAL records and max_rows ROW records. The slot
+seq is odd while the slot is written and 2 * the times it was written
+once it's done, a reader retries when it changed under it. Only this
+module and the standard library are needed to read it.
+"""
+
+import os
+import mmap
+import time
+import struct
+
+from membw.sink import Row
+
+SHM_DIR = "/dev/shm"
+
+MAGIC = b"MEMBWSHM"
+VERSION = 1
+
+DEFAULT_SLOTS = 64
+DEFAULT_ROWS = 256
+MAX_SOCKETS = 8
+
+# magic, version, max_sockets, slots, slot size, max_rows, published
+HEADER = struct.Struct("<8sHHIIIQ")
+HEADER_SIZE = 64
+PUBLISHED = struct.Struct("<Q")
+PUBLISHED_OFF = 24
+
+# seq, ts, rows in the slot, rows listed, totals in the slot
+SLOT_HEAD = struct.Struct("<QdIIH6x")
+SEQ = struct.Struct("<Q")
+# socket(-1 for all), DRAM read, DRAM write, PMEM read, PMEM write MiB/s
+TOTAL = struct.Struct("<h6x4d")
+# socket and pid are -1 if none, comm is cut to COMM_LEN bytes, values as
+# in sink.ROW_FIELDS
+COMM_LEN = 32
+ROW = struct.Struct("<h6xq%ds8d" % COMM_LEN)
+
+# reads of a slot given up on while the writer keeps changing it
+RETRIES = 100
+
+def shm_path(name):
+    """Path of a ring, a bare name is under /dev/shm"""
+    return name if "/" in name else os.path.join(SHM_DIR, name)
+
+def slot_size(max_sockets, max_rows):
+    return SLOT_HEAD.size + (max_sockets + 1) * TOTAL.size + max_rows * ROW.size
+
+class Snapshot(object):
+    """One interval of the ring
+
+    n is its index, totals {socket: (DRAM read, DRAM write, PMEM read,
+    PMEM write MiB/s)} with socket None unless split by socket, rows the
+    sink Rows and listed how many there were before the ring's max_rows.
+    """
+    __slots__ = ("n", "ts", "totals", "rows", "listed")
+
+    def __init__(self, n, ts, totals, rows, listed):
+        self.n = n
+        self.ts = ts
+        self.totals = totals
+        self.rows = rows
+        self.listed = listed
+
+    def __repr__(self):
+        return "Snapshot(%d, %.3f, %d totals, %d of %d rows)" % (self.n, self.ts, len(self.totals),\
+                len(self.rows), self.listed)
+
+class Ring(object):
+    """Writer end, with the same write() as a sink
+
+    The file is set up under a temporary name and renamed into place,
+    a reader never sees it half made. It's removed by close().
+    """
+    def __init__(self, name, slots=DEFAULT_SLOTS, max_rows=DEFAULT_ROWS, max_sockets=MAX_SOCKETS):
+        self.path = shm_path(name)
+        self.slots = slots
+        self.max_rows = max_rows
+        self.max_sockets = max_sockets
+        self.slot_size = slot_size(max_sockets, max_rows)
+        self.published = 0
+        size = HEADER_SIZE + slots * self.slot_size
+        tmp = "%s.%d.tmp" % (self.path, os.getpid())
+        fd = os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, max_sockets, slots, self.slot_size, max_rows, 0)
+        os.rename(tmp, self.path)
+
+    def write(self, ts, totals, rows, notes=()):
+        """One interval, totals as {socket: (DRAM read, DRAM write, PMEM read, PMEM write MiB/s, ...)}"""
+        off = HEADER_SIZE + (self.published % self.slots) * self.slot_size
+        seq = SEQ.unpack_from(self.map, off)[0]
+        SEQ.pack_into(self.map, off, seq + 1)
+
+        totals = sorted(totals.items(), key=lambda x: -1 if x[0] is None else x[0])[:self.max_sockets + 1]
+        kept = rows[:self.max_rows]
+        SLOT_HEAD.pack_into(self.map, off, seq + 1, ts, len(kept), len(rows), len(totals))
+        p = off + SLOT_HEAD.size
+        for sk, t in totals:
+            TOTAL.pack_into(self.map, p, -1 if sk is None else sk, *t[:4])
+            p += TOTAL.size
+        p = off + SLOT_HEAD.size + (self.max_sockets + 1) * TOTAL.size
+        for r in kept:
+            s = str(r.pid)
+            ROW.pack_into(self.map, p, -1 if r.socket is None else r.socket, int(s) if s.isdigit() else -1,\
+                    r.comm.encode("utf-8")[:COMM_LEN], *r.values)
+            p += ROW.size
+
+        SEQ.pack_into(self.map, off, seq + 2)
+        self.published += 1
+        PUBLISHED.pack_into(self.map, PUBLISHED_OFF, self.published)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+class RingReader(object):
+    """Reader end, maps the ring read-only and never writes to it
+
+    Snapshots are unpacked straight from the mapping, with no lock and
+    no copy of the slot. Raises IOError/OSError if there's no ring and
+    ValueError if it isn't one.
+    """
+    def __init__(self, name):
+        self.path = shm_path(name)
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            self.ino = os.fstat(fd).st_ino
+            size = os.fstat(fd).st_size
+            if size < HEADER_SIZE:
+                raise ValueError("%s isn't a membw ring" % self.path)
+            self.map = mmap.mmap(fd, size, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        magic, version, self.max_sockets, self.slots, self.slot_size, self.max_rows, _\
+                = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError("%s isn't a membw ring of version %d" % (self.path, VERSION))
+
+    def published(self):
+        """Number of snapshots written so far"""
+        return PUBLISHED.unpack_from(self.map, PUBLISHED_OFF)[0]
+
+    def read(self, n):
+        """Snapshot n, None if it's been overwritten or not written yet"""
+        off = HEADER_SIZE + (n % self.slots) * self.slot_size
+        # the seq the slot has once snapshot n is in it
+        done = 2 * (n // self.slots + 1)
+        for _ in range(RETRIES):
+            seq = SEQ.unpack_from(self.map, off)[0]
+            if seq > done or seq < done - 1:
+                return None
+            if seq & 1:
+                self.backoff()
+                continue
+            snap = self.unpack(n, off)
+            if SEQ.unpack_from(self.map, off)[0] == seq:
+                return snap
+        return None
+
+    def backoff(self):
+        # the slot is being written, let the writer get on with it
+        time.sleep(0)
+
+    def unpack(self, n, off):
+        _, ts, n_rows, listed, n_totals = SLOT_HEAD.unpack_from(self.map, off)
+        totals = {}
+        p = off + SLOT_HEAD.size
+        for _ in range(min(n_totals, self.max_sockets + 1)):
+            v = TOTAL.unpack_from(self.map, p)
+            totals[None if v[0] < 0 else v[0]] = v[1:]
+            p += TOTAL.size
+        rows = []
+        p = off + SLOT_HEAD.size + (self.max_sockets + 1) * TOTAL.size
+        for _ in range(min(n_rows, self.max_rows)):
+            v = ROW.unpack_from(self.map, p)
+            rows.append(Row(None if v[0] < 0 else v[0], "-" if v[1] < 0 else v[1],\
+                    v[2].rstrip(b"\0").decode("utf-8", "replace"), v[3:]))
+            p += ROW.size
+        return Snapshot(n, ts, totals, rows, listed)
+
+    def latest(self):
+        """The last snapshot written, None if there's none"""
+        n = self.published()
+        while n > 0:
+            snap = self.read(n - 1)
+            if snap is not None:
+                return snap
+            # lapped while reading, try the newer one
+            last, n = n, self.published()
+            if n == last:
+                break
+        return None
+
+    def last(self, k):
+        """Up to the last k snapshots, oldest first, those overwritten while reading are left out"""
+        n = self.published()
+        snaps = [self.read(i) for i in range(max(0, n - min(k, self.slots)), n)]
+        return [s for s in snaps if s is not None]
+
+    def replaced(self):
+        """Whether the ring was removed or made anew since it was mapped, e.g. by a restart"""
+        try:
+            return os.stat(self.path).st_ino != self.ino
+        except OSError:
+            return True
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
@@ -0,0 +1,187 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Structured per-interval output, JSON Lines, CSV or length-prefixed binary records"""
+
+import os
+import json
+import struct
+
+FORMATS = ("jsonl", "csv", "binary")
+
+TOTAL_FIELDS = ("dram_read", "dram_write", "pmem_read", "pmem_write")
+
+# MiB/s and percent of the IMC total, in the order of the report columns
+ROW_FIELDS = ("dram_read", "dram_read_pct", "dram_write", "dram_write_pct",\
+        "pmem_read", "pmem_read_pct", "pmem_write", "pmem_write_pct")
+
+CSV_HEADER = ",".join(("ts",) + tuple(["total_" + f for f in TOTAL_FIELDS]) + ("socket", "pid", "comm")\
+        + ROW_FIELDS) + "\n"
+
+# a binary file starts with MAGIC and the version, then every interval is
+# a record: u32 length, then ts, #totals and #rows, the totals as socket
+# and 4 doubles, the rows as socket, pid, comm and 8 doubles, socket and
+# pid are -1 if none
+BINARY_MAGIC = b"MEMBWOUT"
+BINARY_VERSION = 1
+REC_LEN = struct.Struct("<I")
+REC_HEAD = struct.Struct("<dHI")
+REC_TOTAL = struct.Struct("<h4d")
+REC_ROW = struct.Struct("<hqH")
+REC_VALUES = struct.Struct("<8d")
+
+class Row(object):
+    """One task row of an interval, socket None unless split by socket"""
+    __slots__ = ("socket", "pid", "comm", "values", "stats")
+
+    def __init__(self, socket, pid, comm, values, stats=None):
+        self.socket = socket
+        self.pid = pid
+        self.comm = comm
+        self.values = values
+        self.stats = stats
+
+def pid_of(pid):
+    # TaskPID is "-" for cgroups and groups
+    s = str(pid)
+    return int(s) if s.isdigit() else None
+
+def rounded(fields, values):
+    return dict(zip(fields, [round(v, 3) for v in values]))
+
+def overall(totals):
+    t = [0.0, 0.0, 0.0, 0.0]
+    for v in totals.values():
+        t = [a + b for a, b in zip(t, v[:4])]
+    return t
+
+def encode_jsonl(ts, totals, rows, notes):
+    d = {"ts": round(ts, 3), "totals": rounded(TOTAL_FIELDS, overall(totals))}
+    if [sk for sk in totals if sk is not None]:
+        d["sockets"] = dict((str(sk), rounded(TOTAL_FIELDS, t[:4])) for sk, t in totals.items())
+    tasks = []
+    for r in rows:
+        t = rounded(ROW_FIELDS, r.values)
+        t["pid"] = pid_of(r.pid)
+        t["comm"] = r.comm
+        if r.socket is not None:
+            t["socket"] = r.socket
+        if r.stats is not None:
+            t["history"] = [round(v, 3) for v in r.stats]
+        tasks.append(t)
+    d["tasks"] = tasks
+    if notes:
+        d["notes"] = list(notes)
+    return (json.dumps(d, sort_keys=True, separators=(",", ":")) + "\n").encode("utf-8")
+
+def csv_field(s):
+    if [c for c in ',"\n' if c in s]:
+        return '"%s"' % s.replace('"', '""')
+    return s
+
+def encode_csv(ts, totals, rows, notes):
+    # a line per row with the totals it's a share of, just the totals
+    # if no task is listed
+    all_totals = overall(totals)
+    lines = []
+    for r in rows:
+        t = totals[r.socket][:4] if r.socket in totals else all_totals
+        pid = pid_of(r.pid)
+        lines.append("%.3f,%s,%s,%s,%s,%s\n" % (ts, ",".join(["%.3f" % v for v in t]),\
+                "" if r.socket is None else r.socket, "" if pid is None else pid, csv_field(r.comm),\
+                ",".join(["%.3f" % v for v in r.values])))
+    if not lines:
+        lines.append("%.3f,%s,,,%s\n" % (ts, ",".join(["%.3f" % v for v in all_totals]), "," * len(ROW_FIELDS)))
+    return "".join(lines).encode("utf-8")
+
+def encode_binary(ts, totals, rows, notes):
+    parts = [REC_HEAD.pack(ts, len(totals), len(rows))]
+    for sk, t in sorted(totals.items(), key=lambda x: -1 if x[0] is None else x[0]):
+        parts.append(REC_TOTAL.pack(-1 if sk is None else sk, *t[:4]))
+    for r in rows:
+        comm = r.comm.encode("utf-8")[:0xffff]
+        pid = pid_of(r.pid)
+        parts.append(REC_ROW.pack(-1 if r.socket is None else r.socket, -1 if pid is None else pid, len(comm)))
+        parts.append(comm)
+        parts.append(REC_VALUES.pack(*r.values))
+    body = b"".join(parts)
+    return REC_LEN.pack(len(body)) + body
+
+def decode_binary(body):
+    """(ts, totals, rows) of a binary record body, the part after its length"""
+    ts, n_totals, n_rows = REC_HEAD.unpack_from(body, 0)
+    p = REC_HEAD.size
+    totals = {}
+    for _ in range(n_totals):
+        v = REC_TOTAL.unpack_from(body, p)
+        totals[None if v[0] < 0 else v[0]] = v[1:]
+        p += REC_TOTAL.size
+    rows = []
+    for _ in range(n_rows):
+        socket, pid, n = REC_ROW.unpack_from(body, p)
+        p += REC_ROW.size
+        comm = body[p:p + n].decode("utf-8", "replace")
+        p += n
+        rows.append(Row(None if socket < 0 else socket, "-" if pid < 0 else pid, comm,\
+                REC_VALUES.unpack_from(body, p)))
+        p += REC_VALUES.size
+    return ts, totals, rows
+
+ENCODERS = {"jsonl": encode_jsonl, "csv": encode_csv, "binary": encode_binary}
+
+HEADERS = {"jsonl": b"", "csv": CSV_HEADER.encode("utf-8"),\
+        "binary": BINARY_MAGIC + struct.pack("<H", BINARY_VERSION)}
+
+class Sink(object):
+    """Encode every interval whole and write it with a single write(2)
+
+    fd is written to if there's no path. With max_bytes, a file about to
+    grow over it is rotated first: path.1 is the newest old file, no more
+    than keep are kept. Every file starts with the header of its format.
+    """
+    def __init__(self, fmt, path=None, fd=1, max_bytes=0, keep=5):
+        self.encode = ENCODERS[fmt]
+        self.header = HEADERS[fmt]
+        self.path = path
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.fd = fd
+        self.size = 0
+        self.open()
+
+    def open(self):
+        if self.path is not None:
+            self.fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            self.size = os.fstat(self.fd).st_size
+        if not self.size and self.header:
+            self.emit(self.header)
+
+    def rotate(self):
+        os.close(self.fd)
+        if self.keep > 0:
+            for i in range(self.keep - 1, 0, -1):
+                old = "%s.%d" % (self.path, i)
+                if os.path.exists(old):
+                    os.rename(old, "%s.%d" % (self.path, i + 1))
+            os.rename(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+        self.open()
+
+    def emit(self, data):
+        n = 0
+        while n < len(data):
+            # a pipe may take less than all of it
+            n += os.write(self.fd, data[n:])
+        self.size += len(data)
+
+    def write(self, ts, totals, rows, notes=()):
+        """One interval, totals as {socket: (DRAM read, DRAM write, PMEM read, PMEM write MiB/s, ...)}"""
+        data = self.encode(ts, totals, rows, notes)
+        if self.path is not None and self.max_bytes and self.size and self.size + len(data) > self.max_bytes:
+            self.rotate()
+        self.emit(data)
+
+    def close(self):
+        if self.path is not None and self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
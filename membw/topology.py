@@ -0,0 +1,40 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""CPU to socket mapping from sysfs"""
+
+import os
+
+from membw.perf_event import parse_cpu_list, read_file
+
+def cpu_sockets(sys_root="/sys"):
+    """{cpu: physical package id} of the online CPUs"""
+    d = os.path.join(sys_root, "devices/system/cpu")
+    sockets = {}
+    for c in parse_cpu_list(read_file(os.path.join(d, "online"))):
+        try:
+            sockets[c] = int(read_file(os.path.join(d, "cpu%d" % c, "topology/physical_package_id")))
+        except (IOError, OSError, ValueError):
+            sockets[c] = 0
+    return sockets
+
+def imc_sockets(sys_root="/sys"):
+    """{IMC box: [sockets]}, a box counts on the CPUs of its cpumask, one per socket"""
+    sockets = cpu_sockets(sys_root)
+    d = os.path.join(sys_root, "devices")
+    boxes = {}
+    for box in sorted(os.listdir(d)):
+        if not box.startswith("uncore_imc"):
+            continue
+        try:
+            cpus = parse_cpu_list(read_file(os.path.join(d, box, "cpumask")))
+        except (IOError, OSError, ValueError):
+            continue
+        boxes[box] = sorted(set([sockets.get(c, 0) for c in cpus]))
+    return boxes
+
+def socket_of(key, sockets):
+    """Socket of a perf -A "CPUn" key"""
+    try:
+        return sockets.get(int(key[3:]), 0)
+    except ValueError:
+        return 0
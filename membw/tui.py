@@ -0,0 +1,77 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Full-screen live view of the bw-report.py table"""
+
+import curses
+
+class LiveView(object):
+    """Fixed-width table redrawn in place, only changed cells are written
+
+    widths are the column widths, rows given to update() are lists of
+    already formatted cells, one per column.
+    """
+    def __init__(self, widths):
+        self.widths = widths
+        self.x = [sum(widths[:i]) for i in range(len(widths))]
+        self.shown = {}
+        self.size = None
+        self.scr = curses.initscr()
+        curses.noecho()
+        curses.cbreak()
+        try:
+            curses.curs_set(0)
+        except curses.error:
+            pass
+
+    def rows(self):
+        """Number of table rows that fit below the status and header lines"""
+        if self.scr is None:
+            return 0
+        return max(0, self.scr.getmaxyx()[0] - 2)
+
+    def put(self, y, c, text, maxx):
+        x = self.x[c]
+        w = min(self.widths[c], maxx - x)
+        if w <= 0:
+            return
+        try:
+            self.scr.addstr(y, x, text[:w].rjust(w))
+        except curses.error:
+            # writing the bottom right corner moves the cursor off screen
+            pass
+
+    def update(self, status, header, rows):
+        if self.scr is None:
+            return
+        size = self.scr.getmaxyx()
+        if size != self.size:
+            # everything moved, start over
+            self.size = size
+            self.shown = {}
+            self.scr.clear()
+        maxy, maxx = size
+
+        try:
+            self.scr.addstr(0, 0, status[:maxx - 1].ljust(maxx - 1))
+        except curses.error:
+            pass
+
+        cells = {}
+        for y, row in enumerate([header] + rows[:maxy - 2]):
+            for c, text in enumerate(row):
+                cells[(y + 1, c)] = text
+        for k, text in cells.items():
+            if self.shown.get(k) != text:
+                self.put(k[0], k[1], text, maxx)
+        for k in self.shown:
+            if k not in cells:
+                self.put(k[0], k[1], "", maxx)
+        self.shown = cells
+        self.scr.refresh()
+
+    def close(self):
+        if self.scr is not None:
+            self.scr = None
+            curses.nocbreak()
+            curses.echo()
+            curses.endwin()
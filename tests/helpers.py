@@ -0,0 +1,22 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Made-up sysfs, procfs and resctrl trees for the tests"""
+
+import os
+
+def write(path, text):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, "w") as f:
+        f.write(text + "\n")
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+def remove_group(path):
+    # rmdir of a resctrl group, it takes its files with it as the kernel does
+    for d, dirs, files in os.walk(path, topdown=False):
+        for f in files:
+            os.remove(os.path.join(d, f))
+        os.rmdir(d)
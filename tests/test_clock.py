@@ -0,0 +1,117 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Ticker deadlines and the snapshot log buffers on a made-up clock"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from membw import report
+from membw.clock import Ticker
+from membw.report import Reporter, parse_args
+
+class Clock(object):
+    """Monotonic seconds that only move when slept or told to"""
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, s):
+        self.slept.append(s)
+        self.now += s
+
+class TickerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.t = Ticker(2, align=False, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_no_drift(self):
+        self.t.wait()
+        # work between deadlines comes out of the sleep, not on top of it
+        for work in (0.5, 1.9, 0.0):
+            self.clock.now += work
+            self.t.wait()
+        self.assertEqual([round(s, 6) for s in self.clock.slept], [1.5, 0.1, 2.0])
+        self.assertEqual((self.t.n, self.t.missed), (4, 0))
+        self.assertEqual(self.clock.now, 1006.0)
+
+    def test_skip(self):
+        self.t.wait()
+        # late, but not by a whole interval, the deadline is kept
+        self.clock.now += 3.5
+        self.t.wait()
+        self.assertEqual((self.t.n, self.t.missed, self.clock.now), (2, 0, 1003.5))
+        # passed by a whole interval, it's skipped and the last one passed
+        # is taken without sleeping
+        self.clock.now += 4.0
+        self.t.wait()
+        self.assertEqual((self.t.n, self.t.missed, self.clock.now), (4, 1, 1007.5))
+        self.clock.now += 8.5
+        self.t.wait()
+        self.assertEqual((self.t.n, self.t.missed, self.clock.now), (9, 5, 1016.0))
+        self.assertEqual(self.clock.slept, [])
+
+    def test_due(self):
+        self.assertTrue(self.t.due() is not None)
+        self.assertEqual(self.t.timeout(), 2.0)
+        self.assertEqual(self.t.due(), None)
+        self.clock.now += 2.0
+        self.assertTrue(self.t.due() is not None)
+        self.assertEqual(self.clock.slept, [])
+
+class SnapshotTest(unittest.TestCase):
+    """snapshot_bw with every bw-collect.py a no-op and parsing made up"""
+    def setUp(self):
+        self.d = tempfile.mkdtemp(prefix="bw-test-")
+        self.clock = Clock()
+        self.ticker = report.Ticker
+        report.Ticker = lambda interval: Ticker(interval, align=False, clock=self.clock, sleep=self.clock.sleep)
+        self.r = Reporter(parse_args(["--format", "jsonl", "--out", os.path.join(self.d, "out")]))
+        self.r.cur_dir = self.d
+        self.r.collect_cmd = self.collect_cmd
+        self.r.calc_print_bw = self.calc_print_bw
+        self.started = []
+        self.parsed = []
+        # parsing time of each interval, in intervals
+        self.parse_time = {}
+
+    def tearDown(self):
+        report.Ticker = self.ticker
+        shutil.rmtree(self.d, ignore_errors=True)
+
+    def collect_cmd(self, cmd, pids, log_dir=None):
+        self.started.append(log_dir)
+        return [sys.executable, "-c", "pass"]
+
+    def calc_print_bw(self, pids, log_dir=None, started=None, attributed=True):
+        # the one collecting now never writes where this one is parsed from
+        n = len(self.parsed)
+        if len(self.started) > n + 1:
+            self.assertNotEqual(self.started[n + 1], log_dir)
+        self.assertEqual(self.started[n], log_dir)
+        self.parsed.append(log_dir)
+        self.clock.now += self.parse_time.get(n, 0.0)
+        return 1
+
+    def test_odd_skip(self):
+        # the second interval is parsed past the next deadline and the
+        # one after, which is skipped
+        self.parse_time[1] = 2.5
+        missed = self.r.snapshot_bw(["bw-collect.py"], [-1], 1, 6)
+        self.assertEqual(missed, 1)
+        self.assertEqual(len(self.parsed), 6)
+        self.assertEqual(self.parsed, self.started)
+
+    def test_even_skip(self):
+        self.parse_time[0] = 3.5
+        self.assertEqual(self.r.snapshot_bw(["bw-collect.py"], [-1], 1, 4), 2)
+        self.assertEqual(len(self.parsed), 4)
+
+if __name__ == "__main__":
+    unittest.main()
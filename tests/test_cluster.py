@@ -0,0 +1,115 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Cluster means, and agents sending to a Server over a Unix socket"""
+
+import os
+import sys
+import time
+import socket
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from membw import agent, cluster
+from membw.sink import Row
+
+def row(pid, comm, read):
+    return Row(None, pid, comm, (read, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0))
+
+def totals(read):
+    return {None: (read, 0.0, 0.0, 0.0)}
+
+class CountingCluster(cluster.Cluster):
+    """A Cluster counting the intervals it already had"""
+    def __init__(self, window):
+        cluster.Cluster.__init__(self, window)
+        self.skipped = 0
+
+    def add(self, h, ts, totals, rows, now=None):
+        added = cluster.Cluster.add(self, h, ts, totals, rows, now)
+        self.skipped += not added
+        return added
+
+class FlakySocket(object):
+    """A socket whose first send goes out whole and still fails, as a timeout can"""
+    def __init__(self, sock):
+        self.sock = sock
+        self.failed = False
+
+    def sendall(self, data):
+        self.sock.sendall(data)
+        if not self.failed:
+            self.failed = True
+            raise socket.error("timed out")
+
+    def close(self):
+        self.sock.close()
+
+class FlakySender(agent.Sender):
+    def connect(self):
+        agent.Sender.connect(self)
+        if not hasattr(self, "flaky"):
+            self.flaky = self.sock = FlakySocket(self.sock)
+
+class ClusterTest(unittest.TestCase):
+    def setUp(self):
+        self.d = tempfile.mkdtemp(prefix="bw-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.d, ignore_errors=True)
+
+    def test_means_of_the_window_a_host_has(self):
+        c = cluster.Cluster(window=3)
+        a = c.hello("a", "1", "thread", False)
+        b = c.hello("b", "1", "thread", False)
+        c.add(a, 1.0, totals(100.0), [row("100", "app", 60.0)])
+        c.add(a, 2.0, totals(200.0), [row("100", "app", 90.0)])
+        c.add(b, 2.0, totals(30.0), [row("7", "app", 30.0)])
+        # a over its 2 intervals, b over its one
+        self.assertEqual(c.mean_totals()[0], 150.0 + 30.0)
+        self.assertEqual(c.top("command", 0), [("app", [75.0 + 30.0, 0.0, 0.0, 0.0])])
+        self.assertEqual(c.top("task", 1), [(("a", "100", "app"), [75.0, 0.0, 0.0, 0.0])])
+
+        for ts in (3.0, 4.0):
+            c.add(a, ts, totals(300.0), [])
+        # full, the oldest one falls out
+        self.assertEqual(c.mean_totals()[0], (200.0 + 300.0 + 300.0) / 3 + 30.0)
+        self.assertAlmostEqual(dict(c.top("task", 0))[("a", "100", "app")][0], 30.0)
+        c.drop("a")
+        self.assertAlmostEqual(c.mean_totals()[0], 30.0)
+        self.assertEqual(sorted(c.views["task"]), [("b", "7", "app")])
+
+    def test_resend_after_reconnect(self):
+        path = os.path.join(self.d, "cluster.sock")
+        c = CountingCluster(window=3)
+        server = cluster.Server(c, [("unix", path)])
+        sender = FlakySender(("unix", path), "node1", "thread", False)
+        try:
+            # interval 1 gets there, the send still fails, so it's sent
+            # again on a new connection of the same session
+            sender.write(1.0, totals(100.0), [row("100", "app", 60.0)])
+            self.poll(server, lambda: c.skipped == 1)
+            self.assertTrue(sender.flaky.failed)
+            h = c.hosts["node1"]
+            self.assertEqual((h.last_ts, len(h.window)), (1.0, 1))
+            self.assertEqual(c.mean_totals()[0], 100.0)
+
+            sender.write(2.0, totals(200.0), [row("100", "app", 90.0)])
+            self.poll(server, lambda: h.last_ts == 2.0)
+            self.assertEqual(len(c.hosts), 1)
+            self.assertEqual(c.top("task", 0), [(("node1", 100, "app"), [75.0, 0.0, 0.0, 0.0])])
+        finally:
+            sender.close()
+            server.shutdown()
+        self.assertEqual((sender.sent, sender.dropped), (2, 0))
+        self.assertFalse(os.path.exists(path))
+
+    def poll(self, server, done):
+        end = time.time() + 10
+        while not done():
+            self.assertTrue(time.time() < end)
+            server.poll(0.1)
+
+if __name__ == "__main__":
+    unittest.main()
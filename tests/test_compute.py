@@ -0,0 +1,99 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Per-task bandwidth columns, on the NumPy path and the pure Python one"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from membw import compute
+from membw.perfcsv import Counts
+
+NUMPY = compute.np
+
+def floats(col):
+    return [float(v) for v in col]
+
+def ints(rows):
+    return [int(i) for i in rows]
+
+class Checks(object):
+    """The tests, run with compute.np set to the class' np"""
+    np = None
+
+    def setUp(self):
+        compute.np = self.np
+
+    def tearDown(self):
+        compute.np = NUMPY
+
+    def test_pivot(self):
+        c = Counts()
+        for key, event, value in (("app-1", "OCR_READ_DRAM", 10.0), ("app-1", "MEM_INST_RETIRED.ALL_STORES", 4.0),\
+                ("db-2", "OCR_READ_DRAM", 1.0), ("db-2", "OCR_READ_DRAM", 2.0), ("db-2", "OTHER", 99.0),\
+                ("app-1", "OCR_WRITE_PMEM", 5.0), (None, "OCR_READ_DRAM", 7.0)):
+            c.append(key, event, value, 1.0, 1.0)
+        t = compute.pivot(c)
+        self.assertEqual(t.ids, ["app-1", "db-2", None])
+        # rows of a key are summed, other events and keyless rows aren't counted
+        self.assertEqual([floats(col) for col in t.cols], [[10.0, 3.0, 0.0], [0.0, 0.0, 0.0],\
+                [5.0, 0.0, 0.0], [4.0, 0.0, 0.0]])
+        self.assertEqual(len(compute.pivot(Counts())), 0)
+
+    def test_aggregate(self):
+        t = compute.columns(["a-1", "b-2", "a-3"], [1.0, 2.0, 4.0], stores=[10, 20, 40])
+        g, inv = compute.aggregate(t, ["a", "b", "a"])
+        self.assertEqual(g.ids, ["a", "b"])
+        self.assertEqual(floats(g.cols[compute.DRAM_READ]), [5.0, 2.0])
+        self.assertEqual(floats(g.cols[compute.STORES]), [50.0, 20.0])
+        self.assertEqual(floats(g.cols[compute.PMEM_READ]), [0.0, 0.0])
+        self.assertEqual(ints(inv), [0, 1, 0])
+        self.assertEqual(ints(compute.members(inv, 0)), [0, 2])
+        s = compute.take(t, [2, 0], ["x", "y"])
+        self.assertEqual((s.ids, floats(s.cols[0])), (["x", "y"], [4.0, 1.0]))
+        self.assertEqual(compute.take(t, [1]).ids, ["b-2"])
+
+    def test_task_bw(self):
+        mib = compute.MiB / 64.0
+        # 2 seconds, 100 MiB/s of DRAM reads and 50 MiB/s of writes in all
+        t = compute.columns(["a", "b", "c", "idle"], [40 * mib, 100 * mib, 0.0, 0.0], [0.0, 0.0, 20 * mib, 0.0],\
+                [0.0, 0.0, 8 * mib, 0.0], [30, 0, 10, 0])
+        b = compute.task_bw(t, 2.0, 100.0, 50.0, 20.0, 0.0, 100)
+        self.assertEqual(floats(b.read_bw), [20.0, 50.0, 0.0, 0.0])
+        self.assertEqual(floats(b.read_share), [0.2, 0.5, 0.0, 0.0])
+        # writes go by the share of the stores
+        self.assertEqual(floats(b.write_share), [0.3, 0.0, 0.1, 0.0])
+        self.assertEqual(floats(b.write_bw), [15.0, 0.0, 5.0, 0.0])
+        self.assertEqual(floats(b.pmem_read_share), [0.0, 0.0, 0.5, 0.0])
+        # no PMEM write total, no share of it
+        self.assertEqual(floats(b.pmem_write_bw), [0.0, 0.0, 4.0, 0.0])
+        self.assertEqual(floats(b.pmem_write_share), [0.0, 0.0, 0.0, 0.0])
+        self.assertEqual(ints(b.listed), [0, 1, 2])
+
+        self.assertEqual(b.order(), [1, 0, 2])
+        self.assertEqual(b.order("write_bw"), [0, 2, 1])
+        self.assertEqual(b.order("read_bw", 1), [1])
+        # rows given instead of the listed ones, as for --drill
+        rows = [3, 2, 0]
+        if self.np is not None:
+            rows = self.np.array(rows)
+        self.assertEqual(b.order("pmem_read_bw", 1, rows), [2])
+        # ties keep the order they came in
+        self.assertEqual(b.order("read_bw", 0, rows), [0, 3, 2])
+
+    def test_no_totals(self):
+        t = compute.columns(["a"], [1.0], stores=[5])
+        b = compute.task_bw(t, 1.0, 0.0, 0.0, 0.0, 0.0, 0)
+        self.assertEqual(floats(b.read_share) + floats(b.write_share), [0.0, 0.0])
+        self.assertEqual(ints(b.listed), [])
+
+class PythonTest(Checks, unittest.TestCase):
+    np = None
+
+@unittest.skipIf(NUMPY is None, "no NumPy")
+class NumPyTest(Checks, unittest.TestCase):
+    np = NUMPY
+
+if __name__ == "__main__":
+    unittest.main()
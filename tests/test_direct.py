@@ -0,0 +1,135 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""DirectCollector on FakeSyscalls with made-up sysfs and procfs trees"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from membw import direct
+from membw.perf_event import FakeSyscalls
+from helpers import write
+
+CPU_TYPE = 4
+IMC_TYPE = 13
+
+def rows(c):
+    # {(key, event): value}, rows of the same key summed
+    r = {}
+    for k, e, v in zip(c.keys, c.events, c.values):
+        r[(k, e)] = r.get((k, e), 0) + v
+    return r
+
+class Counter(object):
+    """Counts going up by a step per read of an event on a task or CPU"""
+    def __init__(self):
+        self.step = {}
+        self.total = {}
+
+    def __call__(self, attr, pid, cpu):
+        key = (attr.type, attr.config, attr.config1, pid, cpu)
+        self.total[key] = self.total.get(key, 0) + self.step.get((attr.type, pid), 1000)
+        return self.total[key]
+
+class DirectTest(unittest.TestCase):
+    def setUp(self):
+        self.d = tempfile.mkdtemp(prefix="bw-test-")
+        self.sys = os.path.join(self.d, "sys")
+        self.proc = os.path.join(self.d, "proc")
+        pmu = os.path.join(self.sys, "bus/event_source/devices")
+        write(os.path.join(self.sys, "devices/system/cpu/online"), "0-1")
+        for name, type_ in (("cpu", CPU_TYPE), ("uncore_imc_0", IMC_TYPE)):
+            write(os.path.join(pmu, name, "type"), str(type_))
+            write(os.path.join(pmu, name, "format/event"), "config:0-7")
+            write(os.path.join(pmu, name, "format/umask"), "config:8-15")
+        write(os.path.join(pmu, "cpu/format/offcore_rsp"), "config1:0-63")
+        write(os.path.join(pmu, "uncore_imc_0/cpumask"), "0")
+        write(os.path.join(self.proc, "meminfo"), "")
+        for pid, tid, comm in ((100, 100, "app"), (100, 101, "app"), (200, 200, "db")):
+            self.thread(pid, tid, comm)
+        self.counter = Counter()
+        self.sc = FakeSyscalls(self.counter)
+
+    def tearDown(self):
+        shutil.rmtree(self.d, ignore_errors=True)
+
+    def thread(self, pid, tid, comm):
+        write(os.path.join(self.proc, str(pid), "task", str(tid), "comm"), comm)
+
+    def collector(self, pids=[-1], pmem=False):
+        return direct.DirectCollector("85", pids, pmem, sys_root=self.sys, proc_root=self.proc, sc=self.sc)
+
+    def sample(self, c, enabled=1000, running=1000):
+        self.sc.enabled += enabled
+        self.sc.running += running
+        return c.sample()
+
+    def test_open_and_group_read(self):
+        c = self.collector()
+        # a group of OCR_READ_DRAM and ALL_STORES per thread, ALL_STORES on
+        # 2 CPUs, the 2 IMC events on the CPU of the cpumask
+        self.assertEqual(len(self.sc.fds), 3 * 2 + 2 + 2)
+        self.assertEqual(sorted([k for k, g in c.task_groups.values()]), ["app-100", "app-101", "db-200"])
+        self.counter.step[(CPU_TYPE, 200)] = 5000
+        elapsed, task, system, unc = self.sample(c)
+        r = rows(task)
+        self.assertEqual(r[("app-100", "OCR_READ_DRAM")], 1000)
+        self.assertEqual(r[("db-200", "MEM_INST_RETIRED.ALL_STORES")], 5000)
+        self.assertEqual(sorted(set(system.keys)), ["CPU0", "CPU1"])
+        self.assertEqual(sorted(rows(unc)), [("CPU0", "UNC_M_RPQ_INSERTS_IMC_0"),\
+                ("CPU0", "UNC_M_WPQ_INSERTS_IMC_0")])
+        c.close()
+        self.assertEqual(self.sc.fds, {})
+
+    def test_target_pids(self):
+        c = self.collector(pids=[100])
+        self.assertEqual(sorted(c.task_groups), [100, 101])
+        r = rows(self.sample(c)[1])
+        self.assertEqual(sorted(set([k for k, e in r])), ["100"])
+        self.assertEqual(r[("100", "OCR_READ_DRAM")], 2000)
+        shutil.rmtree(os.path.join(self.proc, "100"))
+        self.sample(c)
+        self.assertEqual(self.sample(c), None)
+
+    def test_multiplex_scaling(self):
+        # with PMEM the OCR events need two groups, each runs half the time
+        c = self.collector(pmem=True)
+        self.assertEqual(len(c.task_specs), 2)
+        task = self.sample(c, enabled=2000, running=1000)[1]
+        r = rows(task)
+        for e in ("OCR_READ_DRAM", "OCR_READ_PMEM", "OCR_WRITE_PMEM", "MEM_INST_RETIRED.ALL_STORES"):
+            self.assertEqual(r[("app-100", e)], 2000)
+        self.assertEqual(set(task.pct), set([50.0]))
+        # a group that didn't run gives no counts
+        task = self.sample(c, enabled=2000, running=0)[1]
+        self.assertEqual(set(task.values), set([0.0]))
+
+    def test_thread_exit(self):
+        c = self.collector()
+        shutil.rmtree(os.path.join(self.proc, "100", "task", "101"))
+        # the exited thread still gives its last counts, then it's closed
+        task = self.sample(c)[1]
+        self.assertTrue(("app-101", "OCR_READ_DRAM") in rows(task))
+        self.assertFalse(101 in c.task_groups)
+        self.assertEqual(len(self.sc.fds), 2 * 2 + 2 + 2)
+        task = self.sample(c)[1]
+        self.assertFalse(("app-101", "OCR_READ_DRAM") in rows(task))
+
+    def test_new_threads_and_comm(self):
+        c = self.collector()
+        self.thread(300, 300, "new")
+        self.sample(c)
+        self.assertEqual(c.task_groups[300][0], "new-300")
+        # a known thread's comm isn't read every scan, but an exec shows
+        # up within COMM_REFRESH of them
+        self.thread(200, 200, "exec")
+        found = [rows(self.sample(c)[1]).get(("exec-200", "OCR_READ_DRAM"))\
+                for i in range(direct.COMM_REFRESH + 1)]
+        self.assertEqual(found[0], None)
+        self.assertTrue(any(found))
+
+if __name__ == "__main__":
+    unittest.main()
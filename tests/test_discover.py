@@ -0,0 +1,79 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""--match targets found in a made-up procfs"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from membw import discover
+from membw.procinfo import ProcResolver
+from membw.report import Reporter, parse_args
+from helpers import write
+
+class DiscoverTest(unittest.TestCase):
+    def setUp(self):
+        self.d = tempfile.mkdtemp(prefix="bw-test-")
+        self.proc = os.path.join(self.d, "proc")
+        self.task(500, "redis-server", 1, 1, "redis-server *:6379")
+        self.task(700, "app", 1, 1, "app")
+        # what we started, their cmdline has the pattern in it
+        self.task(800, "python3", os.getpid(), 1, "python3 bw-collect.py -m cmdline:redis")
+        self.task(801, "perf", 800, 1, "perf stat -- sleep 1 redis")
+
+    def tearDown(self):
+        shutil.rmtree(self.d, ignore_errors=True)
+
+    def task(self, pid, comm, ppid, starttime, cmdline):
+        d = os.path.join(self.proc, str(pid))
+        write(os.path.join(d, "stat"), "%d (%s) S %d %s %d" % (pid, comm, ppid, " ".join(["0"] * 17), starttime))
+        write(os.path.join(d, "comm"), comm)
+        with open(os.path.join(d, "cmdline"), "w") as f:
+            f.write(cmdline.replace(" ", "\0") + "\0")
+
+    def reporter(self, *match):
+        argv = ["--format", "jsonl", "--out", os.path.join(self.d, "out")]
+        for m in match:
+            argv.extend(["-m", m])
+        r = Reporter(parse_args(argv))
+        r.tasks = ProcResolver(self.proc)
+        return r
+
+    def test_scan(self):
+        cmdline = [discover.parse_matcher("cmdline:redis")]
+        self.assertEqual(discover.scan(cmdline, self.proc), [500, 800, 801])
+        self.assertEqual(discover.scan(cmdline, self.proc, exclude=(os.getpid(),)), [500])
+        self.assertEqual(discover.scan([discover.parse_matcher("comm:^(app|perf)$")], self.proc,\
+                exclude=(os.getpid(),)), [700])
+
+    def test_restarted_match(self):
+        r = self.reporter("comm:^redis")
+        self.assertEqual(r.live_targets([]), [500])
+        r.tid_map[501] = "500"
+        # restarted on the same PID, still a target, its old threads aren't
+        self.task(500, "redis-server", 1, 9, "redis-server *:6379")
+        self.assertEqual(r.live_targets([500]), [500])
+        self.assertEqual(r.target_start[500], 9)
+        self.assertEqual(r.tid_map, {})
+        self.assertEqual(r.live_targets([500]), [500])
+
+    def test_reused_pid(self):
+        # a -p PID taken by something else isn't a target anymore
+        r = self.reporter("comm:^redis")
+        self.assertEqual(r.live_targets([700]), [700, 500])
+        self.task(700, "other", 1, 9, "other")
+        self.assertEqual(r.live_targets([700, 500]), [500])
+
+    def test_all_exited(self):
+        r = self.reporter()
+        # gone between parse_args() and run()
+        r.pids = [900]
+        with self.assertRaises(SystemExit) as cm:
+            r.run()
+        self.assertEqual(str(cm.exception.code), "The targets have all exited, nothing to monitor.")
+
+if __name__ == "__main__":
+    unittest.main()
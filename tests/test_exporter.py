@@ -0,0 +1,79 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Exporter series, scraped over HTTP from localhost"""
+
+import os
+import sys
+import unittest
+
+try:
+    from urllib.request import urlopen
+    from urllib.error import HTTPError
+except ImportError:
+    from urllib2 import urlopen, HTTPError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from membw.exporter import Exporter, MiB
+from membw.sink import Row
+
+def row(socket, pid, comm, read):
+    return Row(socket, pid, comm, (read, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0))
+
+def series(body):
+    # {metric with labels: value}, comments left out
+    return dict(l.rsplit(" ", 1) for l in body.decode("utf-8").splitlines() if not l.startswith("#"))
+
+def task(pid, comm, socket=None):
+    s = ',socket="%s"' % socket if socket is not None else ""
+    return 'membw_task_bandwidth_bytes_per_second{comm="%s",kind="dram_read",pid="%s"%s}' % (comm, pid, s)
+
+class ExporterTest(unittest.TestCase):
+    def setUp(self):
+        self.e = Exporter([0], top=2)
+
+    def tearDown(self):
+        self.e.close()
+
+    def test_top_over_sockets(self):
+        # per-socket rows come a socket after the other, each heaviest first
+        self.e.write(10.0, {0: (30.0, 0, 0, 0), 1: (90.0, 0, 0, 0)}, [row(0, "100", "app", 20.0),\
+                row(0, "200", "db", 10.0), row(1, "200", "db", 80.0), row(1, "100", "app", 5.0)])
+        s = series(self.e.body)
+        self.assertEqual(s[task(200, "db", 1)], "%.0f" % (80 * MiB))
+        self.assertEqual(s[task(100, "app", 0)], "%.0f" % (20 * MiB))
+        self.assertFalse(task(200, "db", 0) in s)
+        self.assertEqual(s[task("other", "other", 0)], "%.0f" % (10 * MiB))
+        self.assertEqual(s[task("other", "other", 1)], "%.0f" % (5 * MiB))
+        self.assertEqual(s['membw_imc_bandwidth_bytes_per_second{kind="dram_read",socket="1"}'],\
+                "%.0f" % (90 * MiB))
+
+    def test_drill_and_cgroups(self):
+        # drilled threads are already in their group, cgroups go by path
+        self.e.write(10.0, {None: (100.0, 0, 0, 0)}, [row(None, "100", "app", 40.0),\
+                row(None, "100", "`-app", 30.0), row(None, "101", "`-app", 10.0),\
+                row(None, "-", "/a/long/slice/one.scope", 8.0), row(None, "-", "/b/long/slice/one.scope", 7.0),\
+                row(None, "-", "/a/long/slice/one.scope", 1.0)])
+        s = series(self.e.body)
+        self.assertEqual(sorted(s), sorted([task(100, "app"), task("-", "/a/long/slice/one.scope"),\
+                task("other", "other"), 'membw_imc_bandwidth_bytes_per_second{kind="dram_read",socket="all"}',\
+                "membw_last_interval_timestamp_seconds"]))
+        self.assertEqual(s[task("-", "/a/long/slice/one.scope")], "%.0f" % (9 * MiB))
+        self.assertEqual(s[task("other", "other")], "%.0f" % (7 * MiB))
+
+    def test_scrape(self):
+        self.e.serve("127.0.0.1", 0)
+        url = "http://127.0.0.1:%d" % self.e.server.server_address[1]
+        f = urlopen(url + "/metrics")
+        self.assertEqual(f.info()["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        self.assertFalse(task(100, "app") in series(f.read()))
+
+        self.e.write(12.5, {None: (50.0, 0, 0, 0)}, [row(None, "100", "app", 50.0)])
+        s = series(urlopen(url + "/metrics").read())
+        self.assertEqual(s[task(100, "app")], "%.0f" % (50 * MiB))
+        self.assertEqual(s["membw_last_interval_timestamp_seconds"], "12.500")
+        with self.assertRaises(HTTPError) as cm:
+            urlopen(url + "/nothing")
+        self.assertEqual(cm.exception.code, 404)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""--by process/user groups of all-tasks rows on a made-up procfs"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from membw.procinfo import ProcResolver
+from membw.report import Reporter, parse_args
+from helpers import write
+
+class GroupTest(unittest.TestCase):
+    def setUp(self):
+        self.d = tempfile.mkdtemp(prefix="bw-test-")
+        self.proc = os.path.join(self.d, "proc")
+        self.task(150, "app", 1, 150, 1000)
+        self.task(151, "app", 1, 150, 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.d, ignore_errors=True)
+
+    def task(self, pid, comm, starttime, tgid, uid):
+        d = os.path.join(self.proc, str(pid))
+        write(os.path.join(d, "stat"), "%d (%s) S %s %d 0 0" % (pid, comm, " ".join(["0"] * 18), starttime))
+        write(os.path.join(d, "status"), "Name:\t%s\nTgid:\t%d\nPid:\t%d\nUid:\t%d\t%d\t%d\t%d"\
+                % (comm, tgid, pid, uid, uid, uid, uid))
+
+    def reporter(self, by):
+        r = Reporter(parse_args(["--by", by, "--format", "jsonl", "--out", os.path.join(self.d, "out")]))
+        r.tasks = ProcResolver(self.proc)
+        return r
+
+    def groups(self, r, keys):
+        found = r.tasks.refresh([int(k.rpartition("-")[2]) for k in keys])
+        return [r.group_of(k, found) for k in keys], found
+
+    def test_reused_tid(self):
+        r = self.reporter("process")
+        self.assertEqual(self.groups(r, ["app-150", "app-151"])[0], [150, 150])
+        # 151 exited and its TID went to a new process of another user
+        self.task(151, "db", 9, 151, 0)
+        groups, found = self.groups(r, ["app-150", "db-151"])
+        self.assertEqual(groups, [150, 151])
+        self.assertEqual(r.group_label(151, found), ("151", "db"))
+
+    def test_reused_tid_by_user(self):
+        r = self.reporter("user")
+        self.assertEqual(self.groups(r, ["app-151"])[0], [1000])
+        self.task(151, "db", 9, 151, 0)
+        self.assertEqual(self.groups(r, ["db-151"])[0], [0])
+
+    def test_exited(self):
+        r = self.reporter("process")
+        self.groups(r, ["app-150", "app-151"])
+        # gone, the last counts still go to the process it was in
+        shutil.rmtree(os.path.join(self.proc, "151"))
+        self.assertEqual(self.groups(r, ["app-151", "app-152"])[0], [150, 152])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Windowed bandwidth stats of History"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from membw.history import History
+
+def feed(h, key, values):
+    # a value per interval, None for an interval the key wasn't in
+    for v in values:
+        h.next()
+        if v is not None:
+            h.add(key, v)
+
+class HistoryTest(unittest.TestCase):
+    def test_window(self):
+        h = History(4)
+        feed(h, "a", [1.0, 2.0, 3.0, 4.0, 5.0])
+        mean, ewma, peak, p50, p95, p99 = h.stats("a")
+        # the first one fell out of the window
+        self.assertEqual((mean, peak, p50, p95, p99), (3.5, 5.0, 3.0, 5.0, 5.0))
+        # alpha 2 / (window + 1), from the first sample on
+        e = 1.0
+        for v in (2.0, 3.0, 4.0, 5.0):
+            e = e * 0.6 + 0.4 * v
+        self.assertAlmostEqual(ewma, e)
+        self.assertEqual(h.stats("b"), None)
+
+    def test_missing_intervals(self):
+        h = History(4)
+        feed(h, "a", [8.0, None, None, 4.0])
+        mean, ewma, peak, p50, p95, p99 = h.stats("a")
+        # the intervals it wasn't in count as 0
+        self.assertEqual((mean, peak, p50), (3.0, 8.0, 0.0))
+        self.assertAlmostEqual(ewma, 8.0 * 0.6 ** 3 + 0.4 * 4.0)
+
+    def test_same_interval(self):
+        h = History(3)
+        feed(h, "a", [1.0])
+        # e.g. the same task on two sockets
+        h.add("a", 2.0)
+        self.assertEqual(h.stats("a")[:3], (3.0, 3.0, 3.0))
+        feed(h, "a", [1.0])
+        h.add("a", 1.0)
+        self.assertEqual(h.stats("a")[:3], (2.5, 3.0 * 0.5 + 0.5 * 2.0, 3.0))
+
+    def test_bounded(self):
+        h = History(2, max_series=2)
+        feed(h, "a", [1.0])
+        h.add("b", 1.0)
+        h.add("c", 1.0)
+        # the least recently updated one goes
+        self.assertEqual(sorted(h.series), ["b", "c"])
+        h.add("b", 1.0)
+        feed(h, "d", [1.0, 1.0])
+        # c went over max_series, b can still be added in this interval
+        self.assertEqual(sorted(h.series), ["b", "d"])
+        # then it's been idle for the whole window
+        feed(h, "d", [1.0])
+        self.assertEqual(sorted(h.series), ["d"])
+        feed(h, "e", [None, None, None])
+        self.assertEqual(len(h), 0)
+
+if __name__ == "__main__":
+    unittest.main()
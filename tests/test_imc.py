@@ -0,0 +1,125 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""IMC totals, per-channel bandwidth and the channel monitor"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from membw import imc
+from membw.perfcsv import Counts
+
+# cache lines in one MiB
+MIB = 1024 * 1024 / 64
+
+# CPU0-1 on socket 0, CPU2-3 on socket 1
+SOCKETS = {0: 0, 1: 0, 2: 1, 3: 1}
+
+def counts(rows):
+    c = Counts()
+    for key, event, value in rows:
+        c.append(key, event, value, 1e9, 1e9)
+    return c
+
+UNC = counts([
+    ("CPU0", "UNC_M_RPQ_INSERTS_IMC_0", 4 * MIB),
+    ("CPU0", "UNC_M_WPQ_INSERTS_IMC_0", 2 * MIB),
+    ("CPU0", "UNC_M_RPQ_INSERTS_IMC_1", 2 * MIB),
+    ("CPU2", "UNC_M_PMM_RPQ_INSERTS_IMC_0", 8 * MIB),
+    ("CPU2", "UNC_M_PMM_WPQ_INSERTS_IMC_0", 1 * MIB),
+    ("CPU2", "UNC_M_CAS_COUNT.RD_IMC_0", 99 * MIB),
+])
+
+SYSTEM = counts([
+    ("CPU0", imc.STORES, 100),
+    ("CPU1", imc.STORES, 50),
+    ("CPU3", imc.STORES, 10),
+    ("CPU3", "OCR_READ_DRAM", 1000),
+])
+
+class EventTest(unittest.TestCase):
+    def test_kind_of(self):
+        self.assertEqual(imc.kind_of("UNC_M_RPQ_INSERTS"), 0)
+        self.assertEqual(imc.kind_of("UNC_M_WPQ_INSERTS_IMC_2"), 1)
+        # PMM_RPQ/PMM_WPQ are not taken for DRAM
+        self.assertEqual(imc.kind_of("UNC_M_PMM_RPQ_INSERTS_IMC_1"), 2)
+        self.assertEqual(imc.kind_of("UNC_M_PMM_WPQ_INSERTS"), 3)
+        self.assertEqual(imc.kind_of("UNC_M_CAS_COUNT.RD"), -1)
+
+    def test_box_of(self):
+        self.assertEqual(imc.box_of("UNC_M_RPQ_INSERTS_IMC_5"), 5)
+        self.assertEqual(imc.box_of("UNC_M_RPQ_INSERTS"), 0)
+
+class TotalsTest(unittest.TestCase):
+    def test_channel_bw(self):
+        bw = imc.channel_bw(UNC, 2.0, SOCKETS)
+        self.assertEqual(bw, {
+            (0, 0): [2.0, 1.0, 0.0, 0.0],
+            (0, 1): [1.0, 0.0, 0.0, 0.0],
+            (1, 0): [0.0, 0.0, 4.0, 0.5],
+        })
+
+    def test_totals(self):
+        t = imc.totals(SYSTEM, UNC, 1.0)
+        self.assertEqual(list(t), [None])
+        self.assertEqual(t[None], (6.0, 2.0, 8.0, 1.0, 160))
+
+    def test_totals_per_socket(self):
+        t = imc.totals(SYSTEM, UNC, 1.0, SOCKETS)
+        self.assertEqual(t[0], (6.0, 2.0, 0.0, 0.0, 150))
+        self.assertEqual(t[1], (0.0, 0.0, 8.0, 1.0, 10))
+
+    def test_imbalance(self):
+        self.assertIsNone(imc.imbalance([]))
+        self.assertIsNone(imc.imbalance([0.0, 0.0]))
+        self.assertEqual(imc.imbalance([2.0, 2.0]), (1.0, 0.0))
+        peak, cv = imc.imbalance([1.0, 3.0])
+        self.assertEqual(peak, 1.5)
+        self.assertEqual(cv, 0.5)
+
+class ChannelMonitorTest(unittest.TestCase):
+    def interval(self, mon, hot):
+        # socket 0 has box 0 at 30 and box 1 at 10 MiB/s when hot, both at 20 otherwise
+        if hot:
+            return mon.update({(0, 0): [20.0, 10.0, 0.0, 0.0], (0, 1): [10.0, 0.0, 0.0, 0.0]})
+        return mon.update({(0, 0): [10.0, 10.0, 0.0, 0.0], (0, 1): [20.0, 0.0, 0.0, 0.0]})
+
+    def test_update(self):
+        mon = imc.ChannelMonitor()
+        r = self.interval(mon, True)
+        self.assertEqual(list(r), [0])
+        self.assertEqual(r[0][0], (4.0 / 3, 1.0 / 3))
+        self.assertEqual(r[0][1], (2.0, 1.0))
+        # no PMEM traffic
+        self.assertEqual(r[0][2:], [None, None])
+
+    def test_hot_streak(self):
+        mon = imc.ChannelMonitor(margin=0.2, intervals=3)
+        for _ in range(2):
+            self.interval(mon, True)
+        self.assertFalse(mon.hot((0, 0)))
+        self.interval(mon, True)
+        self.assertTrue(mon.hot((0, 0)))
+        self.assertFalse(mon.hot((0, 1)))
+        self.interval(mon, True)
+        self.assertEqual(mon.hot_count, {(0, 0): 2})
+
+        # a cool interval resets the streak
+        self.interval(mon, False)
+        self.assertFalse(mon.hot((0, 0)))
+        self.interval(mon, True)
+        self.assertFalse(mon.hot((0, 0)))
+        self.assertEqual(mon.hot_count, {(0, 0): 2})
+
+    def test_mean(self):
+        mon = imc.ChannelMonitor()
+        self.assertEqual(mon.mean((0, 0)), [0.0] * 4)
+        self.interval(mon, True)
+        self.interval(mon, False)
+        self.assertEqual(mon.channels(), [(0, 0), (0, 1)])
+        self.assertEqual(mon.mean((0, 0)), [15.0, 10.0, 0.0, 0.0])
+        self.assertEqual(mon.mean((0, 1)), [15.0, 0.0, 0.0, 0.0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""MBAController on a made-up resctrl tree, fed made-up bandwidth"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from membw import mba
+from helpers import write, read, remove_group
+
+class MBATest(unittest.TestCase):
+    def setUp(self):
+        self.d = tempfile.mkdtemp(prefix="bw-test-")
+        self.root = os.path.join(self.d, "resctrl")
+        self.proc = os.path.join(self.d, "proc")
+        write(os.path.join(self.root, "info", "MB", "min_bandwidth"), "10")
+        write(os.path.join(self.root, "info", "MB", "bandwidth_gran"), "10")
+        write(os.path.join(self.root, "schemata"), "    L3:0=7ff;1=7ff\n    MB:0=100;1=100")
+        for tid in (100, 101):
+            write(os.path.join(self.proc, "100", "task", str(tid), "comm"), "app")
+        self.group = os.path.join(self.root, mba.GROUP_PREFIX + "100")
+
+    def tearDown(self):
+        shutil.rmtree(self.d, ignore_errors=True)
+
+    def controller(self, dry_run=False):
+        return mba.MBAController([("100", 1000.0)], dry_run=dry_run, root=self.root, proc_root=self.proc,\
+                rmdir=remove_group)
+
+    def feed(self, c, bw):
+        # pct after an interval at bw MiB/s, and the group's schemata if there's one
+        c.update({"100": bw})
+        path = os.path.join(self.group, "schemata")
+        return c.targets["100"].pct, read(path) if os.path.exists(path) else None
+
+    def test_throttle_and_recover(self):
+        c = self.controller()
+        self.assertEqual(c.domains, ["0", "1"])
+        # within the hysteresis, nothing is made
+        self.assertEqual(self.feed(c, 1050), (100, None))
+        self.assertFalse(os.path.exists(self.group))
+
+        self.assertEqual(self.feed(c, 1200), (80, "MB:0=80;1=80\n"))
+        self.assertEqual(read(os.path.join(self.group, "tasks")), "101\n")
+        self.assertEqual(c.targets["100"].group.tids, set([100, 101]))
+        self.assertEqual(self.feed(c, 4000), (20, "MB:0=20;1=20\n"))
+        self.assertEqual(self.feed(c, 1200), (10, "MB:0=10;1=10\n"))
+        # never under min_bandwidth
+        self.assertEqual(self.feed(c, 5000), (10, "MB:0=10;1=10\n"))
+        self.assertEqual(self.feed(c, 1000), (10, "MB:0=10;1=10\n"))
+
+        # back under the budget, a step of bandwidth_gran at a time
+        for pct in range(20, 100, 10):
+            self.assertEqual(self.feed(c, 500), (pct, "MB:0=%d;1=%d\n" % (pct, pct)))
+        # at 100% the group goes and the tasks are back in the default one
+        self.assertEqual(self.feed(c, 500), (100, None))
+        self.assertFalse(os.path.exists(self.group))
+        self.assertEqual(c.targets["100"].group, None)
+
+    def test_actions_and_close(self):
+        c = self.controller()
+        self.assertEqual(c.update({"100": 1200}),\
+                ["100: 1200.0 MiB/s, budget 1000.0 MiB/s, MBA 100% -> 80%"])
+        self.assertEqual(c.update({"200": 5000}), [])
+        c.close()
+        self.assertFalse(os.path.exists(self.group))
+        self.assertEqual(c.targets["100"].pct, 100)
+
+    def test_existing_group(self):
+        write(os.path.join(self.group, "schemata"), "    L3:0=7ff;1=7ff\n    MB:0=50;1=50")
+        c = self.controller()
+        self.assertEqual(self.feed(c, 1200), (80, "MB:0=80;1=80\n"))
+        self.assertFalse(c.targets["100"].group.created)
+        # used and given back as it was, never removed
+        self.assertEqual(self.feed(c, 500), (90, "MB:0=90;1=90\n"))
+        self.assertEqual(self.feed(c, 500), (100, "MB:0=50;1=50\n"))
+        self.assertEqual(c.targets["100"].group, None)
+        self.feed(c, 1200)
+        c.close()
+        self.assertEqual(read(os.path.join(self.group, "schemata")), "MB:0=50;1=50\n")
+
+    def test_dry_run(self):
+        c = self.controller(dry_run=True)
+        self.assertEqual(len(c.update({"100": 4000})), 1)
+        self.assertEqual(c.targets["100"].pct, 20)
+        self.assertFalse(os.path.exists(self.group))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""perf stat -x output parsed into Counts"""
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from membw import perfcsv
+
+STARTED = "# started on Mon Oct 16 10:00:00 2023"
+
+PER_THREAD = """%s
+
+app, 1-100;1000;;OCR_READ_DRAM;2000000000;100.00;;
+app, 1-100;300;;MEM_INST_RETIRED.ALL_STORES;1000000000;50.00;;
+db-200;<not counted>;;OCR_READ_DRAM;0;0.00;;
+db-200;<not supported>;;MEM_INST_RETIRED.ALL_STORES;;;;
+""" % STARTED
+
+INTERVAL = """# started on Mon Oct 16 10:00:00 2023
+     1.000123456;CPU0;40;;UNC_M_RPQ_INSERTS;1000000000;100.00;;
+     1.000123456;CPU1;20;;UNC_M_RPQ_INSERTS;1000000000;100.00;;
+     2.000234567;CPU0;44;;UNC_M_RPQ_INSERTS;1000000000;100.00;;
+"""
+
+CGROUP = """5;;OCR_READ_DRAM;/system.slice;1000000000;25.00;;
+7;;OCR_READ_DRAM;/user.slice;1000000000;25.00;;
+"""
+
+def parse(text, **kw):
+    return perfcsv.parse(text.splitlines(True), **kw)
+
+class PerfCSVTest(unittest.TestCase):
+    def test_per_thread(self):
+        c = parse(PER_THREAD, keyed=True)
+        self.assertEqual(c.started, time.mktime((2023, 10, 16, 10, 0, 0, 0, 0, -1)))
+        # not counted and not supported rows are left out
+        self.assertEqual(list(c.rows()), [("app, 1-100", 1000.0, "OCR_READ_DRAM"),\
+                ("app, 1-100", 300.0, "MEM_INST_RETIRED.ALL_STORES")])
+        self.assertEqual(list(c.pct), [100.0, 50.0])
+        self.assertEqual(list(c.running), [2e9, 1e9])
+        self.assertEqual(list(c.enabled()), [2e9, 2e9])
+        self.assertEqual(list(c.ts), [])
+        # event names are shared, not a string per row
+        c2 = parse(PER_THREAD, keyed=True)
+        self.assertTrue(c.events[0] is c2.events[0])
+
+    def test_interval(self):
+        c = parse(INTERVAL, interval=True, keyed=True)
+        self.assertEqual(list(c.ts), [1.000123456, 1.000123456, 2.000234567])
+        self.assertEqual(c.keys, ["CPU0", "CPU1", "CPU0"])
+        self.assertEqual(list(c.values), [40.0, 20.0, 44.0])
+        self.assertEqual(c.elapsed(), 1.0)
+        s = c.slice(0, 2)
+        self.assertEqual((list(s.ts), s.keys, s.started),\
+                ([1.000123456, 1.000123456], ["CPU0", "CPU1"], c.started))
+        s.extend(c.slice(2, 3))
+        self.assertEqual(list(s.values), list(c.values))
+
+    def test_cgroup(self):
+        c = parse(CGROUP, cgroup=True)
+        self.assertEqual(c.keys, ["/system.slice", "/user.slice"])
+        self.assertEqual(list(c.pct), [25.0, 25.0])
+        keyed = parse("CPU3;5;;OCR_READ_DRAM;/system.slice;1000000000;100.00;;\n", keyed=True, cgroup=True)
+        self.assertEqual(keyed.keys, ["/system.slice@CPU3"])
+
+    def test_into_counts(self):
+        # parsed in chunks, a stream is appended to the same Counts
+        c = perfcsv.Counts()
+        lines = INTERVAL.splitlines(True)
+        perfcsv.parse(lines[:2], interval=True, keyed=True, counts=c)
+        perfcsv.parse(lines[2:], interval=True, keyed=True, counts=c)
+        self.assertEqual(len(c), 3)
+
+    def test_partition_and_coverage(self):
+        c = perfcsv.Counts()
+        c.append("CPU0", "A", 10.0, 1e9, 1e9)
+        c.append("CPU0", "B", 20.0, 1e9, 2.5e8)
+        c.append("CPU1", "B", 0.0, 1e9, 0.0)
+        a, b = c.partition(set(["A"]))
+        self.assertEqual((a.events, b.events), (["A"], ["B", "B"]))
+        self.assertEqual(list(b.pct), [25.0, 0.0])
+        # rows that never ran aren't part of it
+        self.assertEqual(b.coverage(), 0.25)
+        self.assertEqual(c.coverage(), 1.25e9 / 2e9)
+        self.assertEqual(perfcsv.Counts().coverage(), 1.0)
+
+    def test_started(self):
+        self.assertEqual(perfcsv.parse_started("# started on nothing"), None)
+
+if __name__ == "__main__":
+    unittest.main()
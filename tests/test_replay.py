@@ -0,0 +1,88 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Record then replay, the replayed intervals keep their recorded times"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from membw import compute, record
+from membw.report import Reporter, parse_args
+from membw.perfcsv import Counts
+
+# 2023-11-14 22:13:20 UTC, years before any replay runs, so a wall clock
+# time stamped on a replayed interval shows
+T0 = 1700000000.0
+
+def counts(rows):
+    c = Counts()
+    for key, event, value in rows:
+        c.append(key, event, value, 1e9, 1e9)
+    return c
+
+def interval(n):
+    task = counts([("app-%d" % (100 + i), e, 1e6 * (i + 1) * (n + 1)) for i in range(3)\
+            for e in ("OCR_READ_DRAM", "MEM_INST_RETIRED.ALL_STORES")])
+    system = counts([("CPU%d" % c, "MEM_INST_RETIRED.ALL_STORES", 5e6) for c in range(2)])
+    unc = counts([("CPU0", "UNC_M_RPQ_INSERTS_IMC_0", 4e7), ("CPU0", "UNC_M_WPQ_INSERTS_IMC_0", 2e7)])
+    return task, system, unc
+
+def identity(k):
+    # app-100 and app-101 are threads of process 100, app-102 is one of its own
+    tid = int(k.rpartition("-")[2])
+    return tid, "app", 100 if tid < 102 else 102, 1000
+
+class ReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.d = tempfile.mkdtemp(prefix="bw-test-")
+        self.path = os.path.join(self.d, "rec.bin")
+        meta = {"pids": [-1], "cgroup": False, "socket_split": False, "pmem": False, "interval": 1,\
+                "host": "test", "events": list(compute.EVENTS), "sockets": {"0": 0, "1": 0}}
+        r = record.Recorder(self.path, meta, identity)
+        for n in range(4):
+            r.write(T0 + n, 1.0, 1.0, *interval(n))
+        r.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.d, ignore_errors=True)
+
+    def replay(self, fmt, *args):
+        out = subprocess.check_output([sys.executable, "bw-report.py", "--replay", self.path, "--format", fmt]\
+                + list(args), cwd=ROOT, stderr=open(os.devnull, "w"))
+        return out.decode("utf-8").splitlines()
+
+    def test_jsonl_keeps_recorded_ts(self):
+        ts = [json.loads(l)["ts"] for l in self.replay("jsonl")]
+        self.assertEqual(ts, [T0 + n for n in range(4)])
+
+    def test_csv_keeps_recorded_ts(self):
+        lines = self.replay("csv")[1:]
+        self.assertTrue(lines)
+        self.assertEqual(sorted(set([float(l.split(",")[0]) for l in lines])), [T0 + n for n in range(4)])
+
+    def test_two_reporters(self):
+        # each keeps its own options, the second doesn't change the first
+        outs = [os.path.join(self.d, "%s.jsonl" % by) for by in ("command", "thread")]
+        reporters = [Reporter(parse_args(["--replay", self.path, "--by", by, "--format", "jsonl", "--out", out]))\
+                for by, out in zip(("command", "thread"), outs)]
+        for r in reporters:
+            r.run()
+        tasks = []
+        for out in outs:
+            with open(out) as f:
+                tasks.append([t for l in f for t in json.loads(l)["tasks"]])
+        self.assertEqual(set([(t["pid"], t["comm"]) for t in tasks[0]]), set([(None, "app")]))
+        self.assertEqual(set([t["pid"] for t in tasks[1]]), set([100, 101, 102]))
+
+    def test_by_process(self):
+        tasks = [t for l in self.replay("jsonl", "--by", "process") for t in json.loads(l)["tasks"]]
+        self.assertEqual(set([t["pid"] for t in tasks]), set([100, 102]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""MBMCollector on a made-up resctrl tree"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from membw import resctrl
+from helpers import write, remove_group
+
+DOMAINS = ("mon_L3_00", "mon_L3_01")
+
+class ResctrlTest(unittest.TestCase):
+    def setUp(self):
+        self.d = tempfile.mkdtemp(prefix="bw-test-")
+        self.root = os.path.join(self.d, "resctrl")
+        self.proc = os.path.join(self.d, "proc")
+        os.makedirs(os.path.join(self.root, "mon_groups"))
+        os.makedirs(os.path.join(self.root, "grp1", "mon_groups", "m1"))
+        for g in ("", "grp1", "grp1/mon_groups/m1"):
+            self.counters(g, 0, 0)
+        for tid in (100, 101):
+            write(os.path.join(self.proc, "100", "task", str(tid), "comm"), "app")
+
+    def tearDown(self):
+        shutil.rmtree(self.d, ignore_errors=True)
+
+    def collector(self, targets):
+        return resctrl.MBMCollector(targets, root=self.root, proc_root=self.proc, rmdir=remove_group)
+
+    def counters(self, group, *values):
+        for dom, v in zip(DOMAINS, values):
+            write(os.path.join(self.root, group, "mon_data", dom, "mbm_total_bytes"), str(v))
+
+    def test_group_lifecycle(self):
+        os.makedirs(os.path.join(self.root, "mon_groups", "membw-200"))
+        c = self.collector([100, 200])
+        made = os.path.join(self.root, "mon_groups", "membw-100")
+        self.assertTrue(c.groups["100"].created)
+        self.assertFalse(c.groups["200"].created)
+        self.assertEqual(c.groups["100"].tids, set([100, 101]))
+        self.assertTrue(os.path.exists(os.path.join(made, "tasks")))
+
+        # the kernel fills in mon_data, counts start at the first read
+        self.counters("mon_groups/membw-100", 1000, 50)
+        self.counters("mon_groups/membw-200", 7, 7)
+        c.sample()
+        self.counters("mon_groups/membw-100", 5000, 150)
+        self.counters("", 100000, 20000)
+        elapsed, groups, system = c.sample()
+        self.assertEqual(groups["100"], {"mon_L3_00": 4000, "mon_L3_01": 100})
+        self.assertEqual(groups["200"], {"mon_L3_00": 0, "mon_L3_01": 0})
+        self.assertEqual(system, {"mon_L3_00": 100000, "mon_L3_01": 20000})
+
+        c.close()
+        self.assertFalse(os.path.exists(made))
+        self.assertTrue(os.path.isdir(os.path.join(self.root, "mon_groups", "membw-200")))
+
+    def test_counter_reset(self):
+        os.makedirs(os.path.join(self.root, "mon_groups", "membw-100"))
+        self.counters("mon_groups/membw-100", 8000, 8000)
+        c = self.collector([100])
+        # the group was made again, the counter starts over from 0
+        self.counters("mon_groups/membw-100", 300, 9000)
+        groups = c.sample()[1]
+        self.assertEqual(groups["100"], {"mon_L3_00": 300, "mon_L3_01": 1000})
+        self.counters("mon_groups/membw-100", 400, 9000)
+        self.assertEqual(c.sample()[1]["100"], {"mon_L3_00": 100, "mon_L3_01": 0})
+
+    def test_unavailable_counter(self):
+        c = self.collector([-1])
+        write(os.path.join(self.root, "grp1", "mon_data", "mon_L3_00", "mbm_total_bytes"), "Unavailable")
+        self.counters("grp1/mon_groups/m1", 10, 20)
+        groups = c.sample()[1]
+        self.assertEqual(sorted(groups), ["/", "grp1", "grp1/m1"])
+        self.assertEqual(groups["grp1"]["mon_L3_00"], 0)
+        self.assertEqual(groups["grp1/m1"], {"mon_L3_00": 10, "mon_L3_01": 20})
+
+if __name__ == "__main__":
+    unittest.main()
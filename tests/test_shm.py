@@ -0,0 +1,130 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Ring and RingReader on a file of their own"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from membw import shm
+from membw.sink import Row
+
+def row(pid, comm, read):
+    return Row(None, pid, comm, (read, 1.0, 2.0, 3.0, 0.0, 0.0, 0.0, 0.0))
+
+def publish(ring, n):
+    # snapshot n, told apart by its ts and DRAM read total
+    ring.write(100.0 + n, {None: (float(n), 0.0, 0.0, 0.0)}, [row(str(n), "app", float(n))])
+
+class StalledReader(shm.RingReader):
+    """A reader the writer keeps busy, it finishes after finish_after backoffs, never if None"""
+    def __init__(self, name, ring, finish_after):
+        shm.RingReader.__init__(self, name)
+        self.ring = ring
+        self.finish_after = finish_after
+        self.backoffs = 0
+
+    def backoff(self):
+        self.backoffs += 1
+        if self.backoffs == self.finish_after:
+            # the write the slot's odd seq stands for, done
+            shm.SEQ.pack_into(self.ring.map, shm.HEADER_SIZE, 0)
+            publish(self.ring, 0)
+
+class LappedReader(shm.RingReader):
+    """A reader the writer laps once, as it starts unpacking a slot"""
+    def __init__(self, name, ring):
+        shm.RingReader.__init__(self, name)
+        self.ring = ring
+        self.lapped = False
+
+    def unpack(self, n, off):
+        if not self.lapped:
+            self.lapped = True
+            for i in range(self.ring.published, n + 1 + self.ring.slots):
+                publish(self.ring, i)
+        return shm.RingReader.unpack(self, n, off)
+
+class ShmTest(unittest.TestCase):
+    def setUp(self):
+        self.d = tempfile.mkdtemp(prefix="bw-test-")
+        self.path = os.path.join(self.d, "ring")
+        self.ring = shm.Ring(self.path, slots=4, max_rows=2, max_sockets=1)
+
+    def tearDown(self):
+        self.ring.close()
+        shutil.rmtree(self.d, ignore_errors=True)
+
+    def test_round_trip(self):
+        r = shm.RingReader(self.path)
+        self.assertEqual((r.published(), r.latest()), (0, None))
+        self.ring.write(5.5, {0: (1.0, 2.0, 3.0, 4.0), 1: (5.0, 6.0, 7.0, 8.0)}, [row("100", "a" * 40, 9.0),\
+                row("-", "/system.slice", 8.0), row("300", "cut", 7.0)])
+        s = r.latest()
+        self.assertEqual((s.n, s.ts, s.listed), (0, 5.5, 3))
+        self.assertEqual(s.totals, {0: (1.0, 2.0, 3.0, 4.0), 1: (5.0, 6.0, 7.0, 8.0)})
+        self.assertEqual([(x.pid, x.comm, x.values[0]) for x in s.rows],\
+                [(100, "a" * shm.COMM_LEN, 9.0), ("-", "/system.slice", 8.0)])
+        self.assertFalse(r.replaced())
+        self.ring.close()
+        self.assertTrue(r.replaced())
+        r.close()
+
+    def test_wrap_around(self):
+        r = shm.RingReader(self.path)
+        for n in range(10):
+            publish(self.ring, n)
+        self.assertEqual(r.published(), 10)
+        self.assertEqual(r.latest().ts, 109.0)
+        # 4 slots, snapshots 6 to 9 are in them, in slots 2, 3, 0, 1
+        self.assertEqual([s.n for s in r.last(10)], [6, 7, 8, 9])
+        self.assertEqual([s.totals[None][0] for s in r.last(2)], [8.0, 9.0])
+        self.assertEqual(r.read(5), None)
+        self.assertEqual(r.read(10), None)
+        self.assertEqual(r.read(8).rows[0].pid, 8)
+
+    def test_reader_behind(self):
+        r = shm.RingReader(self.path)
+        publish(self.ring, 0)
+        seen = r.published()
+        self.assertEqual(r.read(seen - 1).ts, 100.0)
+        # the writer goes round the ring while the reader does something else
+        for n in range(1, 7):
+            publish(self.ring, n)
+        self.assertEqual(r.read(seen - 1), None)
+        self.assertEqual([s.n for s in r.last(r.published() - seen)], [3, 4, 5, 6])
+
+    def test_torn_read(self):
+        # the slot has snapshot 4 by the time it's unpacked for 0, what was
+        # unpacked is thrown away and 0 is gone
+        publish(self.ring, 0)
+        r = LappedReader(self.path, self.ring)
+        self.assertEqual(r.read(0), None)
+        self.assertTrue(r.lapped)
+        self.assertEqual(r.read(4).ts, 104.0)
+
+    def test_retry(self):
+        # a write under way, the reader waits it out
+        shm.SEQ.pack_into(self.ring.map, shm.HEADER_SIZE, 1)
+        r = StalledReader(self.path, self.ring, 3)
+        s = r.read(0)
+        self.assertEqual((s.ts, r.backoffs), (100.0, 3))
+
+    def test_stuck_writer(self):
+        shm.SEQ.pack_into(self.ring.map, shm.HEADER_SIZE, 1)
+        r = StalledReader(self.path, self.ring, None)
+        self.assertEqual(r.read(0), None)
+        self.assertEqual(r.backoffs, shm.RETRIES)
+
+    def test_not_a_ring(self):
+        path = os.path.join(self.d, "other")
+        with open(path, "wb") as f:
+            f.write(b"\0" * shm.HEADER_SIZE)
+        self.assertRaises(ValueError, shm.RingReader, path)
+        self.assertRaises(OSError, shm.RingReader, os.path.join(self.d, "none"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+# Copyright (C) 2019 Intel Corporation
+# SPDX-License-Identifier: BSD-3-Clause
+"""Sink encodings and rotation"""
+
+import os
+import sys
+import json
+import shutil
+import struct
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from membw import sink
+from membw.sink import Row, Sink
+from helpers import read
+
+TOTALS = {0: (10.0, 20.0, 0.0, 0.0), 1: (30.0, 40.0, 0.0, 0.0)}
+ROWS = [Row(1, "100", "app, v2", (25.0, 83.3, 4.0, 10.0, 0.0, 0.0, 0.0, 0.0), stats=[1.0, 2.0]),\
+        Row(None, "-", "/system.slice", (1.0, 2.0, 3.0, 4.0, 0.0, 0.0, 0.0, 0.0))]
+
+def records(path):
+    # ts of the JSON Lines records of a file
+    with open(path) as f:
+        return [json.loads(l)["ts"] for l in f]
+
+class SinkTest(unittest.TestCase):
+    def setUp(self):
+        self.d = tempfile.mkdtemp(prefix="bw-test-")
+        self.path = os.path.join(self.d, "out")
+
+    def tearDown(self):
+        shutil.rmtree(self.d, ignore_errors=True)
+
+    def test_jsonl(self):
+        d = json.loads(sink.encode_jsonl(5.0, TOTALS, ROWS, ["note"]).decode("utf-8"))
+        self.assertEqual(d["totals"], {"dram_read": 40.0, "dram_write": 60.0, "pmem_read": 0.0, "pmem_write": 0.0})
+        self.assertEqual(sorted(d["sockets"]), ["0", "1"])
+        t = d["tasks"][0]
+        self.assertEqual((t["pid"], t["socket"], t["history"]), (100, 1, [1.0, 2.0]))
+        # no PID for a cgroup, no socket unless split
+        self.assertEqual(d["tasks"][1]["pid"], None)
+        self.assertFalse("socket" in d["tasks"][1])
+        self.assertEqual(d["notes"], ["note"])
+        d = json.loads(sink.encode_jsonl(5.0, {None: TOTALS[0]}, [], ()).decode("utf-8"))
+        self.assertEqual((d["tasks"], "sockets" in d), ([], False))
+
+    def test_csv(self):
+        lines = sink.encode_csv(5.0, TOTALS, ROWS, ()).decode("utf-8").splitlines()
+        self.assertEqual(len(lines), 2)
+        # a row is against the totals of its socket, all of them without one
+        self.assertTrue(lines[0].startswith('5.000,30.000,40.000,0.000,0.000,1,100,"app, v2",25.000,'))
+        self.assertTrue(lines[1].startswith('5.000,40.000,60.000,0.000,0.000,,,/system.slice,1.000,'))
+        # just the totals if no task is listed
+        line = sink.encode_csv(5.0, TOTALS, [], ()).decode("utf-8")
+        self.assertEqual(len(line.split(",")), len(sink.CSV_HEADER.split(",")))
+
+    def test_binary(self):
+        data = sink.encode_binary(5.0, TOTALS, ROWS, ())
+        self.assertEqual(sink.REC_LEN.unpack_from(data)[0], len(data) - sink.REC_LEN.size)
+        ts, totals, rows = sink.decode_binary(data[sink.REC_LEN.size:])
+        self.assertEqual((ts, totals), (5.0, TOTALS))
+        self.assertEqual([(r.socket, r.pid, r.comm, r.values) for r in rows],\
+                [(r.socket, 100 if r.pid == "100" else r.pid, r.comm, r.values) for r in ROWS])
+
+    def test_rotation(self):
+        size = len(sink.encode_jsonl(0.0, TOTALS, ROWS, ()))
+        s = Sink("jsonl", self.path, max_bytes=2 * size + 1, keep=2)
+        for ts in range(7):
+            s.write(float(ts), TOTALS, ROWS)
+        s.close()
+        # two records a file, the newest in path, the oldest one gone
+        self.assertEqual(sorted(os.listdir(self.d)), ["out", "out.1", "out.2"])
+        self.assertEqual([records(self.path + x) for x in (".2", ".1", "")], [[2.0, 3.0], [4.0, 5.0], [6.0]])
+
+    def test_rotation_header(self):
+        size = len(sink.encode_csv(0.0, TOTALS, ROWS, ()))
+        s = Sink("csv", self.path, max_bytes=len(sink.CSV_HEADER) + size, keep=0)
+        for ts in range(3):
+            s.write(float(ts), TOTALS, ROWS)
+        s.close()
+        # keep 0 starts over, with a header
+        self.assertEqual(os.listdir(self.d), ["out"])
+        lines = read(self.path).splitlines()
+        self.assertEqual((lines[0] + "\n", lines[1][:5], len(lines)), (sink.CSV_HEADER, "2.000", 3))
+
+    def test_append(self):
+        # a file that's there already is appended to, no second header
+        for ts in range(2):
+            s = Sink("binary", self.path)
+            s.write(float(ts), TOTALS, [])
+            s.close()
+        with open(self.path, "rb") as f:
+            data = f.read()
+        self.assertEqual(data.count(sink.BINARY_MAGIC), 1)
+        self.assertEqual(struct.unpack_from("<H", data, len(sink.BINARY_MAGIC))[0], sink.BINARY_VERSION)
+
+    def test_fd(self):
+        r, w = os.pipe()
+        s = Sink("jsonl", fd=w)
+        s.write(1.5, TOTALS, ROWS)
+        os.close(w)
+        with os.fdopen(r) as f:
+            self.assertEqual(json.loads(f.read())["ts"], 1.5)
+
+if __name__ == "__main__":
+    unittest.main()